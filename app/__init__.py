@@ -12,7 +12,7 @@ from urllib.parse import urlparse
 from tzlocal import get_localzone_name
 
 from . import extensions
-from .config import load_or_create_config, is_configured
+from .config import load_or_create_config, is_configured, register_config_listener
 from .scheduler import setup_scheduler
 from . import models
 from . import sockets # Importa o novo módulo de sockets
@@ -133,10 +133,12 @@ def create_app(log_level='INFO', _from_job=False):
     extensions.login_manager.init_app(app)
     extensions.babel.init_app(app, locale_selector=get_user_locale)
     
-    # Inicializa o SocketIO com a app
-    extensions.socketio.init_app(app, async_mode='eventlet')
-    # Passa a instância da app para o módulo de sockets para que o contexto possa ser usado na tarefa de fundo
-    sockets.app_instance = app
+    # Inicializa o SocketIO com a app. Uma aplicação criada para uma tarefa não serve browsers:
+    # um novo init_app substituiria o servidor a que os clientes da aplicação principal estão ligados.
+    if not _from_job or extensions.socketio.server is None:
+        extensions.socketio.init_app(app, async_mode='eventlet')
+        # Passa a instância da app para o módulo de sockets para que o contexto possa ser usado na tarefa de fundo
+        sockets.app_instance = app
 
     if not extensions.scheduler.running:
         jobstores = {
@@ -155,9 +157,20 @@ def create_app(log_level='INFO', _from_job=False):
         NotifierManager, EfiManager, MercadoPagoManager,
         OverseerrManager, LinkShortener
     )
+    from .services.image_cache import ImageCache
+    from .services.compute_pool import ComputePool
+    from .services.tautulli import LiveSessionTracker
+
+    # O pool de processos é partilhado por todas as instâncias da aplicação no mesmo processo (incluindo as das tarefas).
+    if extensions.compute_pool is None:
+        extensions.compute_pool = ComputePool()
+        atexit.register(extensions.compute_pool.shutdown)
 
     extensions.data_manager = DataManager()
-    extensions.tautulli_manager = TautulliManager(data_manager=extensions.data_manager)
+    extensions.tautulli_manager = TautulliManager(data_manager=extensions.data_manager, compute_pool=extensions.compute_pool)
+    # O acompanhamento das reproduções em curso guarda a leitura anterior: tal como o pool, é criado uma única vez.
+    if extensions.live_sessions is None:
+        extensions.live_sessions = LiveSessionTracker(extensions.tautulli_manager.api_client)
     extensions.link_shortener = LinkShortener()
     extensions.notifier_manager = NotifierManager(link_shortener_service=extensions.link_shortener)
     extensions.efi_manager = EfiManager(data_manager=extensions.data_manager)
@@ -170,6 +183,27 @@ def create_app(log_level='INFO', _from_job=False):
         overseerr_manager=extensions.overseerr_manager
     )
     extensions.plex_manager.init_app(app)
+    # Tal como o pool, a cache de imagens é criada uma única vez: percorre o diretório ao arrancar e
+    # partilha os downloads em curso entre pedidos, o que não pode ser refeito a cada tarefa agendada.
+    if extensions.image_cache is None:
+        extensions.image_cache = ImageCache(
+            os.path.join(config_dir_path, 'image_cache'),
+            max_bytes=int(app.config.get('IMAGE_CACHE_MAX_MB', 200)) * 1024 * 1024
+        )
+
+    # Ao guardar as definições, cada gestor só é recarregado se as chaves de que depende mudaram.
+    # As instâncias criadas pelas tarefas agendadas não substituem os subscritores da aplicação principal.
+    if not _from_job:
+        config_listeners = (
+            ('efi', extensions.efi_manager.CONFIG_KEYS, extensions.efi_manager.reload_credentials),
+            ('mercado_pago', extensions.mercado_pago_manager.CONFIG_KEYS, extensions.mercado_pago_manager.reload_credentials),
+            ('tautulli', extensions.tautulli_manager.CONFIG_KEYS, extensions.tautulli_manager.reload_credentials),
+            ('overseerr', extensions.overseerr_manager.CONFIG_KEYS, extensions.overseerr_manager.reload_config),
+            ('plex', extensions.plex_manager.CONFIG_KEYS, extensions.plex_manager.reload_connections),
+            ('compute_pool', extensions.compute_pool.CONFIG_KEYS, extensions.compute_pool.reload_config),
+        )
+        for name, keys, callback in config_listeners:
+            register_config_listener(name, keys, callback)
 
     app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1, x_prefix=1)
     
@@ -214,7 +248,7 @@ def create_app(log_level='INFO', _from_job=False):
             'system_api.test_overseerr_connection', 'system_api.auto_configure_tautulli_notifier',
             'system_api.get_logs', 'system_api.clear_logs',
             'invites_api.get_invite_details_route', 'invites_api.claim_invite_route',
-            'payments_api.efi_webhook', 'payments_api.mercadopago_webhook',
+            'payments_api.efi_webhook', 'payments_api.mercadopago_webhook', 'ingest_api.tautulli_webhook',
             'set_language', 'main.claim_invite_page', 'serve_manifest', 'serve_sw',
             'main.payment_page', 'users_api.get_public_user_profile_by_token', 'payments_api.get_payment_options',
             'payments_api.create_charge_route', 'payments_api.get_payment_status',
@@ -260,6 +294,7 @@ def create_app(log_level='INFO', _from_job=False):
     from .blueprints.main import main_bp
     from .blueprints.auth import auth_bp
     from .blueprints.redirect import redirect_bp
+    from .blueprints.img import img_bp
     # Importar os novos blueprints da API
     from .blueprints.api.system import system_api_bp
     from .blueprints.api.users import users_api_bp
@@ -267,10 +302,12 @@ def create_app(log_level='INFO', _from_job=False):
     from .blueprints.api.payments import payments_api_bp
     from .blueprints.api.stats import stats_api_bp
     from .blueprints.api.notifications import notifications_api_bp
+    from .blueprints.api.ingest import ingest_api_bp
     
     app.register_blueprint(main_bp)
     app.register_blueprint(auth_bp, url_prefix='/auth')
     app.register_blueprint(redirect_bp)
+    app.register_blueprint(img_bp, url_prefix='/img')
     # Registar os novos blueprints, todos sob o prefixo /api
     app.register_blueprint(system_api_bp, url_prefix='/api')
     app.register_blueprint(users_api_bp, url_prefix='/api/users')
@@ -278,5 +315,6 @@ def create_app(log_level='INFO', _from_job=False):
     app.register_blueprint(payments_api_bp, url_prefix='/api/payments')
     app.register_blueprint(stats_api_bp, url_prefix='/api/statistics')
     app.register_blueprint(notifications_api_bp, url_prefix='/api/notifications')
+    app.register_blueprint(ingest_api_bp, url_prefix='/api/ingest')
 
     return app
@@ -0,0 +1,80 @@
+# app/blueprints/api/ingest.py
+
+import hmac
+import logging
+from datetime import datetime
+from flask import Blueprint, jsonify, request, url_for
+from flask_babel import gettext as _
+from apscheduler.jobstores.base import JobLookupError
+
+from ...extensions import tautulli_manager, scheduler, socketio, live_sessions
+from ...sockets import LIVE_SESSIONS_ROOM
+from ...config import get_config
+from ..auth import admin_required, login_required
+
+logger = logging.getLogger(__name__)
+ingest_api_bp = Blueprint('ingest_api', __name__)
+
+def _is_authorized():
+    """Valida a chave enviada pelo Tautulli (X-Painel-Key ou Authorization: Bearer) contra INTERNAL_TRIGGER_KEY."""
+    expected = get_config().get('INTERNAL_TRIGGER_KEY')
+    if not expected:
+        return False
+    provided = request.headers.get('X-Painel-Key', '')
+    auth_header = request.headers.get('Authorization', '')
+    if not provided and auth_header.startswith('Bearer '):
+        provided = auth_header[len('Bearer '):]
+    return hmac.compare_digest(provided.encode(), expected.encode())
+
+def _request_history_sync():
+    """Antecipa a próxima sincronização incremental do histórico para refletir a sessão terminada."""
+    try:
+        scheduler.modify_job('history_sync_job', next_run_time=datetime.now(scheduler.timezone))
+    except JobLookupError:
+        logger.debug("Tarefa de sincronização do histórico não agendada; a antecipação foi ignorada.")
+    except Exception as e:
+        logger.warning(f"Não foi possível antecipar a sincronização do histórico: {e}")
+
+@ingest_api_bp.route('/tautulli', methods=['POST'])
+def tautulli_webhook():
+    if not _is_authorized():
+        logger.warning(f"Pedido de ingestão do Tautulli rejeitado (chave inválida) de {request.remote_addr}.")
+        return jsonify({"success": False, "message": _("Não autorizado.")}), 401
+
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        # Títulos ou leitores com aspas chegam sem escape e invalidam o JSON do modelo.
+        payload = tautulli_manager.parse_ingest_body(request.get_data(as_text=True))
+    if not isinstance(payload, dict):
+        return jsonify({"success": False, "message": _("Corpo JSON inválido.")}), 400
+
+    try:
+        result = tautulli_manager.ingest_event(payload)
+        if not result.get("success"):
+            return jsonify(result), 400
+        if result.get("session_finished"):
+            _request_history_sync()
+        # As sessões em curso só são enviadas aos administradores (a mesma sala do painel de reproduções).
+        socketio.emit('live_activity', tautulli_manager.get_live_activity(), namespace='/dashboard', to=LIVE_SESSIONS_ROOM)
+        # O painel de reproduções em curso relê o get_activity sem esperar pelo intervalo.
+        if live_sessions:
+            live_sessions.wake()
+        return jsonify({"success": True}), 200
+    except Exception as e:
+        logger.error(f"Erro ao processar o evento do webhook do Tautulli: {e}", exc_info=True)
+        return jsonify({"success": False, "message": "Internal Server Error"}), 500
+
+@ingest_api_bp.route('/tautulli/live')
+@login_required
+@admin_required
+def get_live_activity():
+    return jsonify({"success": True, "live": tautulli_manager.get_live_activity()})
+
+@ingest_api_bp.route('/tautulli/webhook-config')
+@login_required
+@admin_required
+def get_webhook_config():
+    """Configuração a aplicar num notificador Webhook do Tautulli para enviar eventos a este painel."""
+    webhook_url = url_for('ingest_api.tautulli_webhook', _external=True)
+    config = tautulli_manager.get_ingest_webhook_config(webhook_url, get_config().get('INTERNAL_TRIGGER_KEY', ''))
+    return jsonify({"success": True, "config": config})
@@ -8,9 +8,10 @@ from flask_babel import gettext as _
 from flask_login import login_required
 
 from ...extensions import plex_manager, tautulli_manager, data_manager, efi_manager, mercado_pago_manager
-from ...config import load_or_create_config
+from ...config import get_config
 from ..auth import admin_required
 from ...models import UserProfile
+from ...services.date_range import parse_date_range
 
 logger = logging.getLogger(__name__)
 payments_api_bp = Blueprint('payments_api', __name__)
@@ -81,7 +82,7 @@ def get_payment_options():
     if not username:
         return jsonify({"success": False, "message": _("Usuário não especificado ou token inválido.")}), 400
 
-    config = load_or_create_config()
+    config = get_config()
     profile = data_manager.get_user_profile(username)
     current_screens = profile.get('screen_limit', 0)
     
@@ -134,7 +135,7 @@ def create_charge_route():
     if not provider or screens_str is None:
         return jsonify({"success": False, "message": _("Dados insuficientes para gerar cobrança.")}), 400
 
-    config = load_or_create_config()
+    config = get_config()
     profile = data_manager.get_user_profile(username)
     
     plex_user = next((u for u in plex_manager.get_all_plex_users() if u['username'] == username), None)
@@ -240,8 +241,15 @@ def get_financial_summary_route():
         year = now.year
         month = now.month
         renewal_days = 7
-    summary = data_manager.get_financial_summary(year, month, renewal_days=renewal_days)
-    return jsonify({"success": True, "summary": summary, "query_date": {"year": year, "month": month}})
+    try:
+        date_range = parse_date_range(request.args.get('start'), request.args.get('end'))
+    except ValueError:
+        return jsonify({"success": False, "message": _("Intervalo de datas inválido.")}), 400
+    summary = data_manager.get_financial_summary(year, month, renewal_days=renewal_days, date_range=date_range)
+    query_date = {"year": year, "month": month}
+    if date_range:
+        query_date["range"] = date_range.to_dict()
+    return jsonify({"success": True, "summary": summary, "query_date": query_date})
 
 @payments_api_bp.route('/financial/add-manual', methods=['POST'])
 @login_required
@@ -1,11 +1,15 @@
 # app/blueprints/api/stats.py
 
 import logging
+from datetime import datetime
 from flask import Blueprint, jsonify, request
 from flask_login import login_required, current_user
 from flask_babel import gettext as _
 
-from ...extensions import plex_manager, tautulli_manager, data_manager
+from ...extensions import plex_manager, tautulli_manager, data_manager, scheduler
+from ...services.image_cache import avatar_url
+from ...services.date_range import parse_date_range
+from ..auth import admin_required
 
 logger = logging.getLogger(__name__)
 stats_api_bp = Blueprint('stats_api', __name__)
@@ -14,29 +18,72 @@ def _obfuscate_username(username):
     if len(username) <= 2: return username
     return f"{username[0]}{'*' * (len(username) - 2)}{username[-1]}"
 
+def _apply_leaderboard_privacy(stats, all_profiles):
+    """Marca perfis privados e oculta-os a quem não é administrador."""
+    processed_stats = []
+    for user_stat in stats:
+        username = user_stat["username"]
+        profile = all_profiles.get(username, {})
+
+        is_private = profile.get('hide_from_leaderboard', False)
+        user_stat["is_private"] = is_private
+
+        if not current_user.is_admin() and is_private:
+            user_stat["username"] = _obfuscate_username(username)
+            user_stat["thumb"] = f"https://placehold.co/80x80/1F2937/E5E7EB?text=?"
+
+        processed_stats.append(user_stat)
+    return processed_stats
+
+def _can_view_user_stats(username):
+    """Perfis privados só são visíveis para o próprio utilizador e para administradores."""
+    profile = data_manager.get_user_profile(username)
+    if not profile.get('hide_from_leaderboard', False):
+        return True
+    return current_user.is_admin() or current_user.username == username
+
+def _requested_date_range():
+    """DateRange a partir de ?start=YYYY-MM-DD&end=YYYY-MM-DD; levanta ValueError se for inválido."""
+    return parse_date_range(request.args.get('start'), request.args.get('end'))
+
+def _leaderboard_context():
+    plex_users = plex_manager.get_all_plex_users()
+    all_profiles = {p['username']: p for p in data_manager.get_all_user_profiles()}
+    plex_users_info = {u['username']: avatar_url(u['thumb']) for u in plex_users}
+    return all_profiles, plex_users_info
+
 @stats_api_bp.route('/')
 @login_required
 def get_statistics_data():
     days = request.args.get('days', 7, type=int)
-    plex_users = plex_manager.get_all_plex_users()
-    all_profiles = {p['username']: p for p in data_manager.get_all_user_profiles()}
-    plex_users_info = {u['username']: u['thumb'] for u in plex_users}
-    tautulli_data = tautulli_manager.get_watch_stats(days=days, plex_users_info=plex_users_info)
+    try:
+        date_range = _requested_date_range()
+    except ValueError:
+        return jsonify({"success": False, "message": _("Intervalo de datas inválido.")}), 400
+    all_profiles, plex_users_info = _leaderboard_context()
+    tautulli_data = tautulli_manager.get_watch_stats(days=days, plex_users_info=plex_users_info, date_range=date_range)
+    if tautulli_data.get("success"):
+        tautulli_data["stats"] = _apply_leaderboard_privacy(tautulli_data["stats"], all_profiles)
+    return jsonify(tautulli_data)
+
+@stats_api_bp.route('/multi')
+@login_required
+def get_statistics_multi_data():
+    """Classificação para vários períodos numa só resposta (ex.: ?windows=7,15,30,90)."""
+    try:
+        windows = [int(w) for w in request.args.get('windows', '').split(',') if w.strip()]
+    except ValueError:
+        return jsonify({"success": False, "message": _("Períodos inválidos.")}), 400
+    if len(windows) > 8 or any(w < 1 or w > 365 for w in windows):
+        return jsonify({"success": False, "message": _("Períodos inválidos.")}), 400
+
+    all_profiles, plex_users_info = _leaderboard_context()
+    tautulli_data = tautulli_manager.get_watch_stats_multi(windows=windows or None, plex_users_info=plex_users_info)
     if tautulli_data.get("success"):
-        processed_stats = []
-        for user_stat in tautulli_data["stats"]:
-            username = user_stat["username"]
-            profile = all_profiles.get(username, {})
-            
-            is_private = profile.get('hide_from_leaderboard', False)
-            user_stat["is_private"] = is_private
-            
-            if not current_user.is_admin() and is_private:
-                user_stat["username"] = _obfuscate_username(username)
-                user_stat["thumb"] = f"https://placehold.co/80x80/1F2937/E5E7EB?text=?"
-
-            processed_stats.append(user_stat)
-        tautulli_data["stats"] = processed_stats
+        tautulli_data["windows"] = {
+            window: _apply_leaderboard_privacy(stats, all_profiles)
+            for window, stats in tautulli_data["windows"].items()
+        }
     return jsonify(tautulli_data)
 
 @stats_api_bp.route('/user/<username>')
@@ -45,16 +92,103 @@ def get_user_statistics(username):
     """
     Obtém as estatísticas detalhadas de um usuário, respeitando as configurações de privacidade.
     """
-    profile = data_manager.get_user_profile(username)
-    is_private = profile.get('hide_from_leaderboard', False)
-
-    if not is_private or current_user.is_admin() or current_user.username == username:
+    if _can_view_user_stats(username):
         days = request.args.get('days', 7, type=int)
-        return jsonify(tautulli_manager.get_user_watch_details(username, days=days, current_user=current_user))
+        try:
+            date_range = _requested_date_range()
+        except ValueError:
+            return jsonify({"success": False, "message": _("Intervalo de datas inválido.")}), 400
+        return jsonify(tautulli_manager.get_user_watch_details(username, days=days, current_user=current_user, date_range=date_range))
     else:
         logger.warning(f"Acesso negado para '{current_user.username}' ao tentar ver as estatísticas privadas de '{username}'.")
         return jsonify({"success": False, "message": _("Este usuário prefere manter suas estatísticas privadas.")}), 403
 
+@stats_api_bp.route('/concurrency')
+@login_required
+@admin_required
+def get_concurrency_route():
+    """Streams simultâneos (pico, p95 e série temporal) do servidor e por utilizador."""
+    days = request.args.get('days', 30, type=int)
+    if days < 1 or days > 365:
+        return jsonify({"success": False, "message": _("Período inválido.")}), 400
+    return jsonify(tautulli_manager.get_concurrency_stats(days=days))
+
+@stats_api_bp.route('/transcodes')
+@login_required
+@admin_required
+def get_transcode_report_route():
+    """Direct Play vs Transcode por utilizador, plataforma e biblioteca."""
+    days = request.args.get('days', 30, type=int)
+    if days < 1 or days > 365:
+        return jsonify({"success": False, "message": _("Período inválido.")}), 400
+    return jsonify(tautulli_manager.get_transcode_report(days=days))
+
+@stats_api_bp.route('/libraries')
+@login_required
+@admin_required
+def get_library_stats_route():
+    """Reproduções, horas, espectadores únicos e títulos mais vistos por biblioteca."""
+    days = request.args.get('days', 30, type=int)
+    if days < 1 or days > 365:
+        return jsonify({"success": False, "message": _("Período inválido.")}), 400
+    return jsonify(tautulli_manager.get_library_stats(days=days))
+
+@stats_api_bp.route('/heatmap')
+@login_required
+def get_heatmap_route():
+    """Mapa de calor dia da semana x hora; com ?username=, apenas desse utilizador."""
+    days = request.args.get('days', 30, type=int)
+    username = request.args.get('username') or None
+    if days < 1 or days > 365:
+        return jsonify({"success": False, "message": _("Período inválido.")}), 400
+    if username and not _can_view_user_stats(username):
+        return jsonify({"success": False, "message": _("Este usuário prefere manter suas estatísticas privadas.")}), 403
+    return jsonify(tautulli_manager.get_activity_heatmap(days=days, username=username))
+
+@stats_api_bp.route('/titles/<int:rating_key>/similar')
+@login_required
+def get_similar_titles_route(rating_key):
+    """Quem viu este filme/série também viu (rating_key da série para episódios)."""
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+    return jsonify({"success": True, "rating_key": rating_key, "similar": data_manager.get_similar_titles(rating_key, limit=limit)})
+
+@stats_api_bp.route('/wrapped')
+@login_required
+def get_wrapped_years_route():
+    """Anos com resumos anuais gerados."""
+    return jsonify({"success": True, "years": data_manager.get_wrapped_years()})
+
+@stats_api_bp.route('/wrapped/<int:year>')
+@login_required
+def get_wrapped_route(year):
+    """Resumo anual do utilizador autenticado ou, com ?username=, de outro utilizador (se visível)."""
+    username = request.args.get('username') or current_user.username
+    if username != current_user.username and not _can_view_user_stats(username):
+        return jsonify({"success": False, "message": _("Este usuário prefere manter suas estatísticas privadas.")}), 403
+    snapshot = data_manager.get_wrapped_snapshot(username, year)
+    if not snapshot:
+        return jsonify({"success": False, "message": _("O resumo de %(year)s ainda não está disponível.", year=year)}), 404
+    return jsonify({"success": True, "wrapped": snapshot})
+
+@stats_api_bp.route('/wrapped/<int:year>/generate', methods=['POST'])
+@login_required
+@admin_required
+def generate_wrapped_route(year):
+    """Agenda a geração imediata dos resumos anuais de `year` para todos os utilizadores."""
+    if year < 2000 or year > datetime.now().year:
+        return jsonify({"success": False, "message": _("Ano inválido.")}), 400
+    if tautulli_manager.get_wrapped_status().get("running"):
+        return jsonify({"success": False, "message": _("A geração dos resumos anuais já está em curso.")}), 409
+    from ...scheduler import wrapped_job
+    scheduler.add_job(id='wrapped_job_manual', func=wrapped_job, args=[year], trigger='date', run_date=datetime.now(), replace_existing=True)
+    return jsonify({"success": True, "message": _("A geração dos resumos de %(year)s foi iniciada.", year=year)}), 202
+
+@stats_api_bp.route('/wrapped/status')
+@login_required
+@admin_required
+def get_wrapped_status_route():
+    return jsonify({"success": True, "status": tautulli_manager.get_wrapped_status()})
+
 @stats_api_bp.route('/recently-added')
 @login_required
 def get_recently_added_route():
@@ -8,8 +8,8 @@ from flask_babel import gettext as _
 from apscheduler.triggers.cron import CronTrigger
 from tzlocal import get_localzone_name
 
-from ...extensions import plex_manager, tautulli_manager, efi_manager, mercado_pago_manager, overseerr_manager, scheduler
-from ...config import load_or_create_config, save_app_config, is_configured
+from ...extensions import plex_manager, tautulli_manager, efi_manager, mercado_pago_manager, overseerr_manager, scheduler, image_cache, compute_pool
+from ...config import load_or_create_config, save_app_config, is_configured, notify_config_changes, get_config_cache_stats
 from ...models import User
 from ..auth import admin_required, login_required
 
@@ -45,6 +45,19 @@ def clear_logs():
         logger.error(f"Erro ao limpar o ficheiro de log: {e}")
         return jsonify({"success": False, "message": str(e)}), 500
 
+@system_api_bp.route('/cache-stats')
+@login_required
+@admin_required
+def get_cache_stats():
+    """Contadores das caches (respostas do Tautulli, config.json e imagens em disco) e do pool de cálculo."""
+    return jsonify({
+        "success": True,
+        "tautulli": tautulli_manager.get_cache_stats(),
+        "config": get_config_cache_stats(),
+        "images": image_cache.get_stats(),
+        "compute_pool": compute_pool.get_stats()
+    })
+
 @system_api_bp.route('/dashboard-summary')
 @login_required
 @admin_required
@@ -117,6 +130,7 @@ def api_settings():
             'OVERSEERR_ENABLED', 'OVERSEERR_URL', 'OVERSEERR_API_KEY',
             'CLEANUP_PENDING_PAYMENTS_ENABLED', 'CLEANUP_PENDING_PAYMENTS_DAYS', 'CLEANUP_TIME',
             'ENABLE_LINK_SHORTENER', 'PAYMENT_LINK_GRACE_PERIOD_DAYS',
+            'INACTIVE_USERS_DAYS', 'INACTIVE_REPORT_ENABLED',
             # Novas chaves de gamificação
             'ACHIEVEMENT_MOVIE_MARATHON_BRONZE', 'ACHIEVEMENT_MOVIE_MARATHON_SILVER', 'ACHIEVEMENT_MOVIE_MARATHON_GOLD',
             'ACHIEVEMENT_SERIES_BINGER_BRONZE', 'ACHIEVEMENT_SERIES_BINGER_SILVER', 'ACHIEVEMENT_SERIES_BINGER_GOLD',
@@ -126,7 +140,7 @@ def api_settings():
         numeric_fields = [
             'DAYS_TO_REMOVE_BLOCKED_USER', 'DAYS_TO_NOTIFY_EXPIRATION', 
             'BLOCKING_NOTIFIER_ID', 'SCREEN_LIMIT_NOTIFIER_ID', 'CLEANUP_PENDING_PAYMENTS_DAYS',
-            'PAYMENT_LINK_GRACE_PERIOD_DAYS',
+            'PAYMENT_LINK_GRACE_PERIOD_DAYS', 'INACTIVE_USERS_DAYS',
             # Novas chaves numéricas de gamificação
             'ACHIEVEMENT_MOVIE_MARATHON_BRONZE', 'ACHIEVEMENT_MOVIE_MARATHON_SILVER', 'ACHIEVEMENT_MOVIE_MARATHON_GOLD',
             'ACHIEVEMENT_SERIES_BINGER_BRONZE', 'ACHIEVEMENT_SERIES_BINGER_SILVER', 'ACHIEVEMENT_SERIES_BINGER_GOLD',
@@ -145,14 +159,16 @@ def api_settings():
         if new_data.get('plex_token') and new_data.get('plex_url'):
             config_to_update['PLEX_TOKEN'] = new_data['plex_token']
             config_to_update['PLEX_URL'] = new_data['plex_url']
-        save_app_config(config_to_update)
+        # Se outra gravação aconteceu entretanto, só as chaves alteradas neste pedido são aplicadas;
+        # a configuração efetiva é a que ficou no disco.
+        if not save_app_config(config_to_update, base_config=old_config):
+            return jsonify({"success": False, "message": _("Não foi possível salvar as configurações. Recarregue a página e tente novamente.")}), 500
+        config_to_update = load_or_create_config()
         app = current_app._get_current_object()
         app.config.update(config_to_update)
 
-        efi_manager.reload_credentials()
-        mercado_pago_manager.reload_credentials()
-        tautulli_manager.reload_credentials()
-        overseerr_manager.reload_config()
+        # Recarrega apenas os gestores cujas chaves de configuração mudaram.
+        reload_results = notify_config_changes(old_config, config_to_update)
 
         log_level_map = {'DEBUG': logging.DEBUG, 'INFO': logging.INFO, 'WARNING': logging.WARNING, 'ERROR': logging.ERROR}
         new_log_level = config_to_update.get('LOG_LEVEL', 'INFO')
@@ -179,7 +195,13 @@ def api_settings():
         reschedule_job('removal_job', 'BLOCK_REMOVAL_TIME', old_config, config_to_update)
         reschedule_job('cleanup_job', 'CLEANUP_TIME', old_config, config_to_update)
 
-        success, message = plex_manager.reload_connections()
+        plex_result = reload_results.get('plex')
+        if isinstance(plex_result, tuple):
+            success, message = plex_result
+        elif isinstance(plex_result, Exception):
+            success, message = False, _("Falha ao aplicar novas configurações: %(error)s", error=plex_result)
+        else:
+            success, message = True, _("Configurações salvas com sucesso.")
         return jsonify({"success": success, "message": message})
     
     config_to_send = load_or_create_config()
@@ -229,6 +251,7 @@ def save_setup():
         session.pop('plex_token', None)
         session.pop('plex_username', None)
         return jsonify({"success": True, "redirect_url": url_for('main.index')})
+    config = load_or_create_config()
     config['IS_CONFIGURED'] = False
     save_app_config(config)
     return jsonify({"success": False, "message": _("Configuração salva, mas falha ao conectar: %(message)s", message=message)})
@@ -11,7 +11,8 @@ from apscheduler.jobstores.base import JobLookupError
 from pydantic import ValidationError
 
 from ...extensions import plex_manager, tautulli_manager, data_manager
-from ...config import load_or_create_config
+from ...config import get_config
+from ...services.image_cache import avatar_url
 from ..auth import admin_required, login_required
 from .decorators import user_lookup, validate_json
 from .schemas import RenewSubscriptionSchema, UpdateProfileSchema, UpdateAccountProfileSchema
@@ -76,13 +77,14 @@ def get_status():
                     pass
 
             user_data = {
-                'username': u['username'], 'email': u['email'], 'thumb': u['thumb'],
+                'username': u['username'], 'email': u['email'], 'thumb': avatar_url(u['thumb']),
                 'is_blocked': u['username'] in blocked_users,
                 'screen_limit': profile.get('screen_limit', 0),
                 'expiration_date': profile.get('expiration_date'),
                 'trial_end_date': trial_end_date_str,
                 'is_on_trial': is_on_trial,
-                'payment_token': profile.get('payment_token')
+                'payment_token': profile.get('payment_token'),
+                'last_played_at': profile.get('last_played_at')
             }
             users_with_access.append(user_data)
     return jsonify({'users': sorted(users_with_access, key=lambda u: u['username'].lower()), 'libraries': plex_manager.get_libraries()})
@@ -91,7 +93,7 @@ def get_status():
 @users_api_bp.route('/account/details')
 @login_required
 def get_account_details():
-    config = load_or_create_config()
+    config = get_config()
     username = current_user.username
     email = current_user.email
     profile = data_manager.get_user_profile(username)
@@ -135,7 +137,7 @@ def get_account_details():
         "webhook_enabled": config.get("WEBHOOK_ENABLED", False)
     }
     details = {
-        "success": True, "username": username, "email": email, "thumb": current_user.thumb,
+        "success": True, "username": username, "email": email, "thumb": avatar_url(current_user.thumb),
         "join_date": join_date or _("Não disponível"),
         "screen_limit": _("%(num)s Tela(s)", num=screen_limit) if screen_limit > 0 else _("Ilimitado"),
         "libraries": libraries_data.get('libraries', []),
@@ -199,7 +201,7 @@ def renew_user_subscription_route(user, validated_data):
         expiration_time_str=data.expiration_time
     )
     try:
-        config = load_or_create_config()
+        config = get_config()
         user_profile = data_manager.get_user_profile(username)
         user_screen_limit = user_profile.get('screen_limit', 0)
         monthly_price_str = config.get("RENEWAL_PRICE", "0.00")
@@ -225,7 +227,7 @@ def renew_user_subscription_route(user, validated_data):
 def user_profile_route(username):
     if request.method == 'GET':
         profile = data_manager.get_user_profile(username)
-        config = load_or_create_config()
+        config = get_config()
         notification_settings = {
             "telegram_enabled": config.get("TELEGRAM_ENABLED", False),
             "discord_enabled": config.get("DISCORD_ENABLED", False),
@@ -390,6 +392,18 @@ def get_user_list():
         logger.error(f"Erro ao obter a lista de utilizadores: {e}")
         return jsonify({"success": False, "message": "Falha ao obter lista de utilizadores."}), 500
 
+@users_api_bp.route('/inactive')
+@login_required
+@admin_required
+def get_inactive_users_route():
+    """Utilizadores sem reproduções há ?days= dias (por omissão INACTIVE_USERS_DAYS), do mais inativo para o menos."""
+    days = request.args.get('days', get_config().get('INACTIVE_USERS_DAYS', 30), type=int)
+    if days < 1 or days > 3650:
+        return jsonify({"success": False, "message": _("Período inválido.")}), 400
+    include_blocked = request.args.get('include_blocked', 'true').lower() == 'true'
+    users = data_manager.get_inactive_users(days, include_blocked=include_blocked)
+    return jsonify({"success": True, "days": days, "users": users})
+
 @users_api_bp.route('/payments/<username>')
 @login_required
 def get_user_payments_history(username):
@@ -13,7 +13,7 @@ from plexapi.myplex import MyPlexAccount
 from flask_babel import gettext as _
 
 from ..models import User
-from ..config import is_configured, load_or_create_config
+from ..config import is_configured, get_config
 from ..extensions import plex_manager
 
 # --- Configurações e Constantes ---
@@ -95,7 +95,7 @@ def get_plex_auth_context():
         session.pop('from_settings', None)
 
     try:
-        config = load_or_create_config()
+        config = get_config()
         product_name = config.get("APP_TITLE", _(current_app.config.get("DEFAULT_APP_TITLE", "Painel de Gestão Plex")))
         client_id = str(uuid.uuid4())
         
@@ -123,7 +123,7 @@ def check_plex_pin(client_id, pin_id):
 
         plex_token = data['authToken']
         account = MyPlexAccount(token=plex_token)
-        config = load_or_create_config()
+        config = get_config()
 
         if not is_configured():
             session['plex_token'] = plex_token
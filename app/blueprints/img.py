@@ -0,0 +1,103 @@
+# app/blueprints/img.py
+
+import logging
+import requests
+from urllib.parse import urljoin
+from flask import Blueprint, abort, request, send_file
+from flask_login import login_required
+
+# A instância da aplicação principal, cujas credenciais são recarregadas ao guardar as definições;
+# as tarefas agendadas substituem extensions.tautulli_manager pelas suas próprias instâncias.
+from ..extensions import tautulli_manager, image_cache
+from ..services.image_cache import (
+    AVATAR_REDIRECT_HOSTS, AVATAR_SIZES, HAS_PILLOW, POSTER_SIZES, is_allowed_avatar_url, resize_square
+)
+
+img_bp = Blueprint('img', __name__)
+logger = logging.getLogger(__name__)
+
+MAX_IMAGE_BYTES = 5 * 1024 * 1024
+MAX_AVATAR_REDIRECTS = 3
+CACHE_MAX_AGE = 30 * 24 * 3600
+
+def _read_image(response):
+    """Lê o corpo de uma resposta de imagem, recusando ficheiros acima de MAX_IMAGE_BYTES."""
+    response.raise_for_status()
+    content = b""
+    for chunk in response.iter_content(64 * 1024):
+        content += chunk
+        if len(content) > MAX_IMAGE_BYTES:
+            raise ValueError("Imagem demasiado grande.")
+    return content, response.headers.get('Content-Type', '')
+
+def _serve(key, fetcher):
+    try:
+        cached = image_cache.get(key, fetcher)
+    except (requests.RequestException, ValueError) as e:
+        logger.warning(f"Falha ao obter a imagem '{key}': {e}")
+        abort(502)
+    if not cached:
+        abort(404)
+    path, etag, content_type = cached
+    response = send_file(path, mimetype=content_type, etag=etag, conditional=True, max_age=CACHE_MAX_AGE)
+    # As imagens só são servidas a utilizadores autenticados: não devem ficar em caches partilhadas.
+    response.cache_control.private = True
+    response.cache_control.public = False
+    response.cache_control.immutable = True
+    return response
+
+@img_bp.route('/poster')
+@login_required
+def poster():
+    """Poster do Plex obtido através do pms_image_proxy do Tautulli, já redimensionado pelo servidor."""
+    img = request.args.get('img', '')
+    width = request.args.get('w', type=int)
+    height = request.args.get('h', type=int)
+    if not img.startswith('/library/') or (width, height) not in POSTER_SIZES:
+        abort(400)
+
+    api_client = tautulli_manager.api_client
+    if not api_client.is_configured:
+        abort(404)
+
+    def fetch():
+        response = api_client.session.get(
+            f"{api_client.base_url}/pms_image_proxy",
+            params={"img": img, "width": width, "height": height, "apikey": api_client.api_key},
+            timeout=15, stream=True
+        )
+        if response.status_code == 404:
+            return None
+        return _read_image(response)
+
+    return _serve(f"poster|{img}|{width}x{height}", fetch)
+
+@img_bp.route('/avatar')
+@login_required
+def avatar():
+    """Avatar de utilizador servido pelo plex.tv, recortado e reduzido para um dos AVATAR_SIZES."""
+    url = request.args.get('url', '')
+    size = request.args.get('s', type=int)
+    if not is_allowed_avatar_url(url) or size not in AVATAR_SIZES:
+        abort(400)
+
+    def fetch():
+        # Os redirecionamentos são seguidos manualmente para validar cada destino.
+        target = url
+        for _ in range(MAX_AVATAR_REDIRECTS + 1):
+            response = requests.get(target, timeout=10, stream=True, allow_redirects=False)
+            if not response.is_redirect:
+                break
+            target = urljoin(target, response.headers.get('Location', ''))
+            response.close()
+            if not is_allowed_avatar_url(target, hosts=AVATAR_REDIRECT_HOSTS):
+                logger.warning(f"Redirecionamento de avatar para um domínio não permitido recusado: {target}")
+                return None
+        else:
+            return None
+        if response.status_code == 404:
+            return None
+        return resize_square(*_read_image(response), size)
+
+    # Sem Pillow o avatar é guardado no tamanho original: a chave distingue-o das variantes reduzidas.
+    return _serve(f"avatar|{url}|{size if HAS_PILLOW else 'original'}", fetch)
@@ -8,7 +8,7 @@ import logging
 
 from ..models import User, UserProfile
 from ..decorators import admin_required
-from ..config import is_configured, load_or_create_config
+from ..config import is_configured, get_config
 # Importa as instâncias dos gestores a partir das extensões
 from ..extensions import plex_manager, tautulli_manager, data_manager
 
@@ -96,7 +96,7 @@ def payment_page(token):
     Página de pagamento pública para um utilizador específico, utilizando um token seguro.
     """
     logger.info(f"Acesso à página de pagamento com o token: {token}")
-    config = load_or_create_config()
+    config = get_config()
     
     profile = UserProfile.query.filter_by(payment_token=token).first()
 
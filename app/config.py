@@ -1,18 +1,207 @@
 import os
+import copy
 import json
 import secrets
 import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from types import MappingProxyType
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem bloqueio consultivo entre processos
+    fcntl = None
 
 logger = logging.getLogger(__name__)
 
 # --- Constantes ---
 CONFIG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'config')
 CONFIG_FILE = os.path.join(CONFIG_DIR, 'config.json')
+CONFIG_LOCK_FILE = os.path.join(CONFIG_DIR, 'config.json.lock')
+
+# --- Snapshot da configuração em memória ---
+# O config.json é lido em praticamente todos os pedidos e chamadas de serviço.
+# Mantemos um snapshot imutável por processo que só é relido quando a assinatura
+# do ficheiro (mtime/tamanho) muda ou quando save_app_config é chamado.
+_snapshot_lock = threading.RLock()
+_snapshot_data = None
+# (vista só de leitura, assinatura do ficheiro): publicados numa única atribuição, para que a
+# leitura sem lock em get_config() nunca junte a vista de uma versão à assinatura de outra.
+_snapshot = (None, None)
+# Configuração de emergência, gerada uma única vez se o ficheiro nunca pôde ser lido.
+_fallback_view = None
+_cache_stats = {"hits": 0, "reloads": 0, "last_reload_at": None}
+
+def _file_signature():
+    """Devolve a assinatura (inode, mtime, tamanho) do config.json, ou None se não existir."""
+    try:
+        stat = os.stat(CONFIG_FILE)
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+@contextmanager
+def _config_write_lock():
+    """
+    Bloqueio exclusivo para escrever o config.json.
+    Combina o lock do processo com um flock consultivo num ficheiro auxiliar,
+    para que vários workers do Gunicorn não escrevam em simultâneo.
+    """
+    with _snapshot_lock:
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(CONFIG_DIR, exist_ok=True)
+        with open(CONFIG_LOCK_FILE, 'a') as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+def _read_config_file():
+    """Lê o config.json tal como está gravado, sem valores por omissão (None se não existir ou for ilegível)."""
+    try:
+        with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return config if isinstance(config, dict) else None
+
+def _read_revision_from_disk():
+    """Lê a revisão atualmente gravada no config.json (0 se não existir ou for ilegível)."""
+    try:
+        return int((_read_config_file() or {}).get("CONFIG_REVISION", 0))
+    except (ValueError, TypeError):
+        return 0
+
+def _freeze(value):
+    """Converte recursivamente dicionários e listas em estruturas só de leitura."""
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+def invalidate_config_cache():
+    """Força a releitura do config.json na próxima chamada a get_config()."""
+    global _snapshot
+    with _snapshot_lock:
+        _snapshot = (_snapshot[0], None)
+
+def get_config():
+    """
+    Devolve o snapshot imutável da configuração atual.
+    Ideal para leituras no caminho crítico: não copia nem relê o ficheiro
+    enquanto este não for alterado.
+    """
+    global _snapshot_data, _snapshot, _fallback_view
+    signature = _file_signature()
+    view, snapshot_signature = _snapshot
+    if signature is not None and view is not None and signature == snapshot_signature:
+        _cache_stats["hits"] += 1
+        return view
+
+    with _snapshot_lock:
+        signature = _file_signature()
+        view, snapshot_signature = _snapshot
+        if signature is not None and view is not None and signature == snapshot_signature:
+            _cache_stats["hits"] += 1
+            return view
+
+        config = _load_config_from_disk()
+        if config is None:
+            # Leitura falhou: mantém o último snapshot válido, se existir.
+            if view is not None:
+                return view
+            # Sem snapshot anterior, a configuração de emergência é criada uma só vez: uma SECRET_KEY
+            # nova a cada chamada invalidaria as sessões assinadas entre dois pedidos.
+            if _fallback_view is None:
+                _fallback_view = MappingProxyType({"SECRET_KEY": os.environ.get('SECRET_KEY') or secrets.token_hex(16)})
+            return _fallback_view
+
+        view = _freeze(config)
+        _snapshot_data = config
+        # Usa a assinatura lida antes do ficheiro para não mascarar escritas concorrentes.
+        _snapshot = (view, signature or _file_signature())
+        _cache_stats["reloads"] += 1
+        _cache_stats["last_reload_at"] = datetime.now().isoformat()
+        logger.debug("Snapshot da configuração (re)carregado a partir do disco.")
+        return view
+
+def get_config_revision():
+    """
+    Devolve a revisão do snapshot atual. Cada escrita incrementa o CONFIG_REVISION,
+    por isso os workers podem compará-lo para saber se a configuração mudou.
+    """
+    return get_config().get("CONFIG_REVISION", 0)
+
+def get_config_cache_stats():
+    """Devolve os contadores de acertos e recarregamentos do snapshot da configuração."""
+    return dict(_cache_stats)
+
+# --- Subscrição de alterações da configuração ---
+# Cada gestor declara as chaves de que depende; ao guardar as definições só
+# são recarregados os gestores cujas chaves mudaram efetivamente.
+_config_listeners = {}
+
+def register_config_listener(name, keys, callback):
+    """
+    Regista (ou substitui) um callback a invocar quando alguma das chaves mudar.
+    O nome identifica o subscritor, para que uma nova instância da aplicação
+    substitua o registo anterior em vez de o duplicar.
+    """
+    with _snapshot_lock:
+        _config_listeners[name] = (frozenset(keys), callback)
+
+def get_changed_config_keys(old_config, new_config):
+    """Devolve o conjunto de chaves cujo valor difere entre as duas configurações."""
+    all_keys = set(old_config.keys()) | set(new_config.keys())
+    return {key for key in all_keys if old_config.get(key) != new_config.get(key)}
+
+def notify_config_changes(old_config, new_config):
+    """
+    Invoca os subscritores afetados pelas diferenças entre as duas configurações.
+    Devolve um dicionário {nome_do_subscritor: resultado_do_callback}.
+    """
+    changed_keys = get_changed_config_keys(old_config, new_config)
+    if not changed_keys:
+        return {}
+
+    with _snapshot_lock:
+        listeners = list(_config_listeners.items())
+
+    results = {}
+    for name, (keys, callback) in listeners:
+        affected = keys & changed_keys
+        if not affected:
+            continue
+        logger.info(f"Configuração alterada ({', '.join(sorted(affected))}). A recarregar '{name}'.")
+        try:
+            results[name] = callback()
+        except Exception as e:
+            logger.error(f"Falha ao recarregar '{name}' após alteração da configuração: {e}", exc_info=True)
+            results[name] = e
+    return results
 
 def load_or_create_config():
+    """
+    Devolve uma cópia mutável da configuração atual.
+    Usa o snapshot em memória; para leituras simples prefira get_config().
+    """
+    with _snapshot_lock:
+        view = get_config()
+        if view is _snapshot[0] and _snapshot_data is not None:
+            return copy.deepcopy(_snapshot_data)
+        return dict(view)
+
+def _load_config_from_disk():
     """
     Carrega a configuração do config.json ou cria um ficheiro padrão se não existir.
     A SECRET_KEY é tratada com prioridade para segurança.
+    Devolve None se o ficheiro existir mas não puder ser lido.
     """
     # Garante que o diretório de configuração existe
     os.makedirs(CONFIG_DIR, exist_ok=True)
@@ -98,9 +287,16 @@ def load_or_create_config():
             "ACHIEVEMENT_TIME_TRAVELER_GOLD": 7,
             "ACHIEVEMENT_DIRECTOR_FAN_BRONZE": 3,
             "ACHIEVEMENT_DIRECTOR_FAN_SILVER": 5,
-            "ACHIEVEMENT_DIRECTOR_FAN_GOLD": 7
+            "ACHIEVEMENT_DIRECTOR_FAN_GOLD": 7,
+            "HISTORY_SYNC_INTERVAL_MINUTES": 5,
+            "IMAGE_CACHE_MAX_MB": 200,
+            "STATS_PROCESS_POOL_WORKERS": 2,
+            "STATS_PROCESS_POOL_ROW_THRESHOLD": 20000,
+            "INACTIVE_USERS_DAYS": 30,
+            "INACTIVE_REPORT_ENABLED": True
         }
         save_app_config(default_config)
+        default_config["CONFIG_REVISION"] = _read_revision_from_disk()
         return default_config
     else:
         try:
@@ -168,6 +364,12 @@ def load_or_create_config():
                 config.setdefault("ACHIEVEMENT_DIRECTOR_FAN_BRONZE", 3)
                 config.setdefault("ACHIEVEMENT_DIRECTOR_FAN_SILVER", 5)
                 config.setdefault("ACHIEVEMENT_DIRECTOR_FAN_GOLD", 7)
+                config.setdefault("HISTORY_SYNC_INTERVAL_MINUTES", 5)
+                config.setdefault("IMAGE_CACHE_MAX_MB", 200)
+                config.setdefault("STATS_PROCESS_POOL_WORKERS", 2)
+                config.setdefault("STATS_PROCESS_POOL_ROW_THRESHOLD", 20000)
+                config.setdefault("INACTIVE_USERS_DAYS", 30)
+                config.setdefault("INACTIVE_REPORT_ENABLED", True)
 
             log_file_path = config.get("LOG_FILE")
             if log_file_path and not os.path.isabs(log_file_path):
@@ -177,20 +379,79 @@ def load_or_create_config():
             return config
         except (json.JSONDecodeError, IOError) as e:
             logger.error(f"Erro ao carregar o ficheiro de configuração: {e}")
-            # Retorna uma configuração mínima de emergência
-            return {"SECRET_KEY": secrets.token_hex(16)}
+            # O chamador decide a configuração mínima de emergência
+            return None
 
-def save_app_config(new_config):
-    """Salva a nova configuração no config.json."""
+def save_app_config(new_config, base_config=None):
+    """
+    Salva a nova configuração no config.json de forma atómica.
+    O conteúdo é escrito num ficheiro temporário, sincronizado com fsync e só depois
+    renomeado sobre o original, sob um bloqueio exclusivo. Assim, um leitor noutro
+    processo vê sempre a versão anterior completa ou a nova, nunca um ficheiro truncado.
+    A revisão (CONFIG_REVISION) é incrementada a cada escrita; o dicionário recebido não é alterado.
+
+    Se new_config foi lido numa revisão anterior à do disco, outra escrita aconteceu entretanto.
+    Com base_config (a configuração tal como foi lida), só as chaves alteradas em relação a ela
+    são aplicadas sobre o ficheiro atual; sem ela, a escrita é recusada para não perder essa alteração.
+    :return: True se a configuração foi gravada.
+    """
+    tmp_path = None
     try:
-        with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-            json.dump(new_config, f, indent=4)
+        os.makedirs(CONFIG_DIR, exist_ok=True)
+        with _config_write_lock():
+            config = dict(new_config)
+            disk_revision = _read_revision_from_disk()
+            base_revision = config.get("CONFIG_REVISION")
+            if base_revision is not None and int(base_revision) < disk_revision:
+                disk_config = _read_config_file()
+                if base_config is None or disk_config is None:
+                    logger.error(f"Configuração baseada na revisão {base_revision}, mas o disco já está na revisão {disk_revision}. A gravação foi recusada para não substituir as alterações mais recentes.")
+                    return False
+                changed_keys = get_changed_config_keys(base_config, config)
+                for key in changed_keys:
+                    if key in config:
+                        disk_config[key] = config[key]
+                    else:
+                        disk_config.pop(key, None)
+                config = disk_config
+                logger.warning(f"Configuração baseada na revisão {base_revision}, mas o disco já está na revisão {disk_revision}. Aplicadas apenas as {len(changed_keys)} chave(s) alteradas sobre a versão atual.")
+            config["CONFIG_REVISION"] = max(disk_revision, int(base_revision or 0)) + 1
+
+            fd, tmp_path = tempfile.mkstemp(dir=CONFIG_DIR, prefix='.config.', suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(config, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            # O mkstemp cria o ficheiro com 0600; mantém as permissões do ficheiro original.
+            try:
+                mode = os.stat(CONFIG_FILE).st_mode & 0o777
+            except OSError:
+                current_umask = os.umask(0)
+                os.umask(current_umask)
+                mode = 0o666 & ~current_umask
+            os.chmod(tmp_path, mode)
+            os.replace(tmp_path, CONFIG_FILE)
+            tmp_path = None
+
+            # Garante que a renomeação em si também fica persistida.
+            if hasattr(os, 'O_DIRECTORY'):
+                dir_fd = os.open(CONFIG_DIR, os.O_RDONLY | os.O_DIRECTORY)
+                try:
+                    os.fsync(dir_fd)
+                finally:
+                    os.close(dir_fd)
         return True
-    except IOError as e:
+    except (IOError, OSError, ValueError, TypeError) as e:
         logger.error(f"Não foi possível salvar a configuração em {CONFIG_FILE}: {e}")
         return False
+    finally:
+        if tmp_path and os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        invalidate_config_cache()
 
 def is_configured():
     """Verifica se a aplicação já foi configurada."""
-    config = load_or_create_config()
-    return config.get("IS_CONFIGURED", False)
+    return get_config().get("IS_CONFIGURED", False)
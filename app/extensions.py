@@ -42,3 +42,6 @@ efi_manager = None
 mercado_pago_manager = None
 overseerr_manager = None
 link_shortener = None
+image_cache = None
+compute_pool = None
+live_sessions = None
@@ -76,6 +76,7 @@ class UserProfile(db.Model):
     hide_from_leaderboard = db.Column(db.Boolean, default=False, nullable=False)
     libraries = db.Column(db.Text, nullable=True)
     payment_token = db.Column(db.String, unique=True, nullable=True)
+    last_played_at = db.Column(db.String, nullable=True, index=True) # Última reprodução (ISO 8601 UTC), do webhook ou da sincronização do histórico
 
 class PixPayment(db.Model):
     __tablename__ = 'pix_payments'
@@ -116,3 +117,100 @@ class UnlockedAchievement(db.Model):
     unlocked_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     __table_args__ = (db.UniqueConstraint('username', 'achievement_id', name='_username_achievement_uc'),)
+
+class WatchHistory(db.Model):
+    """Cópia local do histórico de visualizações do Tautulli (uma linha por entrada de get_history)."""
+    __tablename__ = 'watch_history'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False) # 'id' da linha no Tautulli
+    reference_id = db.Column(db.Integer, nullable=True, index=True)
+    date = db.Column(db.Integer, nullable=False, index=True) # Epoch (segundos) do início da sessão
+    started = db.Column(db.Integer)
+    stopped = db.Column(db.Integer)
+    duration = db.Column(db.Integer, nullable=False, default=0)
+    paused_counter = db.Column(db.Integer, default=0)
+    user = db.Column(db.String, nullable=False)
+    user_id = db.Column(db.Integer)
+    friendly_name = db.Column(db.String)
+    platform = db.Column(db.String)
+    player = db.Column(db.String)
+    product = db.Column(db.String)
+    media_type = db.Column(db.String(20))
+    rating_key = db.Column(db.Integer)
+    parent_rating_key = db.Column(db.Integer)
+    grandparent_rating_key = db.Column(db.Integer)
+    title = db.Column(db.String)
+    parent_title = db.Column(db.String)
+    grandparent_title = db.Column(db.String)
+    full_title = db.Column(db.String)
+    year = db.Column(db.Integer)
+    media_index = db.Column(db.Integer)
+    parent_media_index = db.Column(db.Integer)
+    thumb = db.Column(db.String)
+    section_id = db.Column(db.Integer)
+    transcode_decision = db.Column(db.String(20))
+    stream_video_decision = db.Column(db.String(20))
+    percent_complete = db.Column(db.Integer)
+    watched_status = db.Column(db.Float)
+    genres = db.Column(db.Text) # Lista JSON
+    directors = db.Column(db.Text) # Lista JSON
+
+    __table_args__ = (db.Index('ix_watch_history_user_date', 'user', 'date'),)
+
+    def to_dict(self):
+        """Devolve a linha no mesmo formato que uma entrada de get_history do Tautulli."""
+        item = {c.name: getattr(self, c.name) for c in self.__table__.columns}
+        item['genres'] = json.loads(self.genres) if self.genres else []
+        item['directors'] = json.loads(self.directors) if self.directors else []
+        return item
+
+class DailyUserStats(db.Model):
+    """Agregado diário por utilizador e tipo de media, derivado de watch_history (dia em hora local)."""
+    __tablename__ = 'daily_user_stats'
+    user = db.Column(db.String, primary_key=True)
+    day = db.Column(db.String(10), primary_key=True) # 'YYYY-MM-DD'
+    media_type = db.Column(db.String(20), primary_key=True)
+    plays = db.Column(db.Integer, nullable=False, default=0)
+    duration = db.Column(db.Integer, nullable=False, default=0)
+    late_night_plays = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (db.Index('ix_daily_user_stats_day_user', 'day', 'user'),)
+
+class UserDevice(db.Model):
+    """Índice de dispositivos (leitor + plataforma) usados por cada utilizador, derivado de watch_history."""
+    __tablename__ = 'user_devices'
+    username = db.Column(db.String, primary_key=True)
+    player = db.Column(db.String, primary_key=True, default='')
+    platform = db.Column(db.String, primary_key=True, default='')
+    first_seen = db.Column(db.Integer, nullable=False)
+    last_seen = db.Column(db.Integer, nullable=False)
+    play_count = db.Column(db.Integer, nullable=False, default=0)
+
+class WrappedSnapshot(db.Model):
+    """Resumo anual ("Wrapped") de um utilizador, gerado em lote e guardado como JSON."""
+    __tablename__ = 'wrapped_snapshots'
+    username = db.Column(db.String, primary_key=True)
+    year = db.Column(db.Integer, primary_key=True)
+    data = db.Column(db.Text, nullable=False) # JSON
+    generated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (db.Index('ix_wrapped_snapshots_year', 'year'),)
+
+class TitleSimilarity(db.Model):
+    """Os títulos mais vistos pelo mesmo público de cada título (top-K por co-visualização), recalculados todas as noites."""
+    __tablename__ = 'title_similarities'
+    rating_key = db.Column(db.Integer, primary_key=True) # Filme, ou série no caso de episódios
+    neighbor_rating_key = db.Column(db.Integer, primary_key=True)
+    rank = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Float, nullable=False)
+    co_viewers = db.Column(db.Integer, nullable=False)
+    title = db.Column(db.String)
+    media_type = db.Column(db.String(20)) # 'movie' ou 'show'
+    neighbor_title = db.Column(db.String)
+    neighbor_media_type = db.Column(db.String(20))
+
+class SyncState(db.Model):
+    """Marcadores chave/valor das sincronizações com serviços externos."""
+    __tablename__ = 'sync_state'
+    key = db.Column(db.String, primary_key=True)
+    value = db.Column(db.String)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -3,16 +3,30 @@
 import logging
 from datetime import datetime
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 from tzlocal import get_localzone 
 
 from .config import load_or_create_config
 
 logger = logging.getLogger(__name__)
 
+# Aplicação principal, registada por setup_scheduler. As tarefas correm no contexto dela e usam os
+# gestores já criados (extensions.*): uma nova aplicação por execução substituiria o servidor do
+# Socket.IO ligado aos browsers, os handlers de log e os gestores partilhados com os pedidos.
+_app = None
+
+def _job_app():
+    """Aplicação em cujo contexto as tarefas agendadas correm."""
+    if _app is not None:
+        return _app
+    # Só acontece se o agendador não foi iniciado por setup_scheduler neste processo.
+    from . import create_app
+    return create_app(_from_job=True)
+
 def expiration_notification_job():
     """Tarefa agendada para enviar notificações de vencimento."""
-    from . import create_app, extensions
-    app = create_app(_from_job=True)
+    from . import extensions
+    app = _job_app()
     with app.app_context():
         with app.test_request_context():
             logger.info("A executar a tarefa de notificação de vencimentos...")
@@ -41,8 +55,8 @@ def expiration_notification_job():
 
 def end_trial_job(username):
     """Tarefa individual acionada no fim exato do período de teste de um utilizador."""
-    from . import create_app, extensions
-    app = create_app(_from_job=True)
+    from . import extensions
+    app = _job_app()
     with app.app_context():
         with app.test_request_context():
             logger.info(f"Fim do período de teste para '{username}'. A acionar o bloqueio.")
@@ -56,12 +70,16 @@ def end_trial_job(username):
                 if user_info:
                     config = load_or_create_config()
                     profile = extensions.data_manager.get_user_profile(username)
-                    extensions.plex_manager.notifier_manager.send_trial_end_notification(user_info, profile)
                     notifier_id = config.get('TRIAL_BLOCK_NOTIFIER_ID')
-                    extensions.tautulli_manager.manage_block_unblock(user_info['email'], username, 'add', notifier_id=notifier_id, reason='trial_expired')
+                    # O bloqueio é agendado primeiro: a escrita no Tautulli decorre enquanto a notificação é enviada.
+                    block = extensions.tautulli_manager.submit_block_unblock(user_info['email'], username, 'add', notifier_id=notifier_id, reason='trial_expired')
+                    extensions.plex_manager.notifier_manager.send_trial_end_notification(user_info, profile)
                     if profile:
                         profile['trial_job_id'] = None
                         extensions.data_manager.set_user_profile(username, profile)
+                    result = block.result()
+                    if not result.get("success"):
+                        logger.error(f"Falha ao bloquear '{username}' no fim do período de teste: {result.get('message')}")
                 else:
                     logger.warning(f"Utilizador '{username}' não encontrado na lista do Plex durante a tarefa de fim de teste.")
             except Exception as e:
@@ -69,8 +87,8 @@ def end_trial_job(username):
 
 def end_subscription_job(username):
     """Tarefa individual acionada no fim exato da subscrição de um utilizador."""
-    from . import create_app, extensions
-    app = create_app(_from_job=True)
+    from . import extensions
+    app = _job_app()
     with app.app_context():
         with app.test_request_context():
             logger.info(f"Fim da subscrição para '{username}'. A acionar o bloqueio.")
@@ -92,8 +110,8 @@ def end_subscription_job(username):
 
 def removal_job():
     """Tarefa agendada para remover os que estão bloqueados há muito tempo."""
-    from . import create_app, extensions
-    app = create_app(_from_job=True)
+    from . import extensions
+    app = _job_app()
     with app.app_context():
         with app.test_request_context():
             logger.info("A executar a tarefa de remoção de utilizadores bloqueados...")
@@ -104,21 +122,27 @@ def removal_job():
                     return
                 
                 users_to_remove = extensions.plex_manager.get_users_to_remove()
+                # As alterações aos notificadores são agendadas durante o ciclo e agrupadas pela fila
+                # de cada notificador; só no fim se espera por todas.
+                notifier_futures = []
                 for username in users_to_remove:
                     logger.info(f"A processar remoção de utilizador bloqueado: {username}")
                     user_info = next((u for u in all_users if u['username'] == username), None)
                     if user_info:
-                        extensions.plex_manager.remove_user(user_info['email'])
+                        extensions.plex_manager.remove_user(user_info['email'], notifier_futures=notifier_futures)
                     else:
                         extensions.data_manager.remove_blocked_user(username)
+                failed = [r for r in (f.result() for f in notifier_futures) if not r.get("success")]
+                for result in failed:
+                    logger.error(f"Falha ao atualizar um notificador do Tautulli durante a remoção: {result.get('message')}")
             except Exception as e:
                 logger.error(f"Erro durante a execução da tarefa de remoção: {e}", exc_info=True)
             logger.info("Tarefa de remoção concluída.")
 
 def cleanup_job():
     """Tarefa agendada para limpar dados antigos da aplicação."""
-    from . import create_app, extensions
-    app = create_app(_from_job=True)
+    from . import extensions
+    app = _job_app()
     with app.app_context():
         with app.test_request_context():
             logger.info("A executar a tarefa de limpeza de dados antigos...")
@@ -131,9 +155,78 @@ def cleanup_job():
                 logger.error(f"Erro durante a execução da tarefa de limpeza: {e}", exc_info=True)
             logger.info("Tarefa de limpeza concluída.")
 
+def history_sync_job():
+    """Tarefa agendada para sincronizar o espelho local do histórico do Tautulli."""
+    from . import extensions
+    app = _job_app()
+    with app.app_context():
+        with app.test_request_context():
+            try:
+                result = extensions.tautulli_manager.sync_history()
+                if not result.get('success'):
+                    logger.warning(f"Sincronização do histórico não concluída: {result.get('message')}")
+            except Exception as e:
+                logger.error(f"Erro durante a execução da tarefa de sincronização do histórico: {e}", exc_info=True)
+
+def wrapped_job(year=None):
+    """Gera os resumos anuais ("Wrapped") de todos os utilizadores; por omissão, do ano anterior."""
+    from . import extensions
+    app = _job_app()
+    with app.app_context():
+        with app.test_request_context():
+            year = year or datetime.now().year - 1
+            logger.info(f"A gerar os resumos anuais de {year}...")
+            try:
+                result = extensions.tautulli_manager.generate_wrapped(year)
+                if not result.get('success'):
+                    logger.warning(f"Geração dos resumos anuais de {year} não concluída: {result.get('message')}")
+            except Exception as e:
+                logger.error(f"Erro durante a execução da tarefa de resumos anuais: {e}", exc_info=True)
+
+def recommendations_job():
+    """Tarefa agendada para recalcular os títulos semelhantes por co-visualização."""
+    from . import extensions
+    app = _job_app()
+    with app.app_context():
+        with app.test_request_context():
+            try:
+                result = extensions.tautulli_manager.rebuild_recommendations()
+                if not result.get('success'):
+                    logger.warning(f"Cálculo das recomendações não concluído: {result.get('message')}")
+            except Exception as e:
+                logger.error(f"Erro durante a execução da tarefa de recomendações: {e}", exc_info=True)
+
+def inactive_users_report_job():
+    """Relatório semanal, como notificação de administrador, dos utilizadores sem reproduções há INACTIVE_USERS_DAYS dias."""
+    from . import extensions
+    from flask_babel import ngettext
+    app = _job_app()
+    with app.app_context():
+        with app.test_request_context():
+            try:
+                config = load_or_create_config()
+                if not config.get("INACTIVE_REPORT_ENABLED", True):
+                    return
+                days = int(config.get("INACTIVE_USERS_DAYS", 30))
+                inactive = extensions.data_manager.get_inactive_users(days, include_blocked=False)
+                logger.info(f"Relatório de inatividade: {len(inactive)} utilizador(es) sem reproduções há {days} dias ou mais.")
+                if not inactive:
+                    return
+                names = ", ".join(u['username'] for u in inactive[:10]) + ("…" if len(inactive) > 10 else "")
+                message = ngettext(
+                    '%(num)d utilizador sem reproduções há %(days)d dias ou mais: %(names)s',
+                    '%(num)d utilizadores sem reproduções há %(days)d dias ou mais: %(names)s',
+                    len(inactive)
+                ) % {'num': len(inactive), 'days': days, 'names': names}
+                extensions.data_manager.create_notification(message=message, category='warning', link='/users')
+            except Exception as e:
+                logger.error(f"Erro durante a execução do relatório de utilizadores inativos: {e}", exc_info=True)
+
 def setup_scheduler(app):
     """Configura e inicia o agendador com as tarefas recorrentes da aplicação."""
+    global _app
     from . import extensions
+    _app = app
     with app.app_context():
         config = load_or_create_config()
         
@@ -163,6 +256,43 @@ def setup_scheduler(app):
             replace_existing=True
         )
 
+        sync_interval = max(1, int(config.get("HISTORY_SYNC_INTERVAL_MINUTES", 5)))
+        extensions.scheduler.add_job(
+            id='history_sync_job',
+            func=history_sync_job,
+            trigger=IntervalTrigger(minutes=sync_interval, timezone=tz),
+            next_run_time=datetime.now(get_localzone()),
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True
+        )
+
+        extensions.scheduler.add_job(
+            id='recommendations_job',
+            func=recommendations_job,
+            trigger=CronTrigger(hour=4, minute=30, timezone=tz),
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True
+        )
+
+        extensions.scheduler.add_job(
+            id='inactive_users_report_job',
+            func=inactive_users_report_job,
+            trigger=CronTrigger(day_of_week='mon', hour=9, minute=30, timezone=tz),
+            max_instances=1,
+            replace_existing=True
+        )
+
+        # Os resumos do ano anterior ficam prontos no primeiro dia do ano, depois da sincronização noturna.
+        extensions.scheduler.add_job(
+            id='wrapped_job',
+            func=wrapped_job,
+            trigger=CronTrigger(month=1, day=1, hour=5, minute=0, timezone=tz),
+            max_instances=1,
+            replace_existing=True
+        )
+
         if not extensions.scheduler.running:
             extensions.scheduler.start()
             logger.info("Agendador de tarefas iniciado.")
@@ -0,0 +1,207 @@
+# app/services/compute_pool.py
+import time
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from ..config import get_config
+
+logger = logging.getLogger(__name__)
+
+def _timed_call(func, args):
+    """Executado no processo de cálculo: devolve o resultado e o tempo de CPU gasto na função."""
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+class ComputePool:
+    """
+    Executa agregações pesadas num conjunto limitado de processos.
+
+    A aplicação corre num único worker eventlet: um ciclo de Python puro que não cede o
+    controlo bloqueia todos os pedidos e a tarefa de fundo do Socket.IO. Trabalhos com
+    pelo menos STATS_PROCESS_POOL_ROW_THRESHOLD linhas são enviados para um processo à
+    parte e o resultado é aguardado com time.sleep (cooperativo com o monkey-patch do
+    eventlet); trabalhos pequenos continuam a correr no próprio processo.
+
+    Os processos usam o método 'spawn', para não herdarem o hub do eventlet, as threads
+    do agendador nem as ligações à base de dados do processo principal.
+    """
+
+    CONFIG_KEYS = ('STATS_PROCESS_POOL_WORKERS', 'STATS_PROCESS_POOL_ROW_THRESHOLD')
+    POLL_INTERVAL_MIN = 0.005
+    POLL_INTERVAL_MAX = 0.05
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._stats = {"inline_jobs": 0, "process_jobs": 0, "fallbacks": 0, "last": None}
+        self.reload_config()
+
+    def reload_config(self):
+        """Relê o número de processos e o limiar; o pool é recriado no próximo trabalho."""
+        config = get_config()
+        self.max_workers = max(0, int(config.get('STATS_PROCESS_POOL_WORKERS', 2) or 0))
+        self.row_threshold = max(0, int(config.get('STATS_PROCESS_POOL_ROW_THRESHOLD', 20000) or 0))
+        # Limita os trabalhos pendentes, para que um pico de pedidos não acumule cópias do histórico em memória.
+        self._slots = threading.BoundedSemaphore(max(1, self.max_workers * 2))
+        self.shutdown()
+        logger.info(f"Pool de cálculo: {self.max_workers} processo(s), limiar de {self.row_threshold} linhas.")
+
+    @property
+    def enabled(self):
+        return self.max_workers > 0
+
+    def should_offload(self, rows):
+        """Indica se um trabalho com `rows` linhas seria enviado para o pool de processos."""
+        return self.enabled and rows >= self.row_threshold
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._executor
+
+    def _discard_executor(self, executor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _wait(self, future):
+        """Espera pelo resultado a dormir em intervalos crescentes, cedendo o controlo ao hub do eventlet."""
+        interval = self.POLL_INTERVAL_MIN
+        while not future.done():
+            time.sleep(interval)
+            interval = min(interval * 2, self.POLL_INTERVAL_MAX)
+        return future.result()
+
+    def run(self, func, *args, rows=0, label=None):
+        """
+        Executa func(*args) e devolve (resultado, metadados de tempo).
+        `func` e os argumentos têm de ser serializáveis (funções de módulo, dados simples).
+        """
+        label = label or func.__name__
+        meta = {"label": label, "rows": rows, "mode": "inline"}
+        start = time.perf_counter()
+
+        if self.should_offload(rows):
+            # reload_config() substitui o semáforo: a libertação tem de ser feita no mesmo que foi adquirido.
+            slots = self._slots
+            acquired = False
+            executor = None
+            try:
+                while not slots.acquire(blocking=False):
+                    time.sleep(self.POLL_INTERVAL_MAX)
+                acquired = True
+                executor = self._get_executor()
+                result, compute_seconds = self._wait(executor.submit(_timed_call, func, args))
+                meta.update(mode="process", compute_ms=round(compute_seconds * 1000, 1))
+            except BrokenProcessPool as e:
+                logger.error(f"Pool de cálculo indisponível ({e}); '{label}' será calculado no processo principal.")
+                if executor:
+                    self._discard_executor(executor)
+                with self._lock:
+                    self._stats["fallbacks"] += 1
+            finally:
+                if acquired:
+                    slots.release()
+
+        if meta["mode"] == "inline":
+            compute_start = time.perf_counter()
+            result = func(*args)
+            meta["compute_ms"] = round((time.perf_counter() - compute_start) * 1000, 1)
+
+        meta["wall_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        # Em modo 'process', a diferença entre wall_ms e compute_ms é o custo de serialização e de espera.
+        logger.debug(f"Pool de cálculo: '{label}' ({rows} linhas) em modo {meta['mode']}: {meta['wall_ms']} ms.")
+        with self._lock:
+            self._stats[f"{meta['mode']}_jobs"] += 1
+            self._stats["last"] = dict(meta)
+        return result, meta
+
+    def map(self, func, chunks, rows=0, label=None):
+        """
+        Executa func(*args) para cada tuplo de argumentos em `chunks`, repartidos pelos processos.
+        Devolve (resultados pela ordem de `chunks`, metadados de tempo).
+
+        Há no máximo um bloco por processo em curso, para que os trabalhos interativos enviados
+        entretanto por run() esperem, no pior caso, pelo fim de um bloco. Sem pool, os blocos
+        correm no próprio processo, cedendo o controlo entre eles.
+        """
+        label = label or func.__name__
+        chunks = list(chunks)
+        meta = {"label": label, "rows": rows, "chunks": len(chunks), "mode": "inline"}
+        start = time.perf_counter()
+        results = [None] * len(chunks)
+        completed = set()
+        compute_seconds = 0.0
+
+        # Tal como o semáforo em run(), o número de processos é fixado no início: reload_config() pode alterá-lo.
+        max_workers = self.max_workers
+        if max_workers > 0 and chunks:
+            executor = None
+            pending = {}
+            try:
+                executor = self._get_executor()
+                next_index = 0
+                interval = self.POLL_INTERVAL_MIN
+                while next_index < len(chunks) or pending:
+                    while next_index < len(chunks) and len(pending) < max_workers:
+                        pending[executor.submit(_timed_call, func, chunks[next_index])] = next_index
+                        next_index += 1
+                    done = [future for future in pending if future.done()]
+                    if not done:
+                        time.sleep(interval)
+                        interval = min(interval * 2, self.POLL_INTERVAL_MAX)
+                        continue
+                    interval = self.POLL_INTERVAL_MIN
+                    for future in done:
+                        index = pending.pop(future)
+                        results[index], seconds = future.result()
+                        compute_seconds += seconds
+                        completed.add(index)
+                meta["mode"] = "process"
+            except BrokenProcessPool as e:
+                logger.error(f"Pool de cálculo indisponível ({e}); os blocos restantes de '{label}' serão calculados no processo principal.")
+                if executor:
+                    self._discard_executor(executor)
+                with self._lock:
+                    self._stats["fallbacks"] += 1
+
+        if meta["mode"] == "inline":
+            for index, args in enumerate(chunks):
+                if index in completed:
+                    continue
+                compute_start = time.perf_counter()
+                results[index] = func(*args)
+                compute_seconds += time.perf_counter() - compute_start
+                time.sleep(0)
+
+        meta["compute_ms"] = round(compute_seconds * 1000, 1)
+        meta["wall_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        logger.debug(f"Pool de cálculo: '{label}' ({rows} linhas, {len(chunks)} blocos) em modo {meta['mode']}: {meta['wall_ms']} ms.")
+        with self._lock:
+            self._stats[f"{meta['mode']}_jobs"] += 1
+            self._stats["last"] = dict(meta)
+        return results, meta
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "row_threshold": self.row_threshold,
+                "running": self._executor is not None,
+                **{k: (dict(v) if isinstance(v, dict) else v) for k, v in self._stats.items()}
+            }
@@ -5,8 +5,9 @@ import logging
 import secrets
 from datetime import datetime, timedelta, timezone
 from ..extensions import db
-from ..models import Invitation, BlockedUser, UserProfile, PixPayment, Notification, UnlockedAchievement, ShortLink
-from sqlalchemy import func, extract, not_
+from ..models import Invitation, BlockedUser, UserProfile, PixPayment, Notification, UnlockedAchievement, ShortLink, WatchHistory, SyncState, DailyUserStats, UserDevice, WrappedSnapshot, TitleSimilarity
+from sqlalchemy import func, extract, not_, or_, case, select, update, cast, Integer
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from tzlocal import get_localzone
 from flask_babel import gettext as _, ngettext
 
@@ -95,39 +96,48 @@ class DataManager:
             return 0
 
     # --- MÉTODOS FINANCEIROS ---
-    def get_financial_summary(self, year, month, renewal_days=7):
+    def get_financial_summary(self, year, month, renewal_days=7, date_range=None):
+        """
+        Resumo financeiro de um mês ou, com date_range (DateRange), de um intervalo de dias arbitrário.
+        No segundo caso, a receita diária é indexada pela data ('YYYY-MM-DD') em vez do dia do mês.
+        """
+        if date_range:
+            payment_day = func.date(PixPayment.created_at)
+            period_filters = [payment_day >= date_range.start_str, payment_day <= date_range.end_str, PixPayment.status == 'CONCLUIDA']
+        else:
+            period_filters = [
+                extract('year', PixPayment.created_at) == year,
+                extract('month', PixPayment.created_at) == month,
+                PixPayment.status == 'CONCLUIDA'
+            ]
         confirmed_payments_query = db.session.query(
             PixPayment
-        ).filter(
-            extract('year', PixPayment.created_at) == year,
-            extract('month', PixPayment.created_at) == month,
-            PixPayment.status == 'CONCLUIDA'
-        )
+        ).filter(*period_filters)
         confirmed_payments = confirmed_payments_query.order_by(PixPayment.created_at.desc()).all()
         total_revenue = sum(p.value for p in confirmed_payments)
         sales_count = len(confirmed_payments)
+        day_expr = func.date(PixPayment.created_at) if date_range else extract('day', PixPayment.created_at)
         daily_revenue_data = db.session.query(
-            extract('day', PixPayment.created_at).label('day'),
-            func.sum(PixPayment.value).label('total')
-        ).filter(
-            extract('year', PixPayment.created_at) == year,
-            extract('month', PixPayment.created_at) == month,
-            PixPayment.status == 'CONCLUIDA'
-        ).group_by('day').order_by('day').all()
-        weekly_revenue_data = db.session.query(
-            func.strftime('%W', PixPayment.created_at).label('week_number'),
+            day_expr.label('day'),
             func.sum(PixPayment.value).label('total')
-        ).filter(
-            extract('year', PixPayment.created_at) == year,
-            extract('month', PixPayment.created_at) == month,
-            PixPayment.status == 'CONCLUIDA'
-        ).group_by('week_number').order_by('week_number').all()
+        ).filter(*period_filters).group_by('day').order_by('day').all()
         weekly_revenue_dict = {}
-        if weekly_revenue_data:
-            first_week_num = int(weekly_revenue_data[0].week_number)
-            for row in weekly_revenue_data:
-                relative_week = int(row.week_number) - first_week_num + 1
-                weekly_revenue_dict[f"Semana {relative_week}"] = row.total
+        if date_range:
+            # '%W' recomeça em cada ano: num intervalo livre, as semanas contam-se a partir do primeiro dia.
+            for row in daily_revenue_data:
+                relative_week = (datetime.fromisoformat(row.day).date() - date_range.start).days // 7 + 1
+                label = f"Semana {relative_week}"
+                weekly_revenue_dict[label] = weekly_revenue_dict.get(label, 0) + row.total
+        else:
+            weekly_revenue_data = db.session.query(
+                func.strftime('%W', PixPayment.created_at).label('week_number'),
+                func.sum(PixPayment.value).label('total')
+            ).filter(*period_filters).group_by('week_number').order_by('week_number').all()
+            if weekly_revenue_data:
+                first_week_num = int(weekly_revenue_data[0].week_number)
+                for row in weekly_revenue_data:
+                    relative_week = int(row.week_number) - first_week_num + 1
+                    weekly_revenue_dict[f"Semana {relative_week}"] = row.total
         today = datetime.now(get_localzone()).date()
         end_date = today + timedelta(days=renewal_days)
         today_str = today.isoformat()
@@ -179,6 +189,81 @@ class DataManager:
         db.session.add(profile)
         db.session.commit()
     
+    # Formato de last_played_at: ISO 8601 em UTC, sem microssegundos, para que a ordem das strings seja a cronológica.
+    LAST_PLAYED_FORMAT = '%Y-%m-%dT%H:%M:%S+00:00'
+
+    def touch_user_last_played(self, username, played_at):
+        """Avança a data da última reprodução (datetime) de um utilizador com perfil existente; nunca a recua."""
+        profile = UserProfile.query.get(username)
+        if not profile:
+            return False
+        played_at = played_at.astimezone(timezone.utc).strftime(self.LAST_PLAYED_FORMAT)
+        if profile.last_played_at and profile.last_played_at >= played_at:
+            return False
+        profile.last_played_at = played_at
+        db.session.commit()
+        return True
+
+    def refresh_last_played(self, usernames=None):
+        """
+        Avança last_played_at a partir do espelho do histórico (fim da sessão mais recente), para todos os
+        perfis ou só para `usernames`, num único UPDATE. O máximo por utilizador usa ix_watch_history_user_date.
+        """
+        latest = select(func.max(func.coalesce(WatchHistory.stopped, WatchHistory.date))).where(
+            WatchHistory.user == UserProfile.username
+        ).scalar_subquery()
+        latest_iso = func.strftime(self.LAST_PLAYED_FORMAT, latest, 'unixepoch')
+        stmt = update(UserProfile).where(
+            latest.isnot(None),
+            or_(UserProfile.last_played_at.is_(None), UserProfile.last_played_at < latest_iso)
+        ).values(last_played_at=latest_iso)
+        if usernames is not None:
+            stmt = stmt.where(UserProfile.username.in_(list(usernames)))
+        try:
+            result = db.session.execute(stmt.execution_options(synchronize_session=False))
+            db.session.commit()
+            return result.rowcount
+        except Exception as e:
+            logger.error(f"Falha ao atualizar a última reprodução dos utilizadores: {e}")
+            db.session.rollback()
+            raise
+
+    def get_inactive_users(self, idle_days, include_blocked=True):
+        """
+        Perfis sem reproduções há pelo menos `idle_days` dias (ou sem nenhuma), do mais inativo para o
+        menos inativo, com a data de expiração e o estado de bloqueio obtidos na mesma consulta.
+        """
+        now = datetime.now(timezone.utc)
+        cutoff = (now - timedelta(days=idle_days)).strftime(self.LAST_PLAYED_FORMAT)
+        query = db.session.query(
+            UserProfile.username, UserProfile.last_played_at, UserProfile.expiration_date, UserProfile.screen_limit,
+            BlockedUser.username.label('blocked_username'), BlockedUser.block_reason, BlockedUser.blocked_at
+        ).outerjoin(BlockedUser, BlockedUser.username == UserProfile.username).filter(
+            or_(UserProfile.last_played_at.is_(None), UserProfile.last_played_at < cutoff)
+        )
+        if not include_blocked:
+            query = query.filter(BlockedUser.username.is_(None))
+        # No SQLite, NULL vem primeiro em ASC: quem nunca reproduziu nada aparece no topo.
+        inactive = []
+        for row in query.order_by(UserProfile.last_played_at.asc()).all():
+            idle = None
+            if row.last_played_at:
+                try:
+                    idle = (now - datetime.fromisoformat(row.last_played_at)).days
+                except ValueError:
+                    pass
+            inactive.append({
+                'username': row.username,
+                'last_played_at': row.last_played_at,
+                'idle_days': idle,
+                'expiration_date': row.expiration_date,
+                'screen_limit': row.screen_limit,
+                'is_blocked': row.blocked_username is not None,
+                'block_reason': row.block_reason,
+                'blocked_at': row.blocked_at,
+            })
+        return inactive
+
     def delete_user_profile(self, username):
         profile = UserProfile.query.get(username)
         if profile:
@@ -322,6 +407,299 @@ class DataManager:
             db.session.delete(user)
             db.session.commit()
             
+    # --- MÉTODOS DE ESTADO DE SINCRONIZAÇÃO ---
+    def get_sync_state(self, key, default=None):
+        state = SyncState.query.get(key)
+        return state.value if state and state.value is not None else default
+
+    def set_sync_state(self, key, value):
+        state = SyncState.query.get(key)
+        if state:
+            state.value = None if value is None else str(value)
+        else:
+            db.session.add(SyncState(key=key, value=None if value is None else str(value)))
+        db.session.commit()
+
+    # --- MÉTODOS DO HISTÓRICO DE VISUALIZAÇÕES (ESPELHO DO TAUTULLI) ---
+    def upsert_watch_history(self, rows):
+        """
+        Insere ou atualiza linhas de histórico já normalizadas (dicionários com as colunas de WatchHistory).
+        Usa INSERT ... ON CONFLICT para que reprocessar a mesma linha seja idempotente.
+        """
+        if not rows:
+            return 0
+        stmt = sqlite_insert(WatchHistory.__table__)
+        update_columns = {c.name: stmt.excluded[c.name] for c in WatchHistory.__table__.columns if c.name != 'id'}
+        stmt = stmt.on_conflict_do_update(index_elements=['id'], set_=update_columns)
+        try:
+            db.session.execute(stmt, rows)
+            db.session.commit()
+            return len(rows)
+        except Exception as e:
+            logger.error(f"Falha ao gravar {len(rows)} linha(s) do histórico de visualizações: {e}")
+            db.session.rollback()
+            raise
+
+    def get_watch_history_latest_date(self):
+        """Devolve o epoch da entrada mais recente do espelho, ou None se estiver vazio."""
+        return db.session.query(func.max(WatchHistory.date)).scalar()
+
+    def iter_watch_history(self, since_ts=None, username=None, batch_size=1000, until_ts=None):
+        """
+        Percorre o espelho do histórico do mais recente para o mais antigo, devolvendo
+        dicionários no formato do Tautulli. As linhas são lidas em lotes para manter a memória constante.
+        until_ts, se indicado, é exclusivo.
+        """
+        query = WatchHistory.query
+        if since_ts is not None:
+            query = query.filter(WatchHistory.date >= since_ts)
+        if until_ts is not None:
+            query = query.filter(WatchHistory.date < until_ts)
+        if username:
+            query = query.filter(WatchHistory.user == username)
+        for row in query.order_by(WatchHistory.date.desc()).yield_per(batch_size):
+            yield row.to_dict()
+
+    def rebuild_daily_user_stats(self, since_ts=None):
+        """
+        Recalcula o agregado diário a partir de watch_history. Com since_ts, apenas os dias
+        (em hora local) a partir da data dessa entrada são apagados e recalculados.
+        """
+        day_expr = func.date(WatchHistory.date, 'unixepoch', 'localtime')
+        hour_expr = cast(func.strftime('%H', WatchHistory.date, 'unixepoch', 'localtime'), Integer)
+        aggregate = select(
+            WatchHistory.user,
+            day_expr.label('day'),
+            func.coalesce(WatchHistory.media_type, '').label('media_type'),
+            func.count(WatchHistory.id),
+            func.coalesce(func.sum(WatchHistory.duration), 0),
+            func.sum(case((hour_expr < 4, 1), else_=0))
+        ).group_by(WatchHistory.user, 'day', 'media_type')
+
+        delete_query = DailyUserStats.query
+        if since_ts is not None:
+            since_day = datetime.fromtimestamp(since_ts).strftime('%Y-%m-%d')
+            day_start_ts = int(datetime.strptime(since_day, '%Y-%m-%d').timestamp())
+            aggregate = aggregate.where(WatchHistory.date >= day_start_ts)
+            delete_query = delete_query.filter(DailyUserStats.day >= since_day)
+
+        try:
+            delete_query.delete(synchronize_session=False)
+            db.session.execute(DailyUserStats.__table__.insert().from_select(
+                ['user', 'day', 'media_type', 'plays', 'duration', 'late_night_plays'], aggregate
+            ))
+            db.session.commit()
+        except Exception as e:
+            logger.error(f"Falha ao recalcular o agregado diário de visualizações: {e}")
+            db.session.rollback()
+            raise
+
+    def get_daily_totals_by_user(self, since_day, until_day=None):
+        """Reproduções e duração por utilizador e dia entre 'YYYY-MM-DD' e until_day (ambos inclusivos), a partir do agregado diário."""
+        filters = [DailyUserStats.day >= since_day]
+        if until_day:
+            filters.append(DailyUserStats.day <= until_day)
+        rows = db.session.query(
+            DailyUserStats.user,
+            DailyUserStats.day,
+            func.sum(DailyUserStats.plays).label('plays'),
+            func.sum(DailyUserStats.duration).label('total_duration')
+        ).filter(*filters).group_by(DailyUserStats.user, DailyUserStats.day).all()
+        return [{'user': r.user, 'day': r.day, 'plays': r.plays, 'total_duration': r.total_duration} for r in rows]
+
+    def get_library_stats(self, since_ts, until_ts=None, top_n=5):
+        """
+        Reproduções, duração, espectadores únicos e títulos mais vistos por biblioteca (section_id)
+        entre dois epochs, calculados com GROUP BY no espelho do histórico.
+        """
+        filters = [WatchHistory.date >= since_ts]
+        if until_ts is not None:
+            filters.append(WatchHistory.date < until_ts)
+        section_expr = func.coalesce(WatchHistory.section_id, 0)
+
+        totals = db.session.query(
+            section_expr.label('section_id'),
+            func.count(WatchHistory.id).label('plays'),
+            func.sum(WatchHistory.duration).label('total_duration'),
+            func.count(func.distinct(WatchHistory.user)).label('unique_viewers')
+        ).filter(*filters).group_by(section_expr).all()
+
+        # Os episódios contam para a respetiva série.
+        title_expr = case((WatchHistory.media_type == 'episode', WatchHistory.grandparent_title), else_=WatchHistory.title)
+        titles = db.session.query(
+            section_expr.label('section_id'),
+            title_expr.label('title'),
+            func.count(WatchHistory.id).label('plays')
+        ).filter(*filters, title_expr.isnot(None)).group_by(section_expr, title_expr).order_by(section_expr, func.count(WatchHistory.id).desc()).all()
+
+        top_titles = {}
+        for r in titles:
+            section_titles = top_titles.setdefault(r.section_id, [])
+            if len(section_titles) < top_n:
+                section_titles.append({'title': r.title, 'plays': r.plays})
+
+        return [{
+            'section_id': r.section_id, 'plays': r.plays, 'total_duration': r.total_duration or 0,
+            'unique_viewers': r.unique_viewers, 'top_titles': top_titles.get(r.section_id, [])
+        } for r in totals]
+
+    # --- MÉTODOS DO ÍNDICE DE DISPOSITIVOS ---
+    def rebuild_user_devices(self, usernames=None):
+        """
+        Recalcula user_devices a partir de watch_history, para todos os utilizadores
+        ou apenas para os indicados (ex.: os tocados por uma sincronização incremental).
+        """
+        player_expr = func.coalesce(WatchHistory.player, '')
+        platform_expr = func.coalesce(WatchHistory.platform, '')
+        aggregate = select(
+            WatchHistory.user,
+            player_expr.label('player'),
+            platform_expr.label('platform'),
+            func.min(WatchHistory.date),
+            func.max(WatchHistory.date),
+            func.count(WatchHistory.id)
+        ).group_by(WatchHistory.user, 'player', 'platform')
+
+        delete_query = UserDevice.query
+        if usernames is not None:
+            usernames = list(usernames)
+            if not usernames:
+                return
+            aggregate = aggregate.where(WatchHistory.user.in_(usernames))
+            delete_query = delete_query.filter(UserDevice.username.in_(usernames))
+
+        try:
+            delete_query.delete(synchronize_session=False)
+            db.session.execute(UserDevice.__table__.insert().from_select(
+                ['username', 'player', 'platform', 'first_seen', 'last_seen', 'play_count'], aggregate
+            ))
+            db.session.commit()
+        except Exception as e:
+            logger.error(f"Falha ao recalcular o índice de dispositivos: {e}")
+            db.session.rollback()
+            raise
+
+    def touch_user_device(self, username, player, platform, seen_at):
+        """
+        Regista a utilização de um dispositivo em tempo real (webhook). A contagem de
+        reproduções é corrigida pela sincronização seguinte do histórico.
+        """
+        stmt = sqlite_insert(UserDevice.__table__).values(
+            username=username, player=player or '', platform=platform or '',
+            first_seen=seen_at, last_seen=seen_at, play_count=0
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['username', 'player', 'platform'],
+            set_={'last_seen': func.max(UserDevice.__table__.c.last_seen, stmt.excluded.last_seen)}
+        )
+        try:
+            db.session.execute(stmt)
+            db.session.commit()
+        except Exception as e:
+            logger.error(f"Falha ao atualizar o dispositivo de '{username}': {e}")
+            db.session.rollback()
+
+    def get_user_devices(self, username):
+        """Dispositivos de um utilizador, do usado mais recentemente para o mais antigo."""
+        devices = UserDevice.query.filter_by(username=username).order_by(UserDevice.last_seen.desc()).all()
+        return [self._row_to_dict(d) for d in devices]
+
+    def get_achievements_unlocked_between(self, since, until):
+        """{utilizador: [ids]} das conquistas desbloqueadas em [since, until) (datetimes UTC)."""
+        rows = db.session.query(UnlockedAchievement.username, UnlockedAchievement.achievement_id).filter(
+            UnlockedAchievement.unlocked_at >= since, UnlockedAchievement.unlocked_at < until
+        ).order_by(UnlockedAchievement.unlocked_at).all()
+        achievements = {}
+        for username, achievement_id in rows:
+            achievements.setdefault(username, []).append(achievement_id)
+        return achievements
+
+    def replace_wrapped_snapshots(self, year, recaps):
+        """Substitui, numa única transação, os resumos anuais de `year` por `recaps` ({utilizador: dict})."""
+        generated_at = datetime.utcnow()
+        try:
+            WrappedSnapshot.query.filter_by(year=year).delete(synchronize_session=False)
+            if recaps:
+                db.session.execute(WrappedSnapshot.__table__.insert(), [
+                    {"username": username, "year": year, "data": json.dumps(recap), "generated_at": generated_at}
+                    for username, recap in recaps.items()
+                ])
+            db.session.commit()
+            return len(recaps)
+        except Exception as e:
+            logger.error(f"Falha ao gravar os resumos anuais de {year}: {e}")
+            db.session.rollback()
+            raise
+
+    def get_wrapped_snapshot(self, username, year):
+        """Resumo anual guardado de um utilizador, ou None se ainda não tiver sido gerado."""
+        snapshot = WrappedSnapshot.query.get((username, year))
+        if not snapshot:
+            return None
+        return {"username": username, "year": year, "generated_at": snapshot.generated_at.isoformat() if snapshot.generated_at else None, **json.loads(snapshot.data)}
+
+    def get_wrapped_years(self):
+        """Anos com resumos gerados e o número de utilizadores de cada um, do mais recente para o mais antigo."""
+        rows = db.session.query(WrappedSnapshot.year, func.count(WrappedSnapshot.username)).group_by(WrappedSnapshot.year).order_by(WrappedSnapshot.year.desc()).all()
+        return [{"year": year, "users": users} for year, users in rows]
+
+    def replace_title_similarities(self, rows):
+        """Substitui, numa única transação, toda a tabela title_similarities."""
+        try:
+            TitleSimilarity.query.delete(synchronize_session=False)
+            if rows:
+                db.session.execute(TitleSimilarity.__table__.insert(), rows)
+            db.session.commit()
+            return len(rows)
+        except Exception as e:
+            logger.error(f"Falha ao gravar {len(rows)} par(es) de títulos semelhantes: {e}")
+            db.session.rollback()
+            raise
+
+    def get_similar_titles(self, rating_key, limit=10):
+        """Títulos vistos pelo mesmo público de `rating_key`, do mais para o menos semelhante."""
+        rows = TitleSimilarity.query.filter_by(rating_key=rating_key).order_by(TitleSimilarity.rank).limit(limit).all()
+        return [{
+            "rating_key": r.neighbor_rating_key, "title": r.neighbor_title, "media_type": r.neighbor_media_type,
+            "score": r.score, "co_viewers": r.co_viewers
+        } for r in rows]
+
+    def get_watched_title_keys(self, username):
+        """Filmes e séries (rating_key) que o utilizador já viu, a partir do espelho do histórico."""
+        key_expr = case(
+            (WatchHistory.media_type == 'episode', WatchHistory.grandparent_rating_key),
+            (WatchHistory.media_type == 'movie', WatchHistory.rating_key),
+        )
+        rows = db.session.query(key_expr).filter(WatchHistory.user == username).distinct().all()
+        return {key for key, in rows if key is not None}
+
+    def get_title_recommendations(self, watched_keys, limit=10):
+        """
+        Títulos ainda não vistos mais semelhantes ao conjunto `watched_keys`: soma dos scores
+        dos vizinhos de cada título visto, com o título visto que mais contribuiu ("porque viu").
+        """
+        watched = set(watched_keys)
+        watched_keys = list(watched)
+        candidates = {}
+        # Em blocos, para não exceder o limite de variáveis por consulta do SQLite.
+        for i in range(0, len(watched_keys), 500):
+            rows = TitleSimilarity.query.filter(TitleSimilarity.rating_key.in_(watched_keys[i:i + 500])).all()
+            for r in rows:
+                if r.neighbor_rating_key in watched:
+                    continue
+                entry = candidates.setdefault(r.neighbor_rating_key, {
+                    "rating_key": r.neighbor_rating_key, "title": r.neighbor_title, "media_type": r.neighbor_media_type,
+                    "score": 0.0, "because": None, "_best": 0.0
+                })
+                entry["score"] += r.score
+                if r.score > entry["_best"]:
+                    entry["_best"], entry["because"] = r.score, r.title
+        recommendations = sorted(candidates.values(), key=lambda c: (-c["score"], c["rating_key"]))[:limit]
+        for entry in recommendations:
+            entry.pop("_best")
+            entry["score"] = round(entry["score"], 6)
+        return recommendations
+
     def _row_to_dict(self, row):
         if not row:
             return None
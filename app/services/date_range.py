@@ -0,0 +1,73 @@
+# app/services/date_range.py
+"""
+Intervalos de dias inteiros (hora local) usados nas estatísticas e no resumo financeiro.
+
+Os limites são sempre meias-noites locais, por isso o mesmo intervalo pedido em momentos
+diferentes gera a mesma chave de cache. Um intervalo "fechado" (que terminou antes de ontem)
+já não recebe histórico novo e o seu resultado pode ficar em cache indefinidamente.
+"""
+from datetime import date, datetime, time, timedelta
+from typing import NamedTuple
+
+MAX_RANGE_DAYS = 731
+# Uma sessão iniciada perto da meia-noite só entra no histórico quando termina, no dia seguinte.
+HISTORY_GRACE = timedelta(days=1)
+
+class DateRange(NamedTuple):
+    start: date
+    end: date  # inclusivo
+
+    @classmethod
+    def last_days(cls, days, today=None):
+        """Os últimos `days` dias até hoje, com o mesmo corte do filtro 'after' do Tautulli."""
+        today = today or date.today()
+        return cls(today - timedelta(days=days), today)
+
+    @property
+    def days(self):
+        return (self.end - self.start).days + 1
+
+    @property
+    def start_str(self):
+        return self.start.isoformat()
+
+    @property
+    def end_str(self):
+        return self.end.isoformat()
+
+    @property
+    def start_ts(self):
+        """Epoch da meia-noite local do primeiro dia."""
+        return int(datetime.combine(self.start, time.min).timestamp())
+
+    @property
+    def end_ts(self):
+        """Epoch da meia-noite local seguinte ao último dia (exclusivo)."""
+        return int(datetime.combine(self.end + timedelta(days=1), time.min).timestamp())
+
+    def is_closed(self, now=None):
+        """True se o intervalo terminou há tempo suficiente para o histórico já não mudar."""
+        now = now or datetime.now()
+        return datetime.combine(self.end + timedelta(days=1), time.min) + HISTORY_GRACE <= now
+
+    def cache_params(self):
+        return {"start": self.start_str, "end": self.end_str}
+
+    def to_dict(self):
+        return {"start": self.start_str, "end": self.end_str, "days": self.days}
+
+def parse_date_range(start, end, max_days=MAX_RANGE_DAYS):
+    """
+    Converte os parâmetros 'start' e 'end' ('YYYY-MM-DD', ambos inclusivos) num DateRange.
+    Devolve None se nenhum for indicado; levanta ValueError se o intervalo for inválido.
+    """
+    if not start and not end:
+        return None
+    if not start or not end:
+        raise ValueError("start e end têm de ser indicados em conjunto")
+    date_range = DateRange(date.fromisoformat(start), date.fromisoformat(end))
+    if date_range.start > date_range.end:
+        raise ValueError("start é posterior a end")
+    if date_range.days > max_days:
+        raise ValueError(f"o intervalo excede {max_days} dias")
+    return date_range
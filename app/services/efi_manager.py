@@ -4,11 +4,14 @@ import logging
 from efipay import EfiPay
 from flask_babel import gettext as _
 
-from ..config import load_or_create_config
+from ..config import load_or_create_config, get_config
 
 logger = logging.getLogger(__name__)
 
 class EfiManager:
+    # Chaves do config.json de que este gestor depende (ver register_config_listener).
+    CONFIG_KEYS = ('EFI_CLIENT_ID', 'EFI_CLIENT_SECRET', 'EFI_CERTIFICATE', 'EFI_SANDBOX', 'EFI_PIX_KEY', 'APP_TITLE')
+
     def __init__(self, data_manager):
         self.data_manager = data_manager
         self.config = None
@@ -46,7 +49,7 @@ class EfiManager:
 
     def check_status(self):
         """Verifica se o serviço da Efí está configurado e ativo."""
-        config = load_or_create_config()
+        config = get_config()
         if not config.get("EFI_ENABLED"):
             return {"status": "DISABLED", "message": _("Desativado na configuração.")}
         if self.efi:
@@ -0,0 +1,201 @@
+# app/services/image_cache.py
+import io
+import os
+import hashlib
+import logging
+import tempfile
+import threading
+from urllib.parse import urlparse
+from flask import url_for
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - depende do ambiente
+    Image = ImageOps = None
+
+HAS_PILLOW = Image is not None
+
+logger = logging.getLogger(__name__)
+
+# Extensões guardadas por tipo de conteúdo; outros tipos não são aceites.
+IMAGE_EXTENSIONS = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/webp": ".webp",
+    "image/gif": ".gif",
+}
+# Variantes de poster permitidas (largura, altura), para limitar o número de ficheiros por imagem.
+POSTER_SIZES = {(200, 300), (300, 450)}
+# Lados (px) dos avatares guardados. O maior cobre o maior avatar da interface (96 px) em ecrãs de alta densidade.
+AVATAR_SIZES = {96, 192}
+DEFAULT_AVATAR_SIZE = 192
+AVATAR_HOSTS = ("plex.tv",)
+# O plex.tv redireciona alguns avatares para o Gravatar.
+AVATAR_REDIRECT_HOSTS = ("plex.tv", "gravatar.com")
+
+class ImageCache:
+    """
+    Cache de imagens em disco com limite de tamanho e remoção LRU.
+
+    Cada imagem é identificada por uma chave (ex.: caminho do poster + dimensões) e
+    guardada num ficheiro com o hash dessa chave. O mtime do ficheiro serve de
+    último acesso. Falhas simultâneas para a mesma chave partilham um único download.
+    """
+
+    def __init__(self, cache_dir, max_bytes=200 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        os.makedirs(cache_dir, exist_ok=True)
+        self._total_bytes = sum(size for _, size, _ in self._scan())
+
+    @staticmethod
+    def key_hash(key):
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def _scan(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.startswith(".") or not os.path.isfile(path):
+                continue
+            stat = os.stat(path)
+            entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _find(self, digest):
+        for ext in IMAGE_EXTENSIONS.values():
+            path = os.path.join(self.cache_dir, digest + ext)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def get(self, key, fetcher):
+        """
+        Devolve (caminho, etag, content_type) da imagem, descarregando-a com `fetcher` em caso de falha.
+        `fetcher` deve devolver (bytes, content_type) ou None se a imagem não existir.
+        """
+        digest = self.key_hash(key)
+        while True:
+            path = self._find(digest)
+            if path:
+                try:
+                    os.utime(path, None)
+                except OSError:
+                    pass
+                return self._describe(path, digest)
+
+            with self._lock:
+                event = self._in_flight.get(digest)
+                leader = event is None
+                if leader:
+                    event = threading.Event()
+                    self._in_flight[digest] = event
+            if not leader:
+                event.wait()
+                if self._find(digest):
+                    continue
+                return None
+
+            try:
+                result = fetcher()
+                if not result:
+                    return None
+                content, content_type = result
+                ext = IMAGE_EXTENSIONS.get((content_type or "").split(";")[0].strip().lower())
+                if not ext or not content:
+                    logger.warning(f"Imagem ignorada para a cache (tipo '{content_type}' não suportado).")
+                    return None
+                path = self._store(digest + ext, content)
+                return self._describe(path, digest)
+            finally:
+                with self._lock:
+                    self._in_flight.pop(digest, None)
+                event.set()
+
+    def _describe(self, path, digest):
+        ext = os.path.splitext(path)[1]
+        content_type = next(ct for ct, e in IMAGE_EXTENSIONS.items() if e == ext)
+        return path, f"{digest[:32]}-{os.path.getsize(path)}", content_type
+
+    def _store(self, filename, content):
+        path = os.path.join(self.cache_dir, filename)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        with self._lock:
+            self._total_bytes += len(content)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+        return path
+
+    def _evict(self):
+        """Remove os ficheiros acedidos há mais tempo até ficar abaixo de 90% do limite."""
+        entries = sorted(self._scan(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        removed = 0
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                removed += 1
+            except OSError:
+                pass
+        self._total_bytes = total
+        logger.info(f"Cache de imagens: {removed} ficheiro(s) removido(s) por LRU; ocupação atual {total // 1024} KiB.")
+
+    def get_stats(self):
+        with self._lock:
+            return {"bytes": self._total_bytes, "max_bytes": self.max_bytes, "in_flight": len(self._in_flight)}
+
+def is_allowed_avatar_url(url, hosts=AVATAR_HOSTS):
+    """Aceita apenas endereços HTTPS dos domínios indicados (ou subdomínios); por omissão, o plex.tv."""
+    try:
+        parsed = urlparse(url or "")
+    except ValueError:
+        return False
+    host = (parsed.hostname or "").lower()
+    return parsed.scheme == "https" and any(host == h or host.endswith("." + h) for h in hosts)
+
+def poster_url(thumb, width, height):
+    """URL local (via /img) de um poster do Plex, sem expor a chave de API do Tautulli."""
+    if not thumb:
+        return ''
+    return url_for('img.poster', img=thumb, w=width, h=height)
+
+def avatar_url(thumb, size=DEFAULT_AVATAR_SIZE):
+    """URL local (via /img) de um avatar do plex.tv; outros endereços são devolvidos tal como estão."""
+    if thumb and is_allowed_avatar_url(thumb):
+        return url_for('img.avatar', url=thumb, s=size)
+    return thumb
+
+def resize_square(content, content_type, size):
+    """
+    Recorta a imagem ao centro e reduz para size x size (PNG se tiver transparência, JPEG caso contrário).
+    Sem Pillow, ou se a imagem não puder ser lida, devolve-a tal como está.
+    """
+    if not HAS_PILLOW:
+        return content, content_type
+    try:
+        with Image.open(io.BytesIO(content)) as image:
+            transparent = image.mode in ("RGBA", "LA", "P")
+            image = ImageOps.fit(image.convert("RGBA" if transparent else "RGB"), (size, size), Image.LANCZOS)
+        output = io.BytesIO()
+        if transparent:
+            image.save(output, "PNG", optimize=True)
+            return output.getvalue(), "image/png"
+        image.save(output, "JPEG", quality=85, optimize=True)
+        return output.getvalue(), "image/jpeg"
+    except Exception as e:
+        logger.warning(f"Não foi possível redimensionar a imagem ({content_type}); será guardada sem alterações: {e}")
+        return content, content_type
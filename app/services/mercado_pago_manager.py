@@ -7,11 +7,13 @@ from flask import url_for
 from datetime import datetime, timedelta, timezone
 from flask_babel import gettext as _
 
-from ..config import load_or_create_config
+from ..config import load_or_create_config, get_config
 
 logger = logging.getLogger(__name__)
 
 class MercadoPagoManager:
+    CONFIG_KEYS = ('MERCADOPAGO_ACCESS_TOKEN', 'APP_TITLE', 'APP_BASE_URL')
+
     def __init__(self, data_manager):
         self.data_manager = data_manager
         self.config = None
@@ -31,7 +33,7 @@ class MercadoPagoManager:
 
     def check_status(self):
         """Verifica se o serviço do Mercado Pago está configurado e ativo."""
-        config = load_or_create_config()
+        config = get_config()
         if not config.get("MERCADOPAGO_ENABLED"):
             return {"status": "DISABLED", "message": _("Desativado na configuração.")}
         if self.sdk:
@@ -8,7 +8,7 @@ import requests
 from flask_babel import gettext as _
 from flask import url_for
 
-from ..config import load_or_create_config
+from ..config import get_config
 from ..models import UserProfile
 
 logger = logging.getLogger(__name__)
@@ -33,7 +33,7 @@ class NotifierManager:
 
     def _send_telegram_notification(self, message, chat_id, request_id):
         """Envia uma notificação para um chat específico do Telegram."""
-        config = load_or_create_config()
+        config = get_config()
         bot_token = config.get("TELEGRAM_BOT_TOKEN")
         
         api_url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
@@ -58,7 +58,7 @@ class NotifierManager:
 
     def _send_webhook_notification(self, payload, request_id):
         """Envia um payload JSON para o Webhook configurado."""
-        config = load_or_create_config()
+        config = get_config()
         webhook_url = config.get("WEBHOOK_URL")
 
         headers = {'Content-Type': 'application/json'}
@@ -87,7 +87,7 @@ class NotifierManager:
 
     def _send_discord_notification(self, payload, request_id):
         """Envia uma notificação formatada (embed) para um Webhook do Discord."""
-        config = load_or_create_config()
+        config = get_config()
         webhook_url = config.get("DISCORD_WEBHOOK_URL")
 
         headers = {'Content-Type': 'application/json'}
@@ -107,7 +107,7 @@ class NotifierManager:
 
     def _prepare_and_send(self, event_type, user, user_profile, context):
         """Prepara e envia notificações para todos os agentes ativos."""
-        config = load_or_create_config()
+        config = get_config()
         request_id = uuid.uuid4()
         
         app_base_url = config.get("APP_BASE_URL")
@@ -10,6 +10,8 @@ logger = logging.getLogger(__name__)
 class OverseerrManager:
     """Gerencia a comunicação com a API do Overseerr/Jellyseerr."""
 
+    CONFIG_KEYS = ('OVERSEERR_ENABLED', 'OVERSEERR_URL', 'OVERSEERR_API_KEY')
+
     def __init__(self):
         self.config = {}
         self.api_url = None
@@ -113,9 +113,12 @@ class PlexUserManager:
             logger.error(_("Erro ao atualizar bibliotecas para %(email)s: %(error)s", email=email, error=e), exc_info=True)
             return {"success": False, "message": str(e)}
 
-    def remove_user(self, email):
+    def remove_user(self, email, notifier_futures=None):
         """
         Remove completamente um utilizador do Plex, Tautulli e da base de dados local.
+        :param notifier_futures: Lista opcional. Se indicada, as alterações aos notificadores do Tautulli
+                                 são agendadas sem esperar pela escrita e os Futures são acrescentados a
+                                 ela, para que o chamador (ex.: removal_job) espere por todos no fim.
         """
         if not self.conn.account:
             return {"success": False, "message": _("O Plex não está configurado.")}
@@ -135,10 +138,17 @@ class PlexUserManager:
                  try: scheduler.remove_job(profile['expiration_job_id'])
                  except Exception as e: logger.warning(_("Não foi possível remover a tarefa de expiração agendada '%(job_id)s': %(error)s", job_id=profile['expiration_job_id'], error=e))
 
-            self.tautulli_manager.update_screen_limit(email, username, 0)
-            self.tautulli_manager.manage_block_unblock(email, username, 'remove', notifier_id=config.get('BLOCKING_NOTIFIER_ID'))
-            if profile.get('trial_end_date'):
-                self.tautulli_manager.manage_block_unblock(email, username, 'remove', notifier_id=config.get('TRIAL_BLOCK_NOTIFIER_ID'))
+            if notifier_futures is None:
+                self.tautulli_manager.update_screen_limit(email, username, 0)
+                self.tautulli_manager.manage_block_unblock(email, username, 'remove', notifier_id=config.get('BLOCKING_NOTIFIER_ID'))
+                if profile.get('trial_end_date'):
+                    self.tautulli_manager.manage_block_unblock(email, username, 'remove', notifier_id=config.get('TRIAL_BLOCK_NOTIFIER_ID'))
+            else:
+                # O perfil é apagado abaixo: a escrita pendente não o deve recriar.
+                notifier_futures.append(self.tautulli_manager.submit_screen_limit(email, username, 0, update_profile=False))
+                notifier_futures.append(self.tautulli_manager.submit_block_unblock(email, username, 'remove', notifier_id=config.get('BLOCKING_NOTIFIER_ID')))
+                if profile.get('trial_end_date'):
+                    notifier_futures.append(self.tautulli_manager.submit_block_unblock(email, username, 'remove', notifier_id=config.get('TRIAL_BLOCK_NOTIFIER_ID')))
 
             self.conn.account.removeFriend(user_to_remove)
             if profile.get('overseerr_access'):
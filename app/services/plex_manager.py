@@ -18,6 +18,8 @@ class PlexManager:
     Isto mantém a API pública consistente para o resto da aplicação,
     enquanto a lógica é separada em classes de gestores mais pequenas e focadas.
     """
+    CONFIG_KEYS = ('PLEX_URL', 'PLEX_TOKEN')
+
     def __init__(self, data_manager, tautulli_manager, notifier_manager, overseerr_manager):
         # Instancia todos os sub-gestores
         self.conn = PlexConnectionManager()
@@ -83,8 +85,8 @@ class PlexManager:
     def update_user_libraries(self, email, library_titles):
         return self.users.update_user_libraries(email, library_titles)
 
-    def remove_user(self, email):
-        return self.users.remove_user(email)
+    def remove_user(self, email, notifier_futures=None):
+        return self.users.remove_user(email, notifier_futures=notifier_futures)
 
     def toggle_overseerr_access(self, email, username, access: bool):
         return self.users.toggle_overseerr_access(email, username, access)
@@ -3,9 +3,19 @@
 from .api_client import TautulliApiClient
 from .notifier_handler import NotifierHandler
 from .stats_handler import StatsHandler
+from .history_sync import HistorySyncHandler
+from .ingest_handler import IngestHandler
+from .wrapped import WrappedGenerator
+from .recommendations import RecommendationBuilder
+from .live_sessions import LiveSessionTracker
 
 __all__ = [
     "TautulliApiClient",
     "NotifierHandler",
     "StatsHandler",
+    "HistorySyncHandler",
+    "IngestHandler",
+    "WrappedGenerator",
+    "RecommendationBuilder",
+    "LiveSessionTracker",
 ]
@@ -1,56 +1,158 @@
 # app/services/tautulli/api_client.py
 import logging
+import random
+import time
 import requests
+from requests.adapters import HTTPAdapter
 from requests.exceptions import RequestException, ConnectionError, Timeout
 from flask_babel import gettext as _
 
 from app.config import load_or_create_config
+from .response_cache import ResponseCache
 
 logger = logging.getLogger(__name__)
 
 class TautulliApiClient:
     """Cliente para realizar chamadas diretas à API do Tautulli."""
 
+    # Comandos só de leitura: podem ser repetidos com segurança após uma falha transitória.
+    IDEMPOTENT_COMMANDS = {
+        "status", "get_history", "get_recently_added", "get_notifier_config",
+        "get_activity", "get_libraries", "get_users",
+    }
+    # Timeouts (ligação, leitura) em segundos por comando.
+    COMMAND_TIMEOUTS = {
+        "get_history": (5, 30),
+        "get_recently_added": (5, 20),
+        "set_notifier_config": (5, 15),
+    }
+    DEFAULT_TIMEOUT = (5, 10)
+    RETRY_STATUS_CODES = {502, 503, 504}
+    MAX_RETRIES = 3
+    BACKOFF_BASE = 0.5
+    BACKOFF_MAX = 5.0
+    POOL_MAXSIZE = 10
+    # TTL (segundos) da cache de respostas por comando de leitura; comandos ausentes nunca são guardados.
+    # O get_history fica de fora: as páginas de iter_history são grandes, lidas uma só vez e, misturadas
+    # com páginas novas, deixariam de ser consecutivas.
+    CACHE_TTLS = {
+        "get_recently_added": 300,
+        "get_libraries": 600,
+        "get_notifier_config": 30,
+    }
+    # Comandos de escrita e as entradas em cache que tornam obsoletas (filtradas pelos mesmos parâmetros).
+    CACHE_INVALIDATIONS = {
+        "set_notifier_config": (("get_notifier_config", ("notifier_id",)),),
+    }
+    HISTORY_PAGE_SIZE = 1000
+
     def __init__(self):
         self.base_url = None
         self.api_key = None
         self.is_configured = False
+        self.session = None
+        self.cache = ResponseCache()
         self.reload_config()
 
+    @classmethod
+    def build_session(cls):
+        """Cria uma sessão HTTP com pool de conexões keep-alive para o Tautulli."""
+        session = requests.Session()
+        # As repetições são feitas em _make_request, apenas para comandos idempotentes.
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=cls.POOL_MAXSIZE, max_retries=0)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers.update({"Accept": "application/json"})
+        return session
+
     def reload_config(self):
-        """Recarrega a configuração do Tautulli a partir do ficheiro."""
+        """Recarrega a configuração do Tautulli a partir do ficheiro e reconstrói a sessão HTTP."""
         config = load_or_create_config()
         self.base_url = config.get("TAUTULLI_URL", "").rstrip('/')
         self.api_key = config.get("TAUTULLI_API_KEY")
         self.is_configured = bool(self.base_url and self.api_key)
+
+        old_session = self.session
+        self.session = self.build_session()
+        if old_session is not None:
+            old_session.close()
+        self.cache.invalidate()
+
         if self.is_configured:
             logger.info("Configuração do TautulliApiClient (re)carregada com sucesso.")
         else:
             logger.warning("Configuração do TautulliApiClient (re)carregada, mas os dados estão incompletos.")
 
-    def _make_request(self, params, method='GET', data=None, timeout=10):
+    def _backoff_delay(self, attempt):
+        """Backoff exponencial com jitter total para a tentativa indicada (1, 2, ...)."""
+        return random.uniform(0, min(self.BACKOFF_MAX, self.BACKOFF_BASE * (2 ** attempt)))
+
+    def _make_request(self, params, method='GET', data=None, timeout=None, use_cache=True):
+        """
+        Executa uma requisição para a API do Tautulli, passando pela cache de respostas.
+
+        Comandos de leitura presentes em CACHE_TTLS são servidos a partir da cache e pedidos
+        idênticos em simultâneo partilham uma única chamada. Comandos de escrita nunca são
+        guardados e invalidam as entradas relacionadas (CACHE_INVALIDATIONS).
+        Com use_cache=False o pedido vai sempre ao Tautulli (ex.: leitura-modificação-escrita).
+        """
+        command = params.get("cmd")
+        ttl = self.CACHE_TTLS.get(command)
+        if use_cache and ttl and method.upper() == 'GET':
+            key = self.cache.make_key(command, params)
+            return self.cache.get_or_load(key, lambda: self._execute_request(params, method, data, timeout), ttl)
+
+        result = self._execute_request(params, method, data, timeout)
+        for cached_command, match_keys in self.CACHE_INVALIDATIONS.get(command, ()):
+            self.cache.invalidate(cached_command, **{k: params[k] for k in match_keys if k in params})
+        return result
+
+    def _execute_request(self, params, method='GET', data=None, timeout=None):
         """
-        Executa uma requisição para a API do Tautulli.
+        Executa uma requisição para a API do Tautulli através da sessão partilhada.
+
+        Comandos idempotentes são repetidos até MAX_RETRIES vezes, com backoff
+        exponencial e jitter, em caso de erro de ligação, timeout ou 502/503/504.
 
         :param params: Dicionário de parâmetros para a URL da API.
         :param method: Método HTTP (GET ou POST).
         :param data: Dados para o corpo da requisição POST.
-        :param timeout: Timeout da requisição em segundos.
+        :param timeout: Timeout da requisição; por omissão usa COMMAND_TIMEOUTS.
         :return: A secção 'data' da resposta da API em caso de sucesso.
         :raises RequestException: Em caso de erro de rede ou HTTP.
         """
         if not self.is_configured:
             raise ValueError(_("As configurações do Tautulli (URL, Chave de API) estão incompletas."))
 
+        method = method.upper()
+        if method not in ('GET', 'POST'):
+            raise ValueError(f"Método HTTP não suportado: {method}")
+
         api_url = f"{self.base_url}/api/v2"
-        params['apikey'] = self.api_key
+        params = dict(params, apikey=self.api_key)
+        command = params.get("cmd")
+        if timeout is None:
+            timeout = self.COMMAND_TIMEOUTS.get(command, self.DEFAULT_TIMEOUT)
+        max_retries = self.MAX_RETRIES if command in self.IDEMPOTENT_COMMANDS else 0
 
-        if method.upper() == 'GET':
-            response = requests.get(api_url, params=params, timeout=timeout)
-        elif method.upper() == 'POST':
-            response = requests.post(api_url, params=params, data=data, timeout=timeout)
-        else:
-            raise ValueError(f"Método HTTP não suportado: {method}")
+        attempt = 0
+        while True:
+            try:
+                response = self.session.request(method, api_url, params=params, data=data, timeout=timeout)
+                failure = None
+                if response.status_code in self.RETRY_STATUS_CODES:
+                    failure = f"HTTP {response.status_code}"
+            except (ConnectionError, Timeout) as e:
+                if attempt >= max_retries:
+                    raise
+                failure = str(e)
+
+            if failure is None or attempt >= max_retries:
+                break
+            attempt += 1
+            delay = self._backoff_delay(attempt)
+            logger.warning(f"Falha transitória no comando '{command}' do Tautulli ({failure}). Nova tentativa {attempt}/{max_retries} em {delay:.2f}s.")
+            time.sleep(delay)
 
         response.raise_for_status()
         response_json = response.json()
@@ -61,10 +163,10 @@ class TautulliApiClient:
 
         return response_json["response"]["data"]
 
-    def get_notifier_config(self, notifier_id):
+    def get_notifier_config(self, notifier_id, use_cache=True):
         """Busca a configuração de um notificador."""
         params = {"cmd": "get_notifier_config", "notifier_id": notifier_id}
-        return self._make_request(params)
+        return self._make_request(params, use_cache=use_cache)
 
     def set_notifier_config(self, notifier_id, config_data):
         """Escreve a configuração de um notificador."""
@@ -75,23 +177,84 @@ class TautulliApiClient:
         """Busca o histórico de visualizações."""
         params = {"cmd": "get_history", "length": 10000}
         params.update(kwargs)
-        return self._make_request(params, timeout=20)
+        return self._make_request(params)
+
+    def iter_history(self, after_timestamp=None, page_size=None, max_rows=None, **kwargs):
+        """
+        Percorre o histórico de visualizações página a página (start/length),
+        do mais recente para o mais antigo, devolvendo uma linha de cada vez.
+
+        O get_history só aceita datas ao dia como limite, por isso as páginas continuam a ser
+        pedidas por posição, mas a posição é guardada como um cursor (a data da última linha
+        devolvida e os ids das linhas com essa data). Linhas que chegam ao histórico durante a
+        iteração deslocam as páginas seguintes e repetem linhas já devolvidas: tudo o que não
+        está depois do cursor é descartado, pelo que cada linha é devolvida no máximo uma vez.
+
+        Apenas uma página é mantida em memória. A iteração termina quando o
+        histórico se esgota, quando é encontrada uma linha anterior a
+        `after_timestamp` (epoch em segundos) ou quando `max_rows` linhas foram devolvidas.
+
+        :param after_timestamp: Limite inferior (inclusivo) para o campo 'date'.
+        :param page_size: Número de linhas por pedido (por omissão HISTORY_PAGE_SIZE).
+        :param max_rows: Número máximo de linhas a devolver.
+        :param kwargs: Filtros adicionais do comando get_history (user, after, media_type, ...).
+        """
+        page_size = page_size or self.HISTORY_PAGE_SIZE
+        start = 0
+        returned = 0
+        cursor_date, cursor_ids = None, set()
+        while True:
+            params = {"cmd": "get_history", "order_column": "date", "order_dir": "desc"}
+            params.update(kwargs)
+            params.update({"start": start, "length": page_size})
+            page = self._make_request(params).get('data', [])
+
+            for item in page:
+                date = item.get('date') or 0
+                if after_timestamp is not None and date < after_timestamp:
+                    return
+                row_id = item.get('id') or item.get('row_id') or (date, item.get('user'), item.get('rating_key'))
+                if cursor_date is not None and (date > cursor_date or (date == cursor_date and row_id in cursor_ids)):
+                    continue
+                if date != cursor_date:
+                    cursor_date, cursor_ids = date, set()
+                cursor_ids.add(row_id)
+                yield item
+                returned += 1
+                if max_rows is not None and returned >= max_rows:
+                    return
+
+            if len(page) < page_size:
+                return
+            start += page_size
         
-    def get_recently_added(self, **kwargs):
+    def get_libraries(self, use_cache=True):
+        """Busca a lista de bibliotecas (secções) do servidor Plex."""
+        return self._make_request({"cmd": "get_libraries"}, use_cache=use_cache)
+
+    def get_activity(self):
+        """Busca as sessões de reprodução em curso (nunca em cache: muda a cada leitura)."""
+        return self._make_request({"cmd": "get_activity"}, use_cache=False)
+
+    def get_recently_added(self, use_cache=True, **kwargs):
         """Busca os itens adicionados recentemente."""
         params = {"cmd": "get_recently_added"}
         params.update(kwargs)
-        return self._make_request(params)
+        return self._make_request(params, use_cache=use_cache)
 
     @staticmethod
-    def test_connection(url, api_key):
-        """Testa uma conexão com as credenciais fornecidas."""
+    def test_connection(url, api_key, session=None):
+        """
+        Testa uma conexão com as credenciais fornecidas.
+        Se for indicada uma sessão, a ligação keep-alive desta é reutilizada.
+        """
         if not url or not api_key:
             return {'success': False, 'message': _('URL e Chave da API são obrigatórios.')}
         try:
             api_url = f"{url.rstrip('/')}/api/v2"
             logger.info(_("A testar a conexão com o Tautulli em: %(url)s", url=api_url))
-            response = requests.get(api_url, params={"apikey": api_key, "cmd": "status"}, timeout=10)
+            http = session or requests
+            response = http.get(api_url, params={"apikey": api_key, "cmd": "status"}, timeout=10)
             response.raise_for_status()
             data = response.json()
             if data.get("response", {}).get("result") == "success":
@@ -0,0 +1,160 @@
+# app/services/tautulli/concurrency.py
+"""
+Concorrência de reproduções calculada a partir do histórico.
+
+Cada sessão passa a ser um intervalo [início, fim] e uma varredura (sweep-line) pelos
+eventos de início/fim ordenados dá, em O(n log n), o número de streams simultâneos do
+servidor e de cada utilizador em cada instante. Os percentis são ponderados pelo tempo
+passado em cada nível, considerando apenas o tempo com pelo menos um stream ativo.
+"""
+import math
+from collections import defaultdict
+from datetime import datetime
+
+# Linhas agrupadas pelo Tautulli (sessões retomadas) podem abranger horas sem reprodução. Se o
+# intervalo exceder duração + pausas por mais do que esta folga, usa-se só duração + pausas.
+GROUPED_SLACK_SECONDS = 15 * 60
+SERIES_MAX_POINTS = 720
+SERIES_MIN_BUCKET = 15 * 60
+# Um utilizador "atinge regularmente" o limite de ecrãs se o fizer em pelo menos um dia por semana do período.
+LIMIT_DAYS_PER_WEEK = 1
+
+def session_interval(item):
+    """(início, fim) em epoch de uma linha do histórico, ou None se não for possível determiná-lo."""
+    started = item.get('started') or item.get('date')
+    if not started:
+        return None
+    active = (item.get('duration') or 0) + (item.get('paused_counter') or 0)
+    stopped = item.get('stopped') or 0
+    if stopped <= started or stopped - started > active + GROUPED_SLACK_SECONDS:
+        stopped = started + active
+    if stopped <= started:
+        return None
+    return started, stopped
+
+def build_intervals(rows, window_start, window_end):
+    """Lista de (início, fim, utilizador) das sessões, recortadas ao período pedido."""
+    intervals = []
+    for item in rows:
+        user = item.get('user')
+        span = session_interval(item)
+        if not user or not span:
+            continue
+        start, stop = max(span[0], window_start), min(span[1], window_end)
+        if stop > start:
+            intervals.append((start, stop, user))
+    return intervals
+
+def series_bucket_seconds(span_seconds):
+    """Intervalo da série temporal: múltiplo de 15 minutos com no máximo SERIES_MAX_POINTS pontos."""
+    bucket = math.ceil(span_seconds / SERIES_MAX_POINTS / SERIES_MIN_BUCKET) * SERIES_MIN_BUCKET
+    return max(SERIES_MIN_BUCKET, bucket)
+
+def _time_weighted_percentile(seconds_by_level, percentile):
+    """Menor nível c tal que `percentile`% do tempo com streams ativos foi passado com <= c streams."""
+    levels = sorted(level for level in seconds_by_level if level > 0)
+    active = sum(seconds_by_level[level] for level in levels)
+    if not active:
+        return 0
+    target = active * percentile / 100
+    accumulated = 0
+    for level in levels:
+        accumulated += seconds_by_level[level]
+        if accumulated >= target:
+            return level
+    return levels[-1]
+
+class _Track:
+    """Estado da varredura para uma série de eventos (o servidor ou um utilizador)."""
+    __slots__ = ("level", "since", "peak", "peak_at", "seconds_by_level", "limit_seconds", "limit_days")
+
+    def __init__(self, since):
+        self.level = 0
+        self.since = since
+        self.peak = 0
+        self.peak_at = None
+        self.seconds_by_level = defaultdict(int)
+        self.limit_seconds = 0
+        self.limit_days = set()
+
+    def advance(self, t, limit=0):
+        elapsed = t - self.since
+        if elapsed > 0:
+            self.seconds_by_level[self.level] += elapsed
+            if limit and self.level >= limit:
+                self.limit_seconds += elapsed
+        self.since = t
+
+    def change(self, t, delta, limit=0):
+        self.level += delta
+        if delta > 0:
+            if self.level > self.peak:
+                self.peak, self.peak_at = self.level, t
+            if limit and self.level >= limit:
+                self.limit_days.add(datetime.fromtimestamp(t).strftime('%Y-%m-%d'))
+
+    def summary(self):
+        return {
+            "peak": self.peak,
+            "peak_at": self.peak_at,
+            "p95": _time_weighted_percentile(self.seconds_by_level, 95),
+            "active_seconds": sum(s for level, s in self.seconds_by_level.items() if level > 0),
+        }
+
+def concurrency_profile(intervals, window_start, window_end, limits=None, bucket_seconds=None):
+    """
+    Perfil de concorrência do servidor e de cada utilizador.
+
+    :param intervals: Sequência de (início, fim, utilizador), já dentro de [window_start, window_end].
+    :param limits: {utilizador: limite de ecrãs}; 0 ou ausente significa sem limite.
+    :param bucket_seconds: Intervalo da série temporal; por omissão, escolhido a partir do período.
+    """
+    limits = limits or {}
+    bucket_seconds = bucket_seconds or series_bucket_seconds(window_end - window_start)
+    series = [0] * max(1, math.ceil((window_end - window_start) / bucket_seconds))
+
+    events = []
+    for start, stop, user in intervals:
+        events.append((start, 1, user))
+        events.append((stop, -1, user))
+    # No mesmo instante, os fins são processados antes dos inícios: sessões encadeadas não se sobrepõem.
+    events.sort(key=lambda e: (e[0], e[1]))
+
+    server = _Track(window_start)
+    users = {}
+    for t, delta, user in events:
+        if t > server.since and server.level:
+            # Pico de cada intervalo da série durante o segmento [server.since, t).
+            first = (server.since - window_start) // bucket_seconds
+            last = min(len(series) - 1, (t - 1 - window_start) // bucket_seconds)
+            for b in range(first, last + 1):
+                if series[b] < server.level:
+                    series[b] = server.level
+        server.advance(t)
+        server.change(t, delta)
+
+        track = users.get(user)
+        if track is None:
+            track = users[user] = _Track(t)
+        limit = limits.get(user) or 0
+        track.advance(t, limit)
+        track.change(t, delta, limit)
+
+    weeks = max(1, math.ceil((window_end - window_start) / (7 * 86400)))
+    user_results = []
+    for user, track in users.items():
+        limit = limits.get(user) or 0
+        result = {"username": user, "screen_limit": limit, **track.summary()}
+        result.update({
+            "seconds_at_limit": track.limit_seconds,
+            "days_at_limit": len(track.limit_days),
+            "regularly_at_limit": bool(limit) and len(track.limit_days) >= weeks * LIMIT_DAYS_PER_WEEK,
+        })
+        user_results.append(result)
+    user_results.sort(key=lambda u: (u["peak"], u["p95"], u["seconds_at_limit"]), reverse=True)
+
+    return {
+        "server": server.summary(),
+        "users": user_results,
+        "series": {"start": window_start, "bucket_seconds": bucket_seconds, "values": series},
+    }
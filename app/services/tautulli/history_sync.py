@@ -0,0 +1,156 @@
+# app/services/tautulli/history_sync.py
+import json
+import logging
+import threading
+from requests.exceptions import RequestException
+
+logger = logging.getLogger(__name__)
+
+class HistorySyncHandler:
+    """
+    Mantém a tabela local watch_history sincronizada com o histórico do Tautulli.
+
+    A primeira execução percorre todo o histórico (backfill). As seguintes pedem
+    apenas as linhas a partir da última data sincronizada, menos uma janela de
+    sobreposição: uma sessão longa só entra no histórico do Tautulli quando termina,
+    com a data em que começou, e as linhas repetidas são simplesmente atualizadas.
+    """
+
+    STATE_LAST_DATE = "history_last_date"
+    STATE_BACKFILL_COMPLETE = "history_backfill_complete"
+    STATE_ROLLUP_BUILT = "daily_user_stats_built"
+    STATE_DEVICES_BUILT = "user_devices_built"
+    STATE_LAST_PLAYED_BUILT = "last_played_built"
+    OVERLAP_SECONDS = 24 * 3600
+    BATCH_SIZE = 1000
+
+    INT_FIELDS = (
+        "reference_id", "date", "started", "stopped", "duration", "paused_counter", "user_id",
+        "rating_key", "parent_rating_key", "grandparent_rating_key", "year", "media_index",
+        "parent_media_index", "section_id", "percent_complete",
+    )
+    STR_FIELDS = (
+        "user", "friendly_name", "platform", "player", "product", "media_type", "title",
+        "parent_title", "grandparent_title", "full_title", "thumb", "transcode_decision",
+        "stream_video_decision",
+    )
+
+    def __init__(self, api_client, data_manager):
+        self.api = api_client
+        self.data_manager = data_manager
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _to_int(value):
+        try:
+            return int(float(value)) if value not in (None, "") else None
+        except (ValueError, TypeError):
+            return None
+
+    def _normalize(self, item):
+        """Converte uma linha de get_history nas colunas de WatchHistory. Devolve None para sessões ainda ativas."""
+        row_id = self._to_int(item.get("id") or item.get("row_id"))
+        date = self._to_int(item.get("date"))
+        if row_id is None or date is None or not item.get("user"):
+            return None
+
+        row = {"id": row_id}
+        for field in self.INT_FIELDS:
+            row[field] = self._to_int(item.get(field))
+        for field in self.STR_FIELDS:
+            value = item.get(field)
+            row[field] = str(value) if value not in (None, "") else None
+        row["duration"] = row["duration"] or 0
+
+        try:
+            row["watched_status"] = float(item.get("watched_status")) if item.get("watched_status") not in (None, "") else None
+        except (ValueError, TypeError):
+            row["watched_status"] = None
+        for field in ("genres", "directors"):
+            values = item.get(field)
+            row[field] = json.dumps(values) if values else None
+        return row
+
+    def is_ready(self):
+        """Indica se o espelho local já contém o histórico completo e pode substituir o Tautulli."""
+        if not self.data_manager:
+            return False
+        return self.data_manager.get_sync_state(self.STATE_BACKFILL_COMPLETE) == "1"
+
+    def is_devices_index_ready(self):
+        return bool(self.data_manager) and self.data_manager.get_sync_state(self.STATE_DEVICES_BUILT) == "1"
+
+    def _update_devices(self, backfill, usernames):
+        """Mantém user_devices: recálculo total no backfill, ou só dos utilizadores com linhas novas."""
+        if backfill or not self.is_devices_index_ready():
+            self.data_manager.rebuild_user_devices()
+            self.data_manager.set_sync_state(self.STATE_DEVICES_BUILT, "1")
+        elif usernames:
+            self.data_manager.rebuild_user_devices(usernames)
+
+    def _update_rollup(self, backfill, oldest):
+        """Mantém daily_user_stats: recálculo total no backfill, ou só dos dias tocados por esta sincronização."""
+        if backfill or self.data_manager.get_sync_state(self.STATE_ROLLUP_BUILT) != "1":
+            self.data_manager.rebuild_daily_user_stats()
+            self.data_manager.set_sync_state(self.STATE_ROLLUP_BUILT, "1")
+        elif oldest is not None:
+            self.data_manager.rebuild_daily_user_stats(since_ts=oldest)
+
+    def _update_last_played(self, backfill, usernames):
+        """Mantém user_profiles.last_played_at: todos os perfis no backfill, ou só os utilizadores com linhas novas."""
+        if backfill or self.data_manager.get_sync_state(self.STATE_LAST_PLAYED_BUILT) != "1":
+            self.data_manager.refresh_last_played()
+            self.data_manager.set_sync_state(self.STATE_LAST_PLAYED_BUILT, "1")
+        elif usernames:
+            self.data_manager.refresh_last_played(usernames)
+
+    def sync(self):
+        """
+        Executa uma sincronização incremental (ou o backfill inicial).
+        :return: Dicionário com o resultado e o número de linhas gravadas.
+        """
+        if not self.api.is_configured or not self.data_manager:
+            return {"success": False, "message": "Tautulli não configurado."}
+        if not self._lock.acquire(blocking=False):
+            logger.info("Sincronização do histórico já em curso. Execução ignorada.")
+            return {"success": False, "message": "Sincronização já em curso."}
+
+        try:
+            backfill = not self.is_ready()
+            last_date = self._to_int(self.data_manager.get_sync_state(self.STATE_LAST_DATE))
+            after_timestamp = None if backfill or last_date is None else last_date - self.OVERLAP_SECONDS
+
+            batch, written, newest, oldest = [], 0, last_date or 0, None
+            usernames = set()
+            for item in self.api.iter_history(after_timestamp=after_timestamp, page_size=self.BATCH_SIZE):
+                row = self._normalize(item)
+                if row is None:
+                    continue
+                batch.append(row)
+                newest = max(newest, row["date"])
+                oldest = row["date"] if oldest is None else min(oldest, row["date"])
+                usernames.add(row["user"])
+                if len(batch) >= self.BATCH_SIZE:
+                    written += self.data_manager.upsert_watch_history(batch)
+                    batch = []
+            written += self.data_manager.upsert_watch_history(batch)
+
+            self._update_rollup(backfill, oldest)
+            self._update_devices(backfill, usernames)
+            self._update_last_played(backfill, usernames)
+            if newest:
+                self.data_manager.set_sync_state(self.STATE_LAST_DATE, newest)
+            if backfill:
+                self.data_manager.set_sync_state(self.STATE_BACKFILL_COMPLETE, "1")
+                logger.info(f"Backfill do histórico do Tautulli concluído: {written} linha(s) gravadas.")
+            else:
+                logger.debug(f"Sincronização incremental do histórico concluída: {written} linha(s) gravadas.")
+            return {"success": True, "written": written, "backfill": backfill}
+        except RequestException as e:
+            logger.warning(f"Falha de ligação ao Tautulli durante a sincronização do histórico: {e}")
+            return {"success": False, "message": str(e)}
+        except Exception as e:
+            logger.error(f"Erro inesperado durante a sincronização do histórico: {e}", exc_info=True)
+            return {"success": False, "message": str(e)}
+        finally:
+            self._lock.release()
@@ -0,0 +1,132 @@
+# app/services/tautulli/ingest_handler.py
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+# Campos do corpo enviado pelo notificador webhook, pela ordem do modelo: (chave no JSON, parâmetro do Tautulli).
+BODY_FIELDS = (
+    ("session_key", "session_key"), ("username", "username"), ("user_email", "user_email"),
+    ("title", "title"), ("media_type", "media_type"), ("rating_key", "rating_key"),
+    ("player", "player"), ("platform", "platform"), ("timestamp", "unixtime"),
+)
+_BODY_PATTERN = re.compile(
+    r'\{\s*"event":\s*"(?P<event>.*?)"'
+    + "".join(rf',\s*"{key}":\s*"(?P<{key}>.*?)"' for key, _param in BODY_FIELDS)
+    + r'\s*\}\s*$',
+    re.DOTALL
+)
+
+class IngestHandler:
+    """
+    Processa os eventos enviados pelo notificador webhook do Tautulli
+    (play, pause, resume, stop, watched) e mantém contadores em tempo real.
+    """
+
+    SUPPORTED_EVENTS = {"play", "pause", "resume", "stop", "watched"}
+    # O Tautulli só grava a linha do histórico quando a sessão termina (stop); o evento watched
+    # chega antes, com a reprodução ainda em curso, e não altera o histórico.
+    FINISHING_EVENTS = {"stop"}
+    # Sem o evento stop (ex.: painel indisponível nesse momento), uma sessão sem eventos há mais
+    # do que isto é descartada.
+    SESSION_MAX_AGE = 12 * 3600
+
+    def __init__(self, data_manager, stats_handler):
+        self.data_manager = data_manager
+        self.stats = stats_handler
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._last_seen = {}
+        self._event_counts = Counter()
+        self._last_event_at = None
+
+    @staticmethod
+    def _event_time(payload):
+        try:
+            return datetime.fromtimestamp(int(payload.get("timestamp")), tz=timezone.utc)
+        except (TypeError, ValueError):
+            return datetime.now(timezone.utc)
+
+    @staticmethod
+    def parse_body(text):
+        """
+        Lê um corpo do modelo de get_ingest_webhook_config que não é JSON válido. O Tautulli pode
+        inserir os valores tal como estão, e um título ou leitor com aspas ou barras invertidas
+        quebra o JSON; como a ordem dos campos é conhecida, os valores são lidos entre as chaves.
+        :return: Dicionário com os campos, ou None se o corpo não seguir o modelo.
+        """
+        match = _BODY_PATTERN.match(text or "")
+        return match.groupdict() if match else None
+
+    def _expire_sessions(self, now):
+        """Remove as sessões sem eventos há mais de SESSION_MAX_AGE segundos (chamado com o lock)."""
+        for key in [k for k, seen in self._last_seen.items() if now - seen > self.SESSION_MAX_AGE]:
+            self._sessions.pop(key, None)
+            del self._last_seen[key]
+
+    def handle_event(self, payload):
+        """
+        Regista um evento do webhook.
+        :return: Dicionário com 'success' e 'session_finished' (True para stop).
+        """
+        event = str(payload.get("event", "")).lower()
+        session_key = str(payload.get("session_key") or "")
+        username = payload.get("username") or payload.get("user")
+        if event not in self.SUPPORTED_EVENTS or not username:
+            return {"success": False, "message": "Evento inválido."}
+
+        event_time = self._event_time(payload)
+        now = time.monotonic()
+        with self._lock:
+            self._event_counts[event] += 1
+            self._last_event_at = event_time
+            self._expire_sessions(now)
+            if event in ("play", "resume"):
+                self._sessions[session_key] = {
+                    "session_key": session_key,
+                    "username": username,
+                    "title": payload.get("title"),
+                    "media_type": payload.get("media_type"),
+                    "player": payload.get("player"),
+                    "state": "playing",
+                    "started_at": self._sessions.get(session_key, {}).get("started_at", event_time.isoformat()),
+                }
+                self._last_seen[session_key] = now
+            elif event == "pause" and session_key in self._sessions:
+                self._sessions[session_key]["state"] = "paused"
+                self._last_seen[session_key] = now
+            elif event == "stop":
+                self._sessions.pop(session_key, None)
+                self._last_seen.pop(session_key, None)
+
+        if event in ("play", "resume", "stop"):
+            try:
+                self.data_manager.touch_user_last_played(username, event_time)
+            except Exception as e:
+                logger.warning(f"Não foi possível atualizar a última reprodução de '{username}': {e}")
+        if event == "play":
+            self.data_manager.touch_user_device(username, payload.get("player"), payload.get("platform"), int(event_time.timestamp()))
+
+        session_finished = event in self.FINISHING_EVENTS
+        if session_finished:
+            # A classificação em cache deixa de refletir o histórico; o próximo pedido recalcula-a.
+            self.stats.results_cache.invalidate()
+        logger.debug(f"Evento '{event}' do webhook do Tautulli processado para '{username}' (sessão {session_key}).")
+        return {"success": True, "session_finished": session_finished}
+
+    def get_live_stats(self):
+        """Estado atual dos contadores alimentados pelo webhook."""
+        with self._lock:
+            self._expire_sessions(time.monotonic())
+            sessions = [dict(s) for s in self._sessions.values()]
+            return {
+                "active_sessions": len(sessions),
+                "playing": sum(1 for s in sessions if s["state"] == "playing"),
+                "sessions": sessions,
+                "event_counts": dict(self._event_counts),
+                "last_event_at": self._last_event_at.isoformat() if self._last_event_at else None,
+            }
@@ -0,0 +1,141 @@
+# app/services/tautulli/live_sessions.py
+import logging
+import threading
+from requests.exceptions import RequestException
+
+from ..image_cache import poster_url
+
+logger = logging.getLogger(__name__)
+
+class LiveSessionTracker:
+    """
+    Acompanha as reproduções em curso a partir do comando get_activity do Tautulli.
+
+    Cada sessão é reduzida aos campos mostrados no painel e comparada com a leitura anterior:
+    poll() devolve apenas as sessões novas, as terminadas e, para as restantes, os campos que
+    mudaram (progresso, estado, largura de banda, transcodificação). O intervalo entre leituras
+    adapta-se à atividade: curto com reproduções em curso, longo com o servidor parado e
+    crescente enquanto o Tautulli falhar. wake() antecipa a próxima leitura (eventos do webhook).
+    """
+
+    ACTIVE_INTERVAL = 5
+    IDLE_INTERVAL = 30
+    MAX_INTERVAL = 60
+    # Tem de ser uma das variantes de POSTER_SIZES aceites pela rota /img/poster.
+    POSTER_SIZE = (200, 300)
+    # Campos por sessão; tudo o resto da resposta do get_activity é descartado.
+    FIELDS = (
+        "user", "title", "full_title", "grandparent_title", "media_type", "year", "poster",
+        "player", "platform", "product", "state", "progress_percent", "duration", "bandwidth",
+        "transcode_decision", "video_decision", "audio_decision", "quality_profile",
+        "stream_video_full_resolution", "location",
+    )
+    INT_FIELDS = ("progress_percent", "duration", "bandwidth")
+
+    def __init__(self, api_client):
+        self.api_client = api_client
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._sessions = None  # None até à primeira leitura bem-sucedida
+        self._totals = {"stream_count": 0, "total_bandwidth": 0}
+        self._seq = 0
+        self._errors = 0
+
+    @classmethod
+    def _normalize(cls, raw):
+        session = {field: raw.get(field) for field in cls.FIELDS if field != "poster"}
+        for field in cls.INT_FIELDS:
+            try:
+                session[field] = int(float(session[field] or 0))
+            except (TypeError, ValueError):
+                session[field] = 0
+        session["user"] = raw.get("friendly_name") or raw.get("user")
+        # Episódios usam o poster da série, como no resto do painel.
+        thumb = raw.get("grandparent_thumb") if raw.get("media_type") == "episode" else raw.get("thumb")
+        session["poster"] = poster_url(thumb or raw.get("thumb"), *cls.POSTER_SIZE)
+        return session
+
+    def _fetch(self):
+        """{session_key: sessão reduzida} e os totais do servidor."""
+        data = self.api_client.get_activity() or {}
+        sessions = {}
+        for raw in data.get("sessions") or []:
+            key = str(raw.get("session_key") or "")
+            if key:
+                sessions[key] = self._normalize(raw)
+        try:
+            total_bandwidth = int(data.get("total_bandwidth") or 0)
+        except (TypeError, ValueError):
+            total_bandwidth = 0
+        return sessions, {"stream_count": len(sessions), "total_bandwidth": total_bandwidth}
+
+    def poll(self):
+        """
+        Lê a atividade atual e compara-a com a leitura anterior.
+        Requer um contexto de pedido (os posters são URLs locais).
+        :return: Dicionário com 'seq', 'added', 'removed', 'changed' e os totais,
+                 ou None se nada mudou ou a leitura falhou.
+        """
+        if not self.api_client.is_configured:
+            return None
+        try:
+            sessions, totals = self._fetch()
+        except RequestException as e:
+            self._errors += 1
+            logger.warning(f"Não foi possível obter a atividade do Tautulli: {e}")
+            return None
+        except Exception as e:
+            self._errors += 1
+            logger.error(f"Erro inesperado ao obter a atividade do Tautulli: {e}", exc_info=True)
+            return None
+        self._errors = 0
+
+        with self._lock:
+            previous = self._sessions or {}
+            added = [{"session_key": key, **session} for key, session in sessions.items() if key not in previous]
+            removed = [key for key in previous if key not in sessions]
+            changed = []
+            for key, session in sessions.items():
+                old = previous.get(key)
+                if old is None:
+                    continue
+                delta = {field: value for field, value in session.items() if old.get(field) != value}
+                if delta:
+                    delta["session_key"] = key
+                    changed.append(delta)
+
+            first_poll = self._sessions is None
+            self._sessions = sessions
+            totals_changed = totals != self._totals
+            self._totals = totals
+            if not (added or removed or changed or totals_changed or first_poll):
+                return None
+            self._seq += 1
+            return {"seq": self._seq, "added": added, "removed": removed, "changed": changed, **totals}
+
+    def snapshot(self):
+        """Estado completo (enviado na ligação de um cliente ou a pedido, quando perde uma atualização)."""
+        with self._lock:
+            sessions = [{"session_key": key, **session} for key, session in (self._sessions or {}).items()]
+            return {"seq": self._seq, "sessions": sessions, "ready": self._sessions is not None, **self._totals}
+
+    def get_stream_count(self):
+        """Número de reproduções da última leitura, ou None se ainda não houve nenhuma."""
+        with self._lock:
+            return None if self._sessions is None else self._totals["stream_count"]
+
+    def next_interval(self):
+        if self._errors:
+            return min(self.MAX_INTERVAL, self.ACTIVE_INTERVAL * 2 ** min(self._errors, 4))
+        with self._lock:
+            return self.ACTIVE_INTERVAL if self._sessions else self.IDLE_INTERVAL
+
+    def wake(self):
+        """Antecipa a próxima leitura (por exemplo, após um evento play/stop do webhook)."""
+        self._wake.set()
+
+    def wait(self, timeout=None):
+        """Espera pelo próximo intervalo (ou por wake()); devolve True se foi acordado."""
+        woken = self._wake.wait(self.next_interval() if timeout is None else timeout)
+        self._wake.clear()
+        return woken
@@ -1,54 +1,93 @@
 # app/services/tautulli/notifier_handler.py
-import json
 import logging
-import threading
+from concurrent.futures import Future
+from flask import current_app, has_app_context
 from flask_babel import gettext as _
-from requests.exceptions import RequestException
 
-from app.config import load_or_create_config
+from app.config import get_config
+from .notifier_queue import UNEXPECTED_ERROR, get_queue
 
 logger = logging.getLogger(__name__)
 
+# Chaves levantadas pelas alterações (correm na thread da fila, sem contexto para traduzir).
+SCREEN_CONDITION_NOT_FOUND = "screen_condition_not_found"
+EMAIL_CONDITION_NOT_FOUND = "email_condition_not_found"
+
+def _completed(result):
+    future = Future()
+    future.set_result(result)
+    return future
+
 class NotifierHandler:
     """Gere a lógica de atualização dos notificadores do Tautulli."""
 
     def __init__(self, api_client, data_manager):
         self.api = api_client
         self.data_manager = data_manager
-        self.update_lock = threading.Lock()
-
-    def _update_notifier_safely(self, notifier_id, update_logic_func):
-        """Executa uma atualização atômica na configuração de um notificador."""
-        with self.update_lock:
-            logger.info(_("LOCK ADQUIRIDO: A iniciar atualização segura para o notificador ID: %(id)s", id=notifier_id))
-            try:
-                current_config = self.api.get_notifier_config(notifier_id)
-                modified_config = update_logic_func(current_config)
-
-                # Prepara os dados para a escrita
-                data_for_body = {k: v for k, v in modified_config.items() if k not in ['config', 'custom_conditions']}
-                data_for_body.update(modified_config.get('config', {}))
-                if "script" in data_for_body: data_for_body["scripts_script"] = data_for_body.pop("script")
-                if "script_folder" in data_for_body: data_for_body["scripts_script_folder"] = data_for_body.pop("script_folder")
-                if "timeout" in data_for_body: data_for_body["scripts_timeout"] = data_for_body.pop("timeout")
-                data_for_body['custom_conditions'] = json.dumps(modified_config.get('custom_conditions', []))
-
-                self.api.set_notifier_config(notifier_id, data_for_body)
-                logger.info(_("LOCK LIBERADO: Atualização para o notificador ID %(id)s concluída com sucesso.", id=notifier_id))
-                return {"success": True}
-            except (RequestException, ValueError) as e:
-                logger.error(_("LOCK LIBERADO: Erro durante a atualização segura do notificador %(id)s: %(error)s", id=notifier_id, error=e))
-                return {"success": False, "message": str(e)}
-            except Exception as e:
-                logger.error(_("LOCK LIBERADO: Erro inesperado durante a atualização segura do notificador %(id)s: %(error)s", id=notifier_id, error=e), exc_info=True)
-                return {"success": False, "message": _("Erro inesperado: %(error)s", error=e)}
 
-    def update_screen_limit(self, user_email, username, screens):
-        """Atualiza o limite de telas de um utilizador de forma segura."""
-        config = load_or_create_config()
+    @staticmethod
+    def _finish(notifier_id, result, messages, on_success):
+        """Traduz a chave de erro devolvida pela fila ou aplica os efeitos locais de uma alteração bem-sucedida."""
+        result = dict(result)
+        try:
+            if not result.get("success"):
+                template = messages.get(result.get("message"))
+                if template:
+                    result["message"] = template % {"error": result.pop("error", "")}
+            elif on_success:
+                on_success(result)
+        except Exception as e:
+            logger.error(f"Erro ao concluir a atualização do notificador {notifier_id}: {e}", exc_info=True)
+            result = {"success": False, "message": messages[UNEXPECTED_ERROR] % {"error": e}}
+        return result
+
+    def _submit(self, notifier_id, update_logic_func, messages, on_success=None, wait=False):
+        """
+        Agenda uma alteração à configuração de um notificador.
+        Alterações simultâneas ao mesmo notificador partilham uma leitura e uma escrita (ver notifier_queue).
+
+        :param messages: {chave: mensagem já traduzida} para as chaves que update_logic_func pode levantar.
+                         As mensagens são traduzidas aqui, na thread (e idioma) do chamador.
+        :param on_success: Função (resultado) com os efeitos locais após a escrita; pode definir a mensagem final.
+        :param wait: Se True, espera pela escrita e devolve o resultado, com os efeitos locais aplicados
+                     nesta thread. Caso contrário devolve um Future; os efeitos locais correm na thread da
+                     fila, com o contexto da aplicação do chamador.
+        """
+        if not self.api.is_configured:
+            result = {"success": False, "message": _("As configurações do Tautulli (URL, Chave de API) estão incompletas.")}
+            return result if wait else _completed(result)
+        messages = dict(messages)
+        messages[UNEXPECTED_ERROR] = _("Erro inesperado: %(error)s", error="%(error)s")
+
+        logger.info(_("A agendar atualização segura para o notificador ID: %(id)s", id=notifier_id))
+        future = get_queue(notifier_id).submit(self.api, update_logic_func)
+        if wait:
+            return self._finish(notifier_id, future.result(), messages, on_success)
+
+        app = current_app._get_current_object() if has_app_context() else None
+        outer = Future()
+
+        def done(inner):
+            if app:
+                with app.app_context():
+                    outer.set_result(self._finish(notifier_id, inner.result(), messages, on_success))
+            else:
+                outer.set_result(self._finish(notifier_id, inner.result(), messages, on_success))
+
+        future.add_done_callback(done)
+        return outer
+
+    def submit_screen_limit(self, user_email, username, screens, update_profile=True, wait=False):
+        """
+        Versão não bloqueante de update_screen_limit: devolve um Future com o resultado
+        (ou, com wait=True, o próprio resultado).
+        :param update_profile: Se False, o perfil local não é alterado (ex.: utilizador a ser removido).
+        """
+        config = get_config()
         notifier_id = config.get("SCREEN_LIMIT_NOTIFIER_ID")
         if not notifier_id:
-            return {"success": False, "message": _("ID do notificador de limite de telas não configurado.")}
+            result = {"success": False, "message": _("ID do notificador de limite de telas não configurado.")}
+            return result if wait else _completed(result)
 
         def update_logic(current_config):
             custom_conditions = current_config.get("custom_conditions", [])
@@ -69,22 +108,30 @@ class NotifierHandler:
                         condition_found = True
                         break
                 if not condition_found:
-                    raise ValueError(_("Condição para %(screens)s tela(s) não encontrada na configuração do Tautulli.", screens=screens))
+                    raise ValueError(SCREEN_CONDITION_NOT_FOUND)
             current_config["custom_conditions"] = custom_conditions
             return current_config
 
-        result = self._update_notifier_safely(notifier_id, update_logic)
-        if result.get("success"):
-            profile = self.data_manager.get_user_profile(username)
-            profile['screen_limit'] = screens
-            self.data_manager.set_user_profile(username, profile)
-            result["message"] = _("Limite de %(screens)s tela(s) aplicado.", screens=screens) if screens > 0 else _("Limite removido.")
-        return result
-            
+        messages = {SCREEN_CONDITION_NOT_FOUND: _("Condição para %(screens)s tela(s) não encontrada na configuração do Tautulli.", screens=screens)}
+        success_message = _("Limite de %(screens)s tela(s) aplicado.", screens=screens) if screens > 0 else _("Limite removido.")
+
+        def on_success(result):
+            if update_profile:
+                profile = self.data_manager.get_user_profile(username)
+                profile['screen_limit'] = screens
+                self.data_manager.set_user_profile(username, profile)
+            result["message"] = success_message
+
+        return self._submit(notifier_id, update_logic, messages, on_success, wait=wait)
+
+    def update_screen_limit(self, user_email, username, screens):
+        """Atualiza o limite de telas de um utilizador de forma segura."""
+        return self.submit_screen_limit(user_email, username, screens, wait=True)
+
     def update_all_users_screen_limit(self, users, screens: int):
         """Atualiza o limite de telas para todos os utilizadores de forma segura."""
         user_emails = [u['email'] for u in users]
-        config = load_or_create_config()
+        config = get_config()
         notifier_id = config.get("SCREEN_LIMIT_NOTIFIER_ID")
         if not notifier_id:
             return {"success": False, "message": _("ID do notificador de limite de telas não configurado.")}
@@ -102,27 +149,31 @@ class NotifierHandler:
                         condition_found = True
                         break
                 if not condition_found:
-                    raise ValueError(_("Condição para %(screens)s tela(s) não encontrada.", screens=screens))
+                    raise ValueError(SCREEN_CONDITION_NOT_FOUND)
             current_config["custom_conditions"] = custom_conditions
             return current_config
-        
-        result = self._update_notifier_safely(notifier_id, update_logic)
-        if result.get("success"):
+
+        messages = {SCREEN_CONDITION_NOT_FOUND: _("Condição para %(screens)s tela(s) não encontrada.", screens=screens)}
+        success_message = _("Limite de %(screens)s tela(s) aplicado para todos.", screens=screens) if screens > 0 else _("Limites removidos de todos.")
+
+        def on_success(result):
             for user in users:
                 profile = self.data_manager.get_user_profile(user['username'])
                 profile['screen_limit'] = screens
                 self.data_manager.set_user_profile(user['username'], profile)
-            result["message"] = _("Limite de %(screens)s tela(s) aplicado para todos.", screens=screens) if screens > 0 else _("Limites removidos de todos.")
-        return result
+            result["message"] = success_message
 
-    def manage_block_unblock(self, user_email, username, action: str, notifier_id: int = None, reason: str = 'manual'):
-        """Adiciona ou remove um utilizador de uma lista de bloqueio de forma segura."""
-        config = load_or_create_config()
+        return self._submit(notifier_id, update_logic, messages, on_success, wait=True)
+
+    def submit_block_unblock(self, user_email, username, action: str, notifier_id: int = None, reason: str = 'manual', wait=False):
+        """Versão não bloqueante de manage_block_unblock: devolve um Future com o resultado (ou, com wait=True, o resultado)."""
+        config = get_config()
         if notifier_id is None:
             notifier_id = config.get("BLOCKING_NOTIFIER_ID")
         if not notifier_id or notifier_id == 0:
             logger.warning(_("Nenhum notificador definido para a ação de '%(action)s' para o utilizador '%(user)s'.", action=action, user=username))
-            return {"success": True, "message": _("Nenhum notificador configurado para esta ação.")}
+            result = {"success": True, "message": _("Nenhum notificador configurado para esta ação.")}
+            return result if wait else _completed(result)
 
         log_reason = _(" e motivo: %(reason)s", reason=reason) if action == 'add' else ""
         logger.info(_("A preparar atualização segura '%(action)s' para o utilizador '%(user)s' com o notificador ID: %(id)s%(reason)s", action=action, user=username, id=notifier_id, reason=log_reason))
@@ -139,16 +190,25 @@ class NotifierHandler:
                     condition_found = True
                     break
             if not condition_found:
-                raise ValueError(_("Condição 'user_email' não encontrada na configuração do notificador."))
+                raise ValueError(EMAIL_CONDITION_NOT_FOUND)
             current_config["custom_conditions"] = custom_conditions
             return current_config
 
-        result = self._update_notifier_safely(notifier_id, update_logic)
-        if result.get("success"):
+        messages = {EMAIL_CONDITION_NOT_FOUND: _("Condição 'user_email' não encontrada na configuração do notificador.")}
+        if action == 'add':
+            success_message = _("Utilizador %(username)s bloqueado.", username=username)
+        else:
+            success_message = _("Utilizador %(username)s desbloqueado.", username=username)
+
+        def on_success(result):
             if action == 'add':
                 self.data_manager.add_blocked_user(username, reason=reason)
-                result["message"] = _("Utilizador %(username)s bloqueado.", username=username)
             else:
                 self.data_manager.remove_blocked_user(username)
-                result["message"] = _("Utilizador %(username)s desbloqueado.", username=username)
-        return result
+            result["message"] = success_message
+
+        return self._submit(notifier_id, update_logic, messages, on_success, wait=wait)
+
+    def manage_block_unblock(self, user_email, username, action: str, notifier_id: int = None, reason: str = 'manual'):
+        """Adiciona ou remove um utilizador de uma lista de bloqueio de forma segura."""
+        return self.submit_block_unblock(user_email, username, action, notifier_id, reason, wait=True)
@@ -0,0 +1,130 @@
+# app/services/tautulli/notifier_queue.py
+"""
+Fila de alterações por notificador do Tautulli.
+
+Cada alteração (bloquear, desbloquear, limite de telas) é uma função que recebe a configuração
+atual do notificador e devolve-a modificada. Com a fila parada, a primeira alteração é escrita
+de imediato; as que chegam enquanto uma leitura-modificação-escrita está em curso são aplicadas,
+por ordem de chegada, sobre uma única leitura da configuração e gravadas numa única escrita.
+Cada chamador recebe um Future com o seu próprio resultado.
+
+As alterações correm na thread da fila, sem contexto de pedido: não traduzem mensagens. Uma
+alteração que falha levanta ValueError com uma chave de mensagem, que o chamador traduz; é
+descartada sem afetar as restantes do lote. Erros inesperados devolvem a chave UNEXPECTED_ERROR
+com o detalhe em "error".
+"""
+import copy
+import json
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from requests.exceptions import RequestException
+
+logger = logging.getLogger(__name__)
+
+UNEXPECTED_ERROR = "unexpected_error"
+
+def notifier_body(config):
+    """Converte a configuração devolvida por get_notifier_config no corpo esperado por set_notifier_config."""
+    body = {k: v for k, v in config.items() if k not in ['config', 'custom_conditions']}
+    body.update(config.get('config', {}))
+    if "script" in body: body["scripts_script"] = body.pop("script")
+    if "script_folder" in body: body["scripts_script_folder"] = body.pop("script_folder")
+    if "timeout" in body: body["scripts_timeout"] = body.pop("timeout")
+    body['custom_conditions'] = json.dumps(config.get('custom_conditions', []))
+    return body
+
+class NotifierMutationQueue:
+    """Alterações pendentes de um notificador, aplicadas em lote por uma thread de escrita."""
+
+    def __init__(self, notifier_id):
+        self.notifier_id = notifier_id
+        self._lock = threading.Lock()
+        self._pending = []
+        self._running = False
+
+    def submit(self, api, mutation):
+        """
+        Agenda `mutation` para o próximo lote.
+        :param api: TautulliApiClient usado na leitura e na escrita.
+        :return: Future com {"success": ...} ("message" e, se inesperado, "error" em caso de falha).
+        """
+        future = Future()
+        with self._lock:
+            self._pending.append((mutation, future))
+            start = not self._running
+            self._running = True
+        if start:
+            threading.Thread(target=self._run, args=(api,), name=f"notifier-queue-{self.notifier_id}", daemon=True).start()
+        return future
+
+    def _run(self, api):
+        # Uma única thread por notificador: as escritas nunca se sobrepõem e as alterações
+        # que chegam durante uma escrita seguem no lote seguinte.
+        while True:
+            # Cede o controlo antes de esvaziar a fila, para que os chamadores simultâneos entrem no mesmo lote.
+            time.sleep(0)
+            with self._lock:
+                batch, self._pending = self._pending, []
+                if not batch:
+                    self._running = False
+                    return
+            try:
+                self._flush(api, batch)
+            except Exception as e:
+                logger.error(f"Erro inesperado no lote do notificador {self.notifier_id}: {e}", exc_info=True)
+                for _mutation, future in batch:
+                    if not future.done():
+                        future.set_result({"success": False, "message": UNEXPECTED_ERROR, "error": str(e)})
+
+    def _flush(self, api, batch):
+        start = time.perf_counter()
+        try:
+            # Leitura-modificação-escrita: a configuração atual é sempre lida diretamente do Tautulli.
+            config = api.get_notifier_config(self.notifier_id, use_cache=False)
+        except (RequestException, ValueError) as e:
+            logger.error(f"Erro ao ler a configuração do notificador {self.notifier_id}: {e}")
+            for _mutation, future in batch:
+                future.set_result({"success": False, "message": str(e)})
+            return
+
+        applied = []
+        for mutation, future in batch:
+            try:
+                config = mutation(copy.deepcopy(config))
+                applied.append(future)
+            except ValueError as e:
+                future.set_result({"success": False, "message": str(e)})
+            except Exception as e:
+                logger.error(f"Erro inesperado ao aplicar uma alteração ao notificador {self.notifier_id}: {e}", exc_info=True)
+                future.set_result({"success": False, "message": UNEXPECTED_ERROR, "error": str(e)})
+        if not applied:
+            return
+
+        try:
+            api.set_notifier_config(self.notifier_id, notifier_body(config))
+        except (RequestException, ValueError) as e:
+            logger.error(f"Erro ao gravar a configuração do notificador {self.notifier_id}: {e}")
+            for future in applied:
+                future.set_result({"success": False, "message": str(e)})
+            return
+
+        elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+        logger.info(f"Notificador {self.notifier_id} atualizado: {len(applied)}/{len(batch)} alteração(ões) numa escrita ({elapsed_ms} ms).")
+        for future in applied:
+            future.set_result({"success": True})
+
+# As filas são do processo, e não do gestor: qualquer instância que altere o mesmo notificador
+# partilha a fila, pelo que as alterações são sempre agrupadas e serializadas.
+_queues = {}
+_queues_lock = threading.Lock()
+
+def get_queue(notifier_id):
+    """Fila do notificador indicado (criada no primeiro uso)."""
+    key = str(notifier_id)
+    with _queues_lock:
+        queue = _queues.get(key)
+        if queue is None:
+            queue = _queues[key] = NotifierMutationQueue(notifier_id)
+        return queue
@@ -0,0 +1,141 @@
+# app/services/tautulli/recently_added_feed.py
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+
+from ..image_cache import poster_url as proxied_poster_url
+
+logger = logging.getLogger(__name__)
+
+def _safe_int(value, default=0):
+    try:
+        return int(float(value)) if value else default
+    except (ValueError, TypeError):
+        return default
+
+class RecentlyAddedFeed:
+    """
+    Cache incremental dos itens adicionados recentemente ao Plex (via Tautulli).
+
+    O Tautulli devolve os itens do mais recente para o mais antigo; o feed pagina
+    até ultrapassar a data limite pedida e guarda o 'added_at' mais recente visto.
+    As atualizações seguintes pedem apenas as páginas com itens novos, e um período
+    mais longo do que o já coberto continua a paginação a partir do fim da cache.
+    Os deltas nunca veem itens removidos do Plex: a cache é reconstruída a cada
+    REBUILD_INTERVAL segundos.
+    """
+
+    PAGE_SIZE = 50
+    REFRESH_INTERVAL = 120
+    REBUILD_INTERVAL = 6 * 3600
+    PAGE_OVERLAP = 10
+    MAX_ITEMS = 5000
+
+    def __init__(self, api_client):
+        self.api = api_client
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Esquece os itens em cache (ex.: quando o servidor do Tautulli muda)."""
+        self._items = []
+        self._keys = set()
+        self._newest_added_at = None
+        self._covered_since = None
+        self._last_refresh = 0.0
+        self._built_at = 0.0
+
+    def _normalize(self, item):
+        added_at = _safe_int(item.get('added_at'))
+        if not added_at:
+            return None
+        thumb_key = item.get('thumb')
+        if item.get('media_type') == 'episode' and item.get('grandparent_thumb'):
+            thumb_key = item.get('grandparent_thumb')
+        return {
+            'rating_key': str(item.get('rating_key') or ''),
+            'added_at_ts': added_at,
+            'title': item.get('title'),
+            'year': item.get('year'),
+            'poster_url': proxied_poster_url(thumb_key, 300, 450),
+            'added_at': datetime.fromtimestamp(added_at, tz=timezone.utc).isoformat(),
+            'media_type': item.get('media_type'),
+            'grandparent_title': item.get('grandparent_title'),
+            'parent_title': item.get('parent_title'),
+            'media_index': _safe_int(item.get('media_index')),
+            'parent_media_index': _safe_int(item.get('parent_media_index'))
+        }
+
+    def _fetch(self, start, stop_before):
+        """
+        Pagina a partir de `start` até encontrar um item com added_at < stop_before.
+        Devolve (itens novos, completo); completo é False se a paginação parou em MAX_ITEMS
+        antes de chegar a stop_before ou ao fim da lista.
+        """
+        new_items = []
+        while len(self._items) + len(new_items) < self.MAX_ITEMS:
+            response = self.api.get_recently_added(count=self.PAGE_SIZE, start=start, use_cache=False)
+            page = response.get('recently_added', [])
+            reached_cutoff = False
+            for raw in page:
+                item = self._normalize(raw)
+                if item is None:
+                    continue
+                if item['added_at_ts'] < stop_before:
+                    reached_cutoff = True
+                    break
+                key = item['rating_key'] or f"{item['title']}|{item['added_at_ts']}"
+                if key not in self._keys:
+                    self._keys.add(key)
+                    new_items.append(item)
+            if reached_cutoff or len(page) < self.PAGE_SIZE:
+                return new_items, True
+            start += self.PAGE_SIZE
+        return new_items, False
+
+    def _refresh(self, cutoff_ts):
+        now = time.monotonic()
+        if self._covered_since is not None and now - self._built_at >= self.REBUILD_INTERVAL:
+            logger.debug("Feed de adicionados recentemente: a reconstruir a cache.")
+            self.reset()
+
+        if self._covered_since is not None and now - self._last_refresh >= self.REFRESH_INTERVAL:
+            # Só os itens mais recentes do que o último visto (delta).
+            stop_before = self._newest_added_at if self._newest_added_at is not None else self._covered_since
+            delta, complete = self._fetch(0, stop_before)
+            if not complete:
+                # O limite de itens impediu o delta de chegar à cache: reconstrói em vez de deixar um buraco.
+                self.reset()
+            elif delta:
+                logger.debug(f"Feed de adicionados recentemente: {len(delta)} item(ns) novo(s).")
+                self._items = sorted(delta + self._items, key=lambda i: i['added_at_ts'], reverse=True)
+            self._last_refresh = now
+
+        if self._covered_since is None or cutoff_ts < self._covered_since:
+            # Período mais longo do que o coberto: continua a partir do fim da cache.
+            first_load = self._covered_since is None
+            start = max(0, len(self._items) - self.PAGE_OVERLAP)
+            older, complete = self._fetch(start, cutoff_ts)
+            self._items = sorted(self._items + older, key=lambda i: i['added_at_ts'], reverse=True)
+            # Parado em MAX_ITEMS, só está coberto o período até ao item mais antigo obtido.
+            if complete or not self._items:
+                self._covered_since = cutoff_ts
+            else:
+                self._covered_since = max(cutoff_ts, self._items[-1]['added_at_ts'])
+            if first_load:
+                self._last_refresh = now
+                self._built_at = now
+
+        if self._items:
+            self._newest_added_at = self._items[0]['added_at_ts']
+
+    def get_items(self, days):
+        """Itens adicionados nos últimos `days` dias, do mais recente para o mais antigo."""
+        cutoff_ts = int(time.time()) - days * 86400
+        with self._lock:
+            self._refresh(cutoff_ts)
+            return [
+                {k: v for k, v in item.items() if k not in ('rating_key', 'added_at_ts')}
+                for item in self._items if item['added_at_ts'] >= cutoff_ts
+            ]
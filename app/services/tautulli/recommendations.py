@@ -0,0 +1,105 @@
+# app/services/tautulli/recommendations.py
+import time
+import logging
+import threading
+from requests.exceptions import RequestException
+
+from .similarity import MAX_TITLES_PER_USER, cowatch_neighbors, title_key
+
+logger = logging.getLogger(__name__)
+
+# Tal como nos resumos anuais, o bloqueio é do processo e não da instância do gestor.
+_rebuild_lock = threading.Lock()
+
+class RecommendationBuilder:
+    """
+    Recalcula a tabela title_similarities ("quem viu X também viu").
+
+    O histórico completo é percorrido uma vez para obter, por utilizador, os títulos vistos
+    (séries para episódios, os mais recentes primeiro, até MAX_TITLES_PER_USER). Os TOP_K
+    vizinhos de cada título são calculados no pool de processos e substituem a tabela
+    numa única transação.
+    """
+
+    TOP_K = 10
+
+    def __init__(self, iter_history, data_manager, compute_pool=None):
+        """:param iter_history: Função que percorre o histórico, normalmente StatsHandler._iter_history."""
+        self.iter_history = iter_history
+        self.data_manager = data_manager
+        self.compute_pool = compute_pool
+
+    def _load(self):
+        """({utilizador: [títulos]}, {título: (nome, tipo)}, linhas lidas)."""
+        user_titles = {}
+        titles = {}
+        rows = 0
+        for item in self.iter_history():
+            rows += 1
+            user = item.get('user')
+            key, name, kind = title_key(item)
+            try:
+                key = int(key)
+            except (TypeError, ValueError):
+                continue
+            if not user:
+                continue
+            seen = user_titles.setdefault(user, {})
+            if key not in seen and len(seen) < MAX_TITLES_PER_USER:
+                seen[key] = None
+            # O histórico vem do mais recente para o mais antigo: fica o nome mais recente do título.
+            titles.setdefault(key, (name, kind))
+        return {user: list(seen) for user, seen in user_titles.items()}, titles, rows
+
+    def _compute(self, user_titles, rows):
+        args = (list(user_titles.values()), self.TOP_K)
+        if self.compute_pool:
+            return self.compute_pool.run(cowatch_neighbors, *args, rows=rows, label="title_similarities")
+        start = time.perf_counter()
+        result = cowatch_neighbors(*args)
+        elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+        return result, {"label": "title_similarities", "rows": rows, "mode": "inline", "compute_ms": elapsed_ms, "wall_ms": elapsed_ms}
+
+    def rebuild(self):
+        """
+        Recalcula os vizinhos de todos os títulos.
+        :return: Dicionário com o resultado, o número de títulos e pares gravados e os tempos.
+        """
+        if not self.data_manager:
+            return {"success": False, "message": "Gestor de dados indisponível."}
+        if not _rebuild_lock.acquire(blocking=False):
+            logger.info("Cálculo das recomendações já em curso. Execução ignorada.")
+            return {"success": False, "message": "Cálculo das recomendações já em curso."}
+
+        try:
+            start = time.perf_counter()
+            user_titles, titles, rows = self._load()
+            load_ms = round((time.perf_counter() - start) * 1000, 1)
+
+            neighbors, timing = self._compute(user_titles, rows)
+            records = []
+            for key, similar in neighbors.items():
+                name, kind = titles.get(key, (None, None))
+                for rank, (neighbor, score, co_viewers) in enumerate(similar, start=1):
+                    neighbor_name, neighbor_kind = titles.get(neighbor, (None, None))
+                    records.append({
+                        "rating_key": key, "neighbor_rating_key": neighbor, "rank": rank,
+                        "score": score, "co_viewers": co_viewers,
+                        "title": name, "media_type": kind,
+                        "neighbor_title": neighbor_name, "neighbor_media_type": neighbor_kind,
+                    })
+
+            save_start = time.perf_counter()
+            self.data_manager.replace_title_similarities(records)
+            timing.update(load_ms=load_ms, save_ms=round((time.perf_counter() - save_start) * 1000, 1),
+                          total_ms=round((time.perf_counter() - start) * 1000, 1))
+            logger.info(f"Recomendações recalculadas: {len(neighbors)} título(s), {len(records)} par(es), {len(user_titles)} utilizador(es), {timing['total_ms']} ms.")
+            return {"success": True, "titles": len(neighbors), "pairs": len(records), "users": len(user_titles), "timing": timing}
+        except RequestException as e:
+            logger.error(f"Erro de conexão com o Tautulli ao calcular as recomendações: {e}")
+            return {"success": False, "message": f"Erro de conexão com o Tautulli: {e}"}
+        except Exception as e:
+            logger.error(f"Erro inesperado ao calcular as recomendações: {e}", exc_info=True)
+            return {"success": False, "message": f"Erro inesperado: {e}"}
+        finally:
+            _rebuild_lock.release()
@@ -0,0 +1,125 @@
+# app/services/tautulli/response_cache.py
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class _InFlight:
+    """Pedido em curso partilhado pelos chamadores concorrentes da mesma chave."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+class ResponseCache:
+    """
+    Cache em memória com TTL e single-flight para respostas de comandos de leitura.
+
+    Chamadas concorrentes com a mesma chave esperam pelo primeiro pedido em vez de
+    repetirem a chamada. Os valores devolvidos são partilhados e devem ser tratados
+    como só de leitura. As entradas expiradas são removidas quando são consultadas e,
+    no máximo a cada PURGE_INTERVAL segundos, numa varredura de toda a cache.
+    """
+
+    PURGE_INTERVAL = 60
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._in_flight = {}
+        self._next_purge = time.monotonic() + self.PURGE_INTERVAL
+        self._stats = {"hits": 0, "misses": 0, "coalesced": 0, "invalidations": 0}
+
+    @staticmethod
+    def make_key(command, params):
+        """Chave normalizada: comando + parâmetros ordenados (sem a chave de API)."""
+        items = tuple(sorted((str(k), str(v)) for k, v in params.items() if k not in ("apikey", "cmd")))
+        return (command, items)
+
+    def get_or_load(self, key, loader, ttl):
+        """Devolve o valor em cache para a chave ou executa `loader` uma única vez para todos os chamadores."""
+        now = time.monotonic()
+        with self._lock:
+            if now >= self._next_purge:
+                self._purge_expired(now)
+            entry = self._entries.get(key)
+            if entry:
+                if entry[0] > now:
+                    self._stats["hits"] += 1
+                    return entry[1]
+                del self._entries[key]
+            in_flight = self._in_flight.get(key)
+            if in_flight:
+                self._stats["coalesced"] += 1
+                leader = False
+            else:
+                in_flight = _InFlight()
+                self._in_flight[key] = in_flight
+                self._stats["misses"] += 1
+                leader = True
+
+        if not leader:
+            in_flight.event.wait()
+            if in_flight.error is not None:
+                raise in_flight.error
+            return in_flight.value
+
+        try:
+            value = loader()
+            in_flight.value = value
+            with self._lock:
+                # Uma invalidação durante o pedido remove a entrada em curso: o resultado não é guardado.
+                if self._in_flight.get(key) is in_flight:
+                    self._store(key, value, ttl)
+            return value
+        except Exception as e:
+            in_flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._in_flight.get(key) is in_flight:
+                    del self._in_flight[key]
+            in_flight.event.set()
+
+    def _purge_expired(self, now):
+        for k in [k for k, (expires, _) in self._entries.items() if expires <= now]:
+            del self._entries[k]
+        self._next_purge = now + self.PURGE_INTERVAL
+
+    def _store(self, key, value, ttl):
+        if len(self._entries) >= self.max_entries:
+            self._purge_expired(time.monotonic())
+            if len(self._entries) >= self.max_entries:
+                oldest_key = min(self._entries, key=lambda k: self._entries[k][0])
+                del self._entries[oldest_key]
+        self._entries[key] = (time.monotonic() + ttl, value)
+
+    def invalidate(self, command=None, **params):
+        """
+        Remove entradas em cache. Sem argumentos limpa tudo; com `command` remove apenas
+        as entradas desse comando cujos parâmetros coincidam com os indicados.
+        """
+        match = {str(k): str(v) for k, v in params.items()}
+        with self._lock:
+            keys = [
+                k for k in list(self._entries) + list(self._in_flight)
+                if command is None or (k[0] == command and match.items() <= dict(k[1]).items())
+            ]
+            for k in keys:
+                self._entries.pop(k, None)
+                self._in_flight.pop(k, None)
+            self._stats["invalidations"] += len(keys)
+        if keys:
+            logger.debug(f"{len(keys)} entrada(s) removida(s) da cache de respostas do Tautulli (comando: {command or 'todos'}).")
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["in_flight"] = len(self._in_flight)
+        lookups = stats["hits"] + stats["misses"] + stats["coalesced"]
+        stats["hit_ratio"] = round((stats["hits"] + stats["coalesced"]) / lookups, 3) if lookups else 0.0
+        return stats
@@ -0,0 +1,120 @@
+# app/services/tautulli/similarity.py
+"""
+Semelhança entre títulos por co-visualização ("quem viu X também viu").
+
+Cada utilizador é uma linha de uma matriz esparsa utilizador x título (1 se viu o título).
+A semelhança entre dois títulos é o cosseno entre as respetivas colunas,
+co / sqrt(n_i * n_j), em que co é o número de utilizadores que viram ambos e n_i o
+número de utilizadores que viram o título i. Com SciPy, as co-visualizações vêm de um
+único produto esparso XᵀX; sem SciPy, de um índice invertido em Python puro com o mesmo
+resultado. Nenhuma matriz densa título x título é criada.
+"""
+import heapq
+import math
+from collections import Counter, defaultdict
+from itertools import combinations
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # pragma: no cover - depende do ambiente
+    np = sparse = None
+
+HAS_SCIPY = sparse is not None
+
+# Um par visto por um único utilizador não diz nada sobre o público do título.
+MIN_CO_VIEWERS = 2
+# Utilizadores com milhares de títulos geram pares na ordem dos milhões e pouco sinal: usam-se os mais recentes.
+MAX_TITLES_PER_USER = 500
+
+def title_key(item):
+    """Identificador do título de uma linha do histórico: a série para episódios, o próprio filme para filmes."""
+    media_type = item.get('media_type')
+    if media_type == 'episode':
+        return item.get('grandparent_rating_key'), item.get('grandparent_title'), 'show'
+    if media_type == 'movie':
+        return item.get('rating_key'), item.get('title'), 'movie'
+    return None, None, None
+
+def _top_k(candidates, top_k):
+    """
+    Os top_k (vizinho, score, co) de maior score; empates resolvidos pelo identificador.
+    A ordenação usa o score exato (igual nos dois caminhos) e só o resultado é arredondado.
+    """
+    return [(key, round(score, 6), co) for key, score, co in heapq.nsmallest(top_k, candidates, key=lambda c: (-c[1], c[0]))]
+
+def _neighbors_scipy(user_titles, keys, top_k, min_co_viewers):
+    index = {key: i for i, key in enumerate(keys)}
+    rows, cols = [], []
+    for u, titles in enumerate(user_titles):
+        for key in titles:
+            rows.append(u)
+            cols.append(index[key])
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float64), (rows, cols)), shape=(len(user_titles), len(keys))
+    )
+    viewers = np.asarray(matrix.sum(axis=0)).ravel()
+    co = (matrix.T @ matrix).tocsr()
+    co.setdiag(0)
+    co.eliminate_zeros()
+
+    neighbors = {}
+    for i in range(len(keys)):
+        start, end = co.indptr[i], co.indptr[i + 1]
+        if start == end:
+            continue
+        cols_i = co.indices[start:end]
+        co_i = co.data[start:end]
+        mask = co_i >= min_co_viewers
+        if not mask.any():
+            continue
+        cols_i, co_i = cols_i[mask], co_i[mask]
+        scores = co_i / np.sqrt(viewers[i] * viewers[cols_i])
+        if len(scores) > top_k:
+            # Corte parcial antes da ordenação final; nsmallest resolve os empates como no caminho em Python.
+            keep = np.argpartition(-scores, top_k - 1)[:top_k]
+            threshold = scores[keep].min()
+            keep = np.nonzero(scores >= threshold)[0]
+            cols_i, co_i, scores = cols_i[keep], co_i[keep], scores[keep]
+        neighbors[keys[i]] = _top_k(
+            [(keys[j], float(s), int(c)) for j, s, c in zip(cols_i, scores, co_i)], top_k
+        )
+    return neighbors
+
+def _neighbors_python(user_titles, keys, top_k, min_co_viewers):
+    viewers = Counter()
+    co = defaultdict(Counter)
+    for titles in user_titles:
+        titles = sorted(titles)
+        viewers.update(titles)
+        for a, b in combinations(titles, 2):
+            co[a][b] += 1
+            co[b][a] += 1
+
+    neighbors = {}
+    for key, counts in co.items():
+        candidates = [
+            (other, count / math.sqrt(viewers[key] * viewers[other]), count)
+            for other, count in counts.items() if count >= min_co_viewers
+        ]
+        if candidates:
+            neighbors[key] = _top_k(candidates, top_k)
+    return neighbors
+
+def cowatch_neighbors(user_titles, top_k=10, min_co_viewers=MIN_CO_VIEWERS, use_scipy=None):
+    """
+    Os top_k títulos mais semelhantes a cada título.
+
+    :param user_titles: Sequência com, para cada utilizador, os identificadores dos títulos que viu.
+    :param use_scipy: Força (True) ou desativa (False) o SciPy; por omissão usa-o se estiver instalado.
+    :return: {título: [(vizinho, score, co_viewers), ...]} por score decrescente.
+    """
+    user_titles = [set(titles) for titles in user_titles if len(titles) > 1]
+    keys = sorted({key for titles in user_titles for key in titles})
+    if not keys:
+        return {}
+    if use_scipy is None:
+        use_scipy = HAS_SCIPY
+    if use_scipy and HAS_SCIPY:
+        return _neighbors_scipy(user_titles, keys, top_k, min_co_viewers)
+    return _neighbors_python(user_titles, keys, top_k, min_co_viewers)
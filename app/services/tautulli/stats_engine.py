@@ -0,0 +1,422 @@
+# app/services/tautulli/stats_engine.py
+"""
+Motor de agregação das estatísticas de visualização de um utilizador.
+
+O histórico é convertido em colunas compactas (timestamps, durações e códigos de
+categoria) e agregado com operações vetorizadas do NumPy. Sem NumPy instalado é
+usado um ciclo em Python puro que produz exatamente o mesmo resultado.
+"""
+import logging
+from collections import Counter
+from datetime import datetime
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depende do ambiente
+    np = None
+
+logger = logging.getLogger(__name__)
+
+HAS_NUMPY = np is not None
+
+MEDIA_MOVIE = 0
+MEDIA_EPISODE = 1
+MEDIA_OTHER = 2
+LATE_NIGHT_END_HOUR = 4
+# Campos do histórico lidos pelo motor; ao enviar linhas para outro processo só estes são copiados.
+ENGINE_FIELDS = ("date", "duration", "media_type", "title", "grandparent_title", "year", "platform", "genres", "directors")
+
+def _empty_result():
+    return {
+        "movie_count": 0, "episode_count": 0,
+        "total_movie_duration": 0, "total_episode_duration": 0, "max_movie_duration": 0,
+        "weekly_activity_python": [0] * 7, "weekly_activity_js": [0] * 7,
+        "hourly_activity": [0] * 24, "late_night_plays": 0,
+        "unique_days": 0, "unique_platforms": 0, "unique_genres": 0, "unique_decades": set(),
+        "top_movies": [], "top_shows": [],
+        "favorite_genre": None, "favorite_genre_count": 0, "favorite_director_count": 0,
+    }
+
+class HistoryColumns:
+    """Histórico em formato colunar. As categorias de texto são codificadas pela ordem em que aparecem."""
+
+    def __init__(self):
+        self.dates = []
+        self.durations = []
+        self.media_types = []
+        self.years = []
+        self.title_codes = []
+        self.show_codes = []
+        self.platform_codes = []
+        self.genre_codes = []
+        self.director_codes = []
+        self.titles = {}
+        self.shows = {}
+        self.platforms = {}
+        self.genres = {}
+        self.directors = {}
+
+    @staticmethod
+    def _code(index, value):
+        if value is None:
+            return -1
+        return index.setdefault(value, len(index))
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Constrói as colunas coluna a coluna (compreensões de lista), evitando appends por linha."""
+        cols = cls()
+        rows = rows if isinstance(rows, list) else list(rows)
+        media_types = [r.get("media_type") for r in rows]
+        cols.dates = [r.get("date") or 0 for r in rows]
+        cols.durations = [r.get("duration") or 0 for r in rows]
+        cols.media_types = [MEDIA_MOVIE if m == 'movie' else MEDIA_EPISODE if m == 'episode' else MEDIA_OTHER for m in media_types]
+        cols.years = [r.get("year") or 0 for r in rows]
+
+        code = cls._code
+        cols.title_codes = [code(cols.titles, r.get("title")) if m == 'movie' else -1 for r, m in zip(rows, media_types)]
+        cols.show_codes = [code(cols.shows, r.get("grandparent_title")) if m == 'episode' else -1 for r, m in zip(rows, media_types)]
+        cols.platform_codes = [code(cols.platforms, r.get("platform") or None) for r in rows]
+        cols.genre_codes = [code(cols.genres, g) for r in rows for g in (r.get("genres") or ())]
+        cols.director_codes = [code(cols.directors, d) for r, m in zip(rows, media_types) if m == 'movie' for d in (r.get("directors") or ())]
+        return cols
+
+    def __len__(self):
+        return len(self.dates)
+
+def _local_offsets(dates):
+    """
+    Desvio UTC local (segundos) de cada timestamp. É calculado uma vez por hora distinta
+    do histórico, e não por linha, para respeitar mudanças de hora de verão.
+    """
+    hours, inverse = np.unique(dates // 3600, return_inverse=True)
+    offsets = np.fromiter(
+        (datetime.fromtimestamp(int(h) * 3600).astimezone().utcoffset().total_seconds() for h in hours),
+        dtype=np.int64, count=len(hours)
+    )
+    return offsets[inverse]
+
+def _top_n(codes, labels, n):
+    """Top-N por contagem; em caso de empate ganha quem apareceu primeiro (como Counter.most_common)."""
+    if codes.size == 0:
+        return []
+    counts = np.bincount(codes, minlength=len(labels))
+    order = np.argsort(-counts, kind='stable')[:n]
+    names = list(labels)
+    return [(names[i], int(counts[i])) for i in order if counts[i] > 0]
+
+def _aggregate_numpy(cols, top_n):
+    result = _empty_result()
+    if len(cols) == 0:
+        return result
+
+    dates = np.asarray(cols.dates, dtype=np.int64)
+    durations = np.asarray(cols.durations, dtype=np.int64)
+    media = np.asarray(cols.media_types, dtype=np.int8)
+    years = np.asarray(cols.years, dtype=np.int32)
+
+    local = dates + _local_offsets(dates)
+    day_numbers = local // 86400
+    weekdays = (day_numbers + 3) % 7  # 1970-01-01 foi uma quinta-feira; segunda-feira = 0
+    hours = (local % 86400) // 3600
+
+    weekly = np.bincount(weekdays, weights=durations, minlength=7).astype(np.int64)
+    hourly = np.bincount(hours, minlength=24)
+
+    movie_mask = media == MEDIA_MOVIE
+    episode_mask = media == MEDIA_EPISODE
+    movie_durations = durations[movie_mask]
+
+    result.update({
+        "movie_count": int(movie_mask.sum()),
+        "episode_count": int(episode_mask.sum()),
+        "total_movie_duration": int(movie_durations.sum()),
+        "total_episode_duration": int(durations[episode_mask].sum()),
+        "max_movie_duration": int(movie_durations.max()) if movie_durations.size else 0,
+        "weekly_activity_python": [int(v) for v in weekly],
+        "weekly_activity_js": [int(weekly[(i - 1) % 7]) for i in range(7)],
+        "hourly_activity": [int(v) for v in hourly],
+        "late_night_plays": int((hours < LATE_NIGHT_END_HOUR).sum()),
+        "unique_days": int(np.unique(day_numbers).size),
+        "unique_platforms": len(cols.platforms),
+        "unique_genres": len(cols.genres),
+        "unique_decades": {f"{int(d)}0s" for d in np.unique(years[movie_mask & (years > 0)] // 10)},
+    })
+
+    title_codes = np.asarray(cols.title_codes, dtype=np.int64)
+    show_codes = np.asarray(cols.show_codes, dtype=np.int64)
+    result["top_movies"] = _top_n(title_codes[title_codes >= 0], cols.titles, top_n)
+    result["top_shows"] = _top_n(show_codes[show_codes >= 0], cols.shows, top_n)
+
+    favorite_genre = _top_n(np.asarray(cols.genre_codes, dtype=np.int64), cols.genres, 1)
+    if favorite_genre:
+        result["favorite_genre"], result["favorite_genre_count"] = favorite_genre[0]
+    favorite_director = _top_n(np.asarray(cols.director_codes, dtype=np.int64), cols.directors, 1)
+    result["favorite_director_count"] = favorite_director[0][1] if favorite_director else 0
+    return result
+
+def _aggregate_python(rows, top_n):
+    result = _empty_result()
+    top_movies, top_shows = Counter(), Counter()
+    genre_counts, director_counts = Counter(), Counter()
+    unique_days, unique_platforms, unique_genres = set(), set(), set()
+
+    for item in rows:
+        dt = datetime.fromtimestamp(item.get('date') or 0)
+        duration = item.get('duration') or 0
+        result["weekly_activity_python"][dt.weekday()] += duration
+        result["weekly_activity_js"][(dt.weekday() + 1) % 7] += duration
+        result["hourly_activity"][dt.hour] += 1
+        unique_days.add(dt.date())
+        if item.get("platform"):
+            unique_platforms.add(item.get("platform"))
+        if dt.hour < LATE_NIGHT_END_HOUR:
+            result["late_night_plays"] += 1
+
+        if item.get("media_type") == 'movie':
+            result["movie_count"] += 1
+            result["total_movie_duration"] += duration
+            if item.get("title") is not None:
+                top_movies[item.get("title")] += 1
+            result["max_movie_duration"] = max(result["max_movie_duration"], duration)
+            if item.get("directors"):
+                director_counts.update(item.get("directors"))
+            if item.get("year"):
+                result["unique_decades"].add(f"{item.get('year') // 10}0s")
+        elif item.get("media_type") == 'episode':
+            result["episode_count"] += 1
+            result["total_episode_duration"] += duration
+            if item.get("grandparent_title") is not None:
+                top_shows[item.get("grandparent_title")] += 1
+
+        if item.get("genres"):
+            genre_counts.update(item.get("genres"))
+            unique_genres.update(item.get("genres"))
+
+    result.update({
+        "unique_days": len(unique_days),
+        "unique_platforms": len(unique_platforms),
+        "unique_genres": len(unique_genres),
+        "top_movies": top_movies.most_common(top_n),
+        "top_shows": top_shows.most_common(top_n),
+    })
+    favorite_genre = genre_counts.most_common(1)
+    if favorite_genre:
+        result["favorite_genre"], result["favorite_genre_count"] = favorite_genre[0]
+    favorite_director = director_counts.most_common(1)
+    result["favorite_director_count"] = favorite_director[0][1] if favorite_director else 0
+    return result
+
+def _heatmap_numpy(dates, durations):
+    dates = np.asarray(dates, dtype=np.int64)
+    local = dates + _local_offsets(dates)
+    # 1970-01-01 foi uma quinta-feira; segunda-feira = 0. Uma única contagem para as 7x24 células.
+    cells = ((local // 86400 + 3) % 7) * 24 + (local % 86400) // 3600
+    plays = np.bincount(cells, minlength=168).reshape(7, 24)
+    seconds = np.bincount(cells, weights=np.asarray(durations, dtype=np.int64), minlength=168).reshape(7, 24)
+    return [[int(v) for v in row] for row in plays], [[int(v) for v in row] for row in seconds]
+
+def _heatmap_python(dates, durations):
+    plays = [[0] * 24 for _ in range(7)]
+    seconds = [[0] * 24 for _ in range(7)]
+    for timestamp, duration in zip(dates, durations):
+        dt = datetime.fromtimestamp(timestamp)
+        plays[dt.weekday()][dt.hour] += 1
+        seconds[dt.weekday()][dt.hour] += duration
+    return plays, seconds
+
+def activity_heatmap(dates, durations, use_numpy=None):
+    """
+    Reproduções e segundos assistidos por dia da semana (linhas, segunda-feira primeiro) e hora
+    local do servidor (colunas), a partir de listas paralelas de timestamps e durações.
+    """
+    if use_numpy is None:
+        use_numpy = HAS_NUMPY
+    if not dates:
+        return {"plays": [[0] * 24 for _ in range(7)], "duration": [[0] * 24 for _ in range(7)]}
+    plays, seconds = _heatmap_numpy(dates, durations) if use_numpy and HAS_NUMPY else _heatmap_python(dates, durations)
+    return {"plays": plays, "duration": seconds}
+
+# transcode_decision do Tautulli -> categoria do relatório ('copy' é o Direct Stream do Plex).
+TRANSCODE_DECISIONS = {"direct play": "direct_play", "copy": "direct_stream", "transcode": "transcode"}
+
+def _empty_transcode_group():
+    return {
+        "plays": 0, "direct_play": 0, "direct_stream": 0, "transcode": 0, "video_transcode": 0, "unknown": 0,
+        "transcode_seconds": 0,
+    }
+
+def _finish_transcode_group(group):
+    known = group["plays"] - group["unknown"]
+    group["transcode_ratio"] = round(group["transcode"] / known, 4) if known else 0.0
+    group["video_transcode_ratio"] = round(group["video_transcode"] / known, 4) if known else 0.0
+    return group
+
+def transcode_breakdown(records):
+    """
+    Direct Play / Direct Stream / Transcode numa única passagem, no total e por utilizador,
+    plataforma e biblioteca.
+
+    :param records: Sequência de (utilizador, plataforma, section_id, transcode_decision,
+        stream_video_decision, duração). 'video_transcode' conta os transcodes em que o vídeo
+        foi recodificado (os que pesam no CPU); sem stream_video_decision, um transcode conta como tal.
+    """
+    total = _empty_transcode_group()
+    groups = {"user": {}, "platform": {}, "library": {}}
+    for user, platform, section_id, decision, video_decision, duration in records:
+        category = TRANSCODE_DECISIONS.get((decision or "").lower(), "unknown")
+        video_transcode = category == "transcode" and (video_decision or "transcode").lower() == "transcode"
+        for bucket in (total, groups["user"].setdefault(user, _empty_transcode_group()),
+                       groups["platform"].setdefault(platform or "", _empty_transcode_group()),
+                       groups["library"].setdefault(section_id or 0, _empty_transcode_group())):
+            bucket["plays"] += 1
+            bucket[category] += 1
+            if category == "transcode":
+                bucket["transcode_seconds"] += duration or 0
+            if video_transcode:
+                bucket["video_transcode"] += 1
+
+    result = {"total": _finish_transcode_group(total)}
+    for name, entries in groups.items():
+        rows = [{"key": key, **_finish_transcode_group(group)} for key, group in entries.items()]
+        rows.sort(key=lambda r: (r["video_transcode"], r["transcode"], r["plays"]), reverse=True)
+        result[f"by_{name}"] = rows
+    return result
+
+def library_breakdown(records, top_n=5):
+    """
+    Equivalente em Python de DataManager.get_library_stats, para quando o espelho local não está pronto.
+
+    :param records: Sequência de (section_id, utilizador, título, duração); os episódios já com o título da série.
+    """
+    libraries = {}
+    for section_id, user, title, duration in records:
+        library = libraries.get(section_id)
+        if library is None:
+            library = libraries[section_id] = {"plays": 0, "total_duration": 0, "viewers": set(), "titles": Counter()}
+        library["plays"] += 1
+        library["total_duration"] += duration or 0
+        library["viewers"].add(user)
+        if title is not None:
+            library["titles"][title] += 1
+    return [{
+        "section_id": section_id, "plays": library["plays"], "total_duration": library["total_duration"],
+        "unique_viewers": len(library["viewers"]),
+        "top_titles": [{"title": title, "plays": plays} for title, plays in library["titles"].most_common(top_n)]
+    } for section_id, library in libraries.items()]
+
+def project_row(row):
+    """Reduz uma linha aos campos usados pelo motor."""
+    return {field: row.get(field) for field in ENGINE_FIELDS}
+
+def project_rows(rows):
+    """Reduz as linhas aos campos usados pelo motor (menos dados a serializar para o pool de processos)."""
+    return [project_row(row) for row in rows]
+
+def user_totals_by_window(plays, cutoffs):
+    """
+    Reproduções e duração por utilizador para vários períodos numa única passagem.
+
+    :param plays: Sequência de (timestamp, utilizador, duração).
+    :param cutoffs: {período: 'YYYY-MM-DD'}; uma reprodução conta para os períodos cuja data limite é <= ao seu dia local.
+    """
+    totals = {window: {} for window in cutoffs}
+    day_cache = {}
+    for timestamp, user, duration in plays:
+        # A conversão para o dia local é feita uma vez por intervalo de 15 minutos (todos os fusos são múltiplos disso).
+        bucket = timestamp // 900
+        day = day_cache.get(bucket)
+        if day is None:
+            day = day_cache[bucket] = datetime.fromtimestamp(bucket * 900).strftime('%Y-%m-%d')
+        for window, cutoff in cutoffs.items():
+            if day >= cutoff:
+                user_totals = totals[window].setdefault(user, {"plays": 0, "total_duration": 0})
+                user_totals["plays"] += 1
+                user_totals["total_duration"] += duration
+    return totals
+
+def aggregate_user_history(rows, top_n=3, use_numpy=None):
+    """
+    Agrega o histórico de um utilizador (lista de linhas no formato do Tautulli).
+
+    :param rows: Linhas do histórico (dicionários com date, duration, media_type, ...).
+    :param top_n: Número de filmes/séries a devolver nos tops.
+    :param use_numpy: Força (True) ou desativa (False) o NumPy; por omissão usa-o se estiver instalado.
+    """
+    if use_numpy is None:
+        use_numpy = HAS_NUMPY
+    if use_numpy and HAS_NUMPY:
+        return _aggregate_numpy(HistoryColumns.from_rows(rows), top_n)
+    return _aggregate_python(rows, top_n)
+
+# --- Resumo anual ("Wrapped") ---
+
+WRAPPED_FIELDS = ENGINE_FIELDS + ("stopped",)
+# Duas reproduções seguidas pertencem à mesma maratona se o intervalo entre elas não exceder este valor.
+BINGE_GAP_SECONDS = 30 * 60
+
+def longest_binge(rows, gap_seconds=BINGE_GAP_SECONDS):
+    """
+    Maior sequência (em duração) de pelo menos duas reproduções encadeadas com intervalos <= gap_seconds.
+    Devolve {start, end, plays, duration, title} ou None; o título é o mais reproduzido na sequência.
+    """
+    best = None
+    chain = None
+
+    def close(chain, best):
+        if chain and chain["plays"] >= 2 and (best is None or chain["duration"] > best["duration"]):
+            titles = chain.pop("titles")
+            return {**chain, "title": titles.most_common(1)[0][0] if titles else None}
+        return best
+
+    for row in sorted(rows, key=lambda r: r.get('date') or 0):
+        start = row.get('date') or 0
+        duration = row.get('duration') or 0
+        stopped = row.get('stopped') or 0
+        end = stopped if stopped > start else start + duration
+        title = row.get('grandparent_title') if row.get('media_type') == 'episode' else row.get('title')
+        if chain and start - chain["end"] <= gap_seconds:
+            chain["end"] = max(chain["end"], end)
+            chain["plays"] += 1
+            chain["duration"] += duration
+        else:
+            best = close(chain, best)
+            chain = {"start": start, "end": end, "plays": 1, "duration": duration, "titles": Counter()}
+        if title:
+            chain["titles"][title] += 1
+    return close(chain, best)
+
+def wrapped_recap(rows, top_n=5):
+    """Resumo anual de um utilizador a partir das suas linhas do histórico (com os campos de WRAPPED_FIELDS)."""
+    stats = aggregate_user_history(rows, top_n)
+    monthly_seconds = [0] * 12
+    month_cache = {}
+    for row in rows:
+        timestamp = row.get('date') or 0
+        bucket = timestamp // 900
+        month = month_cache.get(bucket)
+        if month is None:
+            month = month_cache[bucket] = datetime.fromtimestamp(timestamp).month - 1
+        monthly_seconds[month] += row.get('duration') or 0
+    total_seconds = stats["total_movie_duration"] + stats["total_episode_duration"]
+    return {
+        "plays": len(rows),
+        "total_seconds": total_seconds,
+        "hours": round(total_seconds / 3600, 1),
+        "movie_count": stats["movie_count"],
+        "episode_count": stats["episode_count"],
+        "days_active": stats["unique_days"],
+        "late_night_plays": stats["late_night_plays"],
+        "unique_platforms": stats["unique_platforms"],
+        "unique_genres": stats["unique_genres"],
+        "favorite_genre": stats["favorite_genre"],
+        "top_shows": [{"title": title, "plays": plays} for title, plays in stats["top_shows"]],
+        "top_movies": [{"title": title, "plays": plays} for title, plays in stats["top_movies"]],
+        "monthly_seconds": monthly_seconds,
+        "busiest_month": monthly_seconds.index(max(monthly_seconds)) + 1 if total_seconds else None,
+        "longest_binge": longest_binge(rows),
+    }
+
+def wrapped_batch(partitions, top_n=5):
+    """Resumos anuais de um bloco de utilizadores: partitions é uma lista de (utilizador, linhas)."""
+    return {user: wrapped_recap(rows, top_n) for user, rows in partitions}
@@ -1,31 +1,114 @@
 # app/services/tautulli/stats_handler.py
+import time
 import logging
-from datetime import datetime, timedelta, timezone
-from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from collections import defaultdict
 from flask_babel import gettext as _
 from requests.exceptions import RequestException
+from tzlocal import get_localzone_name
 
-from app.config import load_or_create_config
+from app.config import get_config
+from .response_cache import ResponseCache
+from .recently_added_feed import RecentlyAddedFeed
+from .stats_engine import (
+    activity_heatmap, aggregate_user_history, library_breakdown, project_row, transcode_breakdown, user_totals_by_window
+)
+from .concurrency import build_intervals, concurrency_profile
+from .similarity import title_key
+from ..image_cache import poster_url as proxied_poster_url
 
 logger = logging.getLogger(__name__)
 
 class StatsHandler:
     """Gere a obtenção e processamento de estatísticas do Tautulli."""
 
-    def __init__(self, api_client, data_manager=None):
+    # Períodos oferecidos na página de estatísticas; são calculados juntos numa única passagem.
+    STATS_WINDOWS = (7, 15, 30, 90)
+    MULTI_STATS_TTL = 60
+    CONCURRENCY_TTL = 300
+    HEATMAP_TTL = 300
+    TRANSCODE_REPORT_TTL = 300
+    LIBRARY_STATS_TTL = 600
+    LIBRARY_TOP_TITLES = 5
+    QUIET_HOURS_COUNT = 3
+    RECOMMENDATIONS_LIMIT = 10
+    # Intervalos fechados já não recebem histórico novo: não expiram e só saem da cache quando esta enche
+    # (ResponseCache despeja primeiro as entradas que expiram mais cedo) ou quando a fonte do histórico muda.
+    CLOSED_RANGE_TTL = float('inf')
+
+    def __init__(self, api_client, data_manager=None, history_sync=None, compute_pool=None):
         self.api = api_client
         self.data_manager = data_manager
+        self.history_sync = history_sync
+        self.compute_pool = compute_pool
+        self.results_cache = ResponseCache(max_entries=32)
+        # Separada de results_cache, que é limpa a cada sessão terminada pelo webhook.
+        self.range_cache = ResponseCache(max_entries=64)
+        self.recently_added = RecentlyAddedFeed(api_client)
+        self._local_history_ready = None
+
+    def invalidate_caches(self):
+        """Descarta os resultados calculados (ex.: outro servidor Tautulli ou espelho local acabado de preencher)."""
+        self.results_cache.invalidate()
+        self.range_cache.invalidate()
+
+    def _use_local_history(self):
+        """O espelho local só é usado depois de o backfill inicial estar concluído."""
+        ready = bool(self.history_sync and self.history_sync.is_ready())
+        if ready != self._local_history_ready:
+            # O backfill corre numa tarefa com a sua própria instância: a mudança de fonte é detetada aqui.
+            if self._local_history_ready is not None:
+                logger.info("Fonte do histórico alterada; as estatísticas em cache foram descartadas.")
+                self.invalidate_caches()
+            self._local_history_ready = ready
+        return ready
+
+    @staticmethod
+    def _cutoff_timestamp(after_date_str):
+        """Epoch da meia-noite local da data 'YYYY-MM-DD', equivalente ao filtro 'after' do Tautulli."""
+        return int(datetime.strptime(after_date_str, '%Y-%m-%d').timestamp())
+
+    def _iter_history(self, after_date_str=None, username=None, before_date_str=None):
+        """
+        Percorre o histórico a partir do espelho local ou, em alternativa, diretamente do Tautulli.
+        Ambas as datas ('YYYY-MM-DD') são inclusivas, como os filtros 'after' e 'before' do Tautulli.
+        """
+        if self._use_local_history():
+            since_ts = self._cutoff_timestamp(after_date_str) if after_date_str else None
+            until_ts = self._cutoff_timestamp(before_date_str) + 86400 if before_date_str else None
+            return self.data_manager.iter_watch_history(since_ts=since_ts, username=username, until_ts=until_ts)
+        filters = {}
+        if after_date_str:
+            filters['after'] = after_date_str
+        if before_date_str:
+            filters['before'] = before_date_str
+        if username:
+            filters['user'] = username
+        return self.api.iter_history(**filters)
+
+    def _run_aggregation(self, func, *args, rows=0, label=None):
+        """
+        Executa uma agregação no pool de processos (a partir do limiar de linhas) ou no próprio processo.
+        Devolve (resultado, metadados de tempo).
+        """
+        if self.compute_pool:
+            return self.compute_pool.run(func, *args, rows=rows, label=label)
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+        return result, {"label": label or func.__name__, "rows": rows, "mode": "inline", "compute_ms": elapsed_ms, "wall_ms": elapsed_ms}
 
-    def _calculate_achievements(self, stats, days, username, current_user):
+    def _calculate_achievements(self, stats, days, username, current_user, unlock=True):
         """
         Calcula as conquistas de um utilizador. Esta função atribui e guarda as conquistas
         assim que os critérios são cumpridos, mas só notifica o utilizador se ele
-        estiver a visualizar o seu próprio perfil.
+        estiver a visualizar o seu próprio perfil. Com unlock=False (intervalos de datas
+        arbitrários, que não correspondem aos "últimos N dias") apenas lista as já obtidas.
         """
         if not self.data_manager:
             return []
 
-        config = load_or_create_config()
+        config = get_config()
         
         achievement_definitions = {
             "movie_marathon": {
@@ -71,42 +154,43 @@ class StatsHandler:
             }
         }
         
-        # 1. Verificar quais conquistas são cumpridas com as estatísticas atuais
-        unlocked_in_db = self.data_manager.get_unlocked_achievements(username)
-        newly_unlocked = []
+        if unlock:
+            # 1. Verificar quais conquistas são cumpridas com as estatísticas atuais
+            unlocked_in_db = self.data_manager.get_unlocked_achievements(username)
+            newly_unlocked = []
 
-        for key, definition in achievement_definitions.items():
-            current_value = definition["check"](stats)
-            unlocked_level = None
+            for key, definition in achievement_definitions.items():
+                current_value = definition["check"](stats)
+                unlocked_level = None
             
-            for level in ["gold", "silver", "bronze"]:
-                if level in definition["levels"] and current_value >= definition["levels"][level]["goal"]:
-                    unlocked_level = level
-                    break 
+                for level in ["gold", "silver", "bronze"]:
+                    if level in definition["levels"] and current_value >= definition["levels"][level]["goal"]:
+                        unlocked_level = level
+                        break 
             
-            if unlocked_level:
-                achievement_id = f"{key}_{unlocked_level}"
-                if achievement_id not in unlocked_in_db:
-                    newly_unlocked.append({
-                        "id": achievement_id,
-                        "title": definition["title"],
-                        "level": unlocked_level,
-                        "icon": definition["icon"]
-                    })
+                if unlocked_level:
+                    achievement_id = f"{key}_{unlocked_level}"
+                    if achievement_id not in unlocked_in_db:
+                        newly_unlocked.append({
+                            "id": achievement_id,
+                            "title": definition["title"],
+                            "level": unlocked_level,
+                            "icon": definition["icon"]
+                        })
         
-        # 2. Guardar novas conquistas na base de dados, independentemente de quem está a ver
-        if newly_unlocked:
-            self.data_manager.add_unlocked_achievements(username, newly_unlocked)
+            # 2. Guardar novas conquistas na base de dados, independentemente de quem está a ver
+            if newly_unlocked:
+                self.data_manager.add_unlocked_achievements(username, newly_unlocked)
             
-            # 3. Notificar o utilizador APENAS se ele estiver a ver o seu próprio perfil
-            if current_user and current_user.username == username:
-                for ach in newly_unlocked:
-                    self.data_manager.create_notification(
-                        message=_("Nova conquista desbloqueada: %(title)s (%(level)s)!", username=username, title=ach['title'], level=ach['level']),
-                        category='success',
-                        link=f"/statistics",
-                        username=username
-                    )
+                # 3. Notificar o utilizador APENAS se ele estiver a ver o seu próprio perfil
+                if current_user and current_user.username == username:
+                    for ach in newly_unlocked:
+                        self.data_manager.create_notification(
+                            message=_("Nova conquista desbloqueada: %(title)s (%(level)s)!", username=username, title=ach['title'], level=ach['level']),
+                            category='success',
+                            link=f"/statistics",
+                            username=username
+                        )
 
         # 4. Retornar a lista completa de conquistas da base de dados (agora atualizada)
         final_achievements = []
@@ -128,101 +212,179 @@ class StatsHandler:
 
         return final_achievements
 
-    def get_watch_stats(self, days=7, plex_users_info=None):
-        """Obtém as estatísticas de visualização para todos os utilizadores."""
+    def _compute_user_totals_multi(self, windows):
+        """
+        Reproduções e duração por utilizador para vários períodos (em dias) numa única passagem:
+        o período mais longo é lido uma vez e cada linha é somada a todos os períodos que a incluem.
+        Devolve {"totals": ..., "timing": ...}.
+        """
+        now = datetime.now()
+        cutoffs = {w: (now - timedelta(days=w)).strftime('%Y-%m-%d') for w in windows}
+        longest_cutoff = min(cutoffs.values())
+        load_start = time.perf_counter()
+
+        if self._use_local_history():
+            # Os totais diários já vêm agregados da base de dados: o cálculo é leve e fica no processo principal.
+            totals = {w: {} for w in windows}
+            rows = 0
+            for row in self.data_manager.get_daily_totals_by_user(longest_cutoff):
+                rows += 1
+                for window, cutoff in cutoffs.items():
+                    if row['day'] >= cutoff:
+                        user_totals = totals[window].setdefault(row['user'], {"plays": 0, "total_duration": 0})
+                        user_totals["plays"] += row['plays']
+                        user_totals["total_duration"] += row['total_duration']
+            elapsed_ms = round((time.perf_counter() - load_start) * 1000, 1)
+            timing = {"label": "watch_stats_multi", "rows": rows, "mode": "rollup", "compute_ms": elapsed_ms, "wall_ms": elapsed_ms, "load_ms": 0.0}
+            return {"totals": totals, "timing": timing}
+
+        plays = [
+            (int(item['date']), item['user'], item.get("duration") or 0)
+            for item in self.api.iter_history(after=longest_cutoff)
+            if item.get("user") and item.get('date')
+        ]
+        load_ms = round((time.perf_counter() - load_start) * 1000, 1)
+        totals, timing = self._run_aggregation(user_totals_by_window, plays, cutoffs, rows=len(plays), label="watch_stats_multi")
+        timing["load_ms"] = load_ms
+        return {"totals": totals, "timing": timing}
+
+    def _range_cache(self, date_range, open_ttl):
+        """(cache, ttl) para um intervalo de datas: os fechados nunca expiram; os que incluem hoje usam open_ttl."""
+        if date_range.is_closed():
+            return self.range_cache, self.CLOSED_RANGE_TTL
+        return self.results_cache, open_ttl
+
+    def _compute_user_totals_range(self, date_range):
+        """Reproduções e duração por utilizador entre date_range.start e date_range.end (inclusivos)."""
+        load_start = time.perf_counter()
+        totals = {}
+        rows = 0
+        if self._use_local_history():
+            source, mode = self.data_manager.get_daily_totals_by_user(date_range.start_str, date_range.end_str), "rollup"
+        else:
+            source = (
+                {'user': item['user'], 'plays': 1, 'total_duration': item.get('duration') or 0}
+                for item in self.api.iter_history(after=date_range.start_str, before=date_range.end_str)
+                if item.get('user')
+            )
+            mode = "inline"
+        for row in source:
+            rows += 1
+            user_totals = totals.setdefault(row['user'], {"plays": 0, "total_duration": 0})
+            user_totals["plays"] += row['plays']
+            user_totals["total_duration"] += row['total_duration']
+        elapsed_ms = round((time.perf_counter() - load_start) * 1000, 1)
+        timing = {"label": "watch_stats_range", "rows": rows, "mode": mode, "compute_ms": elapsed_ms, "wall_ms": elapsed_ms, "load_ms": 0.0}
+        return {"totals": totals, "timing": timing}
+
+    @staticmethod
+    def _format_leaderboard(user_stats, plex_users_info):
+        formatted_stats = [{
+            'username': user, 'plays': details['plays'], 'total_duration': details['total_duration'],
+            'avg_duration': details['total_duration'] / details['plays'] if details['plays'] > 0 else 0,
+            'thumb': plex_users_info.get(user, None) if plex_users_info else None
+        } for user, details in user_stats.items()]
+        return sorted(formatted_stats, key=lambda x: x['total_duration'], reverse=True)
+
+    def get_watch_stats_multi(self, windows=None, plex_users_info=None):
+        """
+        Obtém as estatísticas de visualização de todos os utilizadores para vários períodos de uma vez.
+        O resultado agregado fica em cache durante MULTI_STATS_TTL segundos.
+        """
+        windows = tuple(sorted(set(int(w) for w in (windows or self.STATS_WINDOWS))))
         try:
-            after_date = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
-            history_response = self.api.get_history(after=after_date)
-            
-            history_data = history_response.get('data', [])
-            
-            user_stats = {}
-            for item in history_data:
-                username = item.get("user")
-                if not username: continue
-                user_stats.setdefault(username, {"plays": 0, "total_duration": 0})
-                user_stats[username]["plays"] += 1
-                user_stats[username]["total_duration"] += item.get("duration", 0)
-            
-            formatted_stats = [{
-                'username': user, 'plays': details['plays'], 'total_duration': details['total_duration'],
-                'avg_duration': details['total_duration'] / details['plays'] if details['plays'] > 0 else 0,
-                'thumb': plex_users_info.get(user, None) if plex_users_info else None
-            } for user, details in user_stats.items()]
-            
-            return {"success": True, "stats": sorted(formatted_stats, key=lambda x: x['total_duration'], reverse=True)}
+            key = ResponseCache.make_key("watch_stats_multi", {"windows": ",".join(map(str, windows))})
+            computed = self.results_cache.get_or_load(key, lambda: self._compute_user_totals_multi(windows), self.MULTI_STATS_TTL)
+            return {
+                "success": True,
+                "windows": {str(w): self._format_leaderboard(computed["totals"][w], plex_users_info) for w in windows},
+                "timing": computed["timing"]
+            }
         except RequestException as e:
             return {"success": False, "message": _("Erro de conexão com o Tautulli: %(error)s", error=e)}
         except Exception as e:
             logger.error(_("Erro inesperado ao processar estatísticas: %(error)s", error=e), exc_info=True)
             return {"success": False, "message": _("Erro inesperado ao processar estatísticas: %(error)s", error=e)}
 
-    def get_user_watch_details(self, username, days=7, current_user=None):
-        """Obtém detalhes de visualização para um único utilizador."""
-        try:
-            after_date_str = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
-            history_response = self.api.get_history(after=after_date_str, user=username)
+    def get_watch_stats(self, days=7, plex_users_info=None, date_range=None):
+        """Obtém as estatísticas de visualização para todos os utilizadores (últimos `days` dias ou um DateRange)."""
+        if date_range:
+            try:
+                cache, ttl = self._range_cache(date_range, self.MULTI_STATS_TTL)
+                key = ResponseCache.make_key("watch_stats_range", date_range.cache_params())
+                computed = cache.get_or_load(key, lambda: self._compute_user_totals_range(date_range), ttl)
+                return {
+                    "success": True,
+                    "stats": self._format_leaderboard(computed["totals"], plex_users_info),
+                    "range": date_range.to_dict(),
+                    "timing": computed["timing"]
+                }
+            except RequestException as e:
+                return {"success": False, "message": _("Erro de conexão com o Tautulli: %(error)s", error=e)}
+            except Exception as e:
+                logger.error(_("Erro inesperado ao processar estatísticas: %(error)s", error=e), exc_info=True)
+                return {"success": False, "message": _("Erro inesperado ao processar estatísticas: %(error)s", error=e)}
+        # Calcula também os restantes períodos da página, para que a troca de período use a cache.
+        result = self.get_watch_stats_multi(set(self.STATS_WINDOWS) | {days}, plex_users_info)
+        if not result.get("success"):
+            return result
+        return {"success": True, "stats": result["windows"][str(days)], "timing": result["timing"]}
 
-            history = history_response.get('data', [])
-            
-            stats = {
-                "movie_count": 0, "episode_count": 0,
-                "total_movie_duration": 0, "total_episode_duration": 0,
-                "genre_counts": Counter(), "recent": [],
-                "weekly_activity_python": [0]*7,
-                "weekly_activity_js": [0]*7,
-                "top_movies": Counter(), "top_shows": Counter(),
-                "late_night_plays": 0,
-                "unique_genres": set(), "unique_days": set(),
-                "max_movie_duration": 0, "unique_platforms": set(),
-                "director_counts": Counter(), "unique_decades": set()
-            }
-            
-            for item in history:
-                dt = datetime.fromtimestamp(item.get('date'))
-                stats["weekly_activity_python"][dt.weekday()] += item.get('duration', 0)
-                stats["weekly_activity_js"][(dt.weekday() + 1) % 7] += item.get('duration', 0)
-                stats["unique_days"].add(dt.date())
-                
-                if item.get("platform"):
-                    stats["unique_platforms"].add(item.get("platform"))
+    def _compute_user_details(self, username, after_date_str, before_date_str=None):
+        """Agregados do histórico de um utilizador, com as 5 reproduções mais recentes. Devolve (stats, timing)."""
+        load_start = time.perf_counter()
+        # Uma única passagem pelo histórico (do mais recente para o mais antigo): de cada linha ficam
+        # apenas os campos do motor e a chave do título; só as 5 primeiras são guardadas por inteiro.
+        rows, recent, title_keys = [], [], set()
+        for item in self._iter_history(after_date_str, username=username, before_date_str=before_date_str):
+            rows.append(project_row(item))
+            if len(recent) < 5:
+                recent.append(item)
+            key = title_key(item)[0]
+            if key is not None:
+                title_keys.add(key)
+        load_ms = round((time.perf_counter() - load_start) * 1000, 1)
+        stats, timing = self._run_aggregation(
+            aggregate_user_history, rows, 3, rows=len(rows), label="user_watch_details"
+        )
+        timing["load_ms"] = load_ms
 
-                if 0 <= dt.hour < 4:
-                    stats["late_night_plays"] += 1
-                
-                if item.get("media_type") == 'movie':
-                    stats["movie_count"] += 1
-                    duration = item.get('duration', 0)
-                    stats["total_movie_duration"] += duration
-                    stats["top_movies"][item.get("title")] += 1
-                    if duration > stats["max_movie_duration"]:
-                        stats["max_movie_duration"] = duration
-                    if item.get("directors"):
-                        stats["director_counts"].update(item.get("directors"))
-                    if item.get("year"):
-                        stats["unique_decades"].add(f"{item.get('year') // 10}0s")
-
-                elif item.get("media_type") == 'episode':
-                    stats["episode_count"] += 1
-                    stats["total_episode_duration"] += item.get('duration', 0)
-                    stats["top_shows"][item.get("grandparent_title")] += 1
-                
-                if item.get("genres"):
-                    stats["genre_counts"].update(item.get("genres"))
-                    stats["unique_genres"].update(item.get("genres"))
-                
-                if len(stats["recent"]) < 5:
-                    poster_url = f"{self.api.base_url}/pms_image_proxy?img={item['thumb']}&width=200&height=300&apikey={self.api.api_key}" if item.get('thumb') else ''
-                    stats["recent"].append({"type": item.get("media_type"), "title": item.get("title"), "series": item.get("grandparent_title"), "poster_url": poster_url, "play_date": dt.strftime('%d/%m/%Y %H:%M')})
-            
-            favorite_genre_info = stats["genre_counts"].most_common(1)
-            stats["favorite_genre"] = favorite_genre_info[0][0] if favorite_genre_info else _('N/D')
-            stats["favorite_genre_count"] = favorite_genre_info[0][1] if favorite_genre_info else 0
+        stats["recent"] = []
+        for item in recent:
+            play_date = datetime.fromtimestamp(item.get('date') or 0).strftime('%d/%m/%Y %H:%M')
+            poster_url = proxied_poster_url(item.get('thumb'), 200, 300)
+            stats["recent"].append({"type": item.get("media_type"), "title": item.get("title"), "series": item.get("grandparent_title"), "poster_url": poster_url, "play_date": play_date})
+        if stats["favorite_genre"] is None:
+            stats["favorite_genre"] = _('N/D')
+        # Sem o espelho local, as recomendações excluem apenas os títulos vistos no período pedido.
+        stats["title_keys"] = sorted(title_keys)
+        return stats, timing
 
-            favorite_director_info = stats["director_counts"].most_common(1)
-            stats["favorite_director_count"] = favorite_director_info[0][1] if favorite_director_info else 0
+    def _recommendations_for(self, username, stats):
+        """Títulos ainda não vistos, a partir da tabela title_similarities recalculada todas as noites."""
+        if not self.data_manager:
+            return []
+        if self._use_local_history():
+            watched = self.data_manager.get_watched_title_keys(username)
+        else:
+            watched = stats.get("title_keys", [])
+        return self.data_manager.get_title_recommendations(watched, limit=self.RECOMMENDATIONS_LIMIT)
 
-            achievements = self._calculate_achievements(stats, days, username, current_user)
+    def get_user_watch_details(self, username, days=7, current_user=None, date_range=None):
+        """Obtém detalhes de visualização para um único utilizador (últimos `days` dias ou um DateRange)."""
+        try:
+            if date_range:
+                cache, ttl = self._range_cache(date_range, self.MULTI_STATS_TTL)
+                key = ResponseCache.make_key("user_watch_details", {"username": username, **date_range.cache_params()})
+                stats, timing = cache.get_or_load(
+                    key, lambda: self._compute_user_details(username, date_range.start_str, date_range.end_str), ttl
+                )
+                days = date_range.days
+            else:
+                after_date_str = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+                stats, timing = self._compute_user_details(username, after_date_str)
+
+            achievements = self._calculate_achievements(stats, days, username, current_user, unlock=date_range is None)
 
             details_to_return = {
                 "movie_count": stats["movie_count"],
@@ -232,58 +394,207 @@ class StatsHandler:
                 "recent": stats["recent"],
                 "weekly_activity": stats["weekly_activity_js"],
                 "favorite_genre": stats["favorite_genre"],
-                "top_movies": [{'title': title, 'plays': plays} for title, plays in stats["top_movies"].most_common(3)],
-                "top_shows": [{'title': title, 'plays': plays} for title, plays in stats["top_shows"].most_common(3)],
-                "achievements": achievements
+                "top_movies": [{'title': title, 'plays': plays} for title, plays in stats["top_movies"]],
+                "top_shows": [{'title': title, 'plays': plays} for title, plays in stats["top_shows"]],
+                "achievements": achievements,
+                "recommendations": self._recommendations_for(username, stats)
             }
 
-            return {"success": True, "details": details_to_return}
+            result = {"success": True, "details": details_to_return, "timing": timing}
+            if date_range:
+                result["range"] = date_range.to_dict()
+            return result
         except RequestException as e:
             return {"success": False, "message": _("Erro de conexão com o Tautulli: %(error)s", error=e)}
         except Exception as e:
             logger.error(_("Erro inesperado ao processar detalhes do utilizador: %(error)s", error=e), exc_info=True)
             return {"success": False, "message": _("Erro inesperado: %(error)s", error=e)}
     
-    def get_recently_added(self, days=7):
-        """Obtém os itens adicionados recentemente do Tautulli e filtra por data."""
+    def _compute_concurrency(self, days):
+        window_end = int(time.time())
+        window_start = window_end - days * 86400
+        after_date_str = datetime.fromtimestamp(window_start).strftime('%Y-%m-%d')
+
+        load_start = time.perf_counter()
+        intervals = build_intervals(self._iter_history(after_date_str), window_start, window_end)
+        limits = {}
+        if self.data_manager:
+            limits = {p['username']: p.get('screen_limit') or 0 for p in self.data_manager.get_all_user_profiles()}
+        load_ms = round((time.perf_counter() - load_start) * 1000, 1)
+
+        profile, timing = self._run_aggregation(
+            concurrency_profile, intervals, window_start, window_end, limits,
+            rows=len(intervals), label="concurrency"
+        )
+        timing["load_ms"] = load_ms
+        profile.update({"days": days, "window_start": window_start, "window_end": window_end, "timing": timing})
+        return profile
+
+    def get_concurrency_stats(self, days=30):
+        """
+        Pico e p95 de streams simultâneos do servidor e de cada utilizador nos últimos `days` dias,
+        com a série temporal de streams e os utilizadores que atingem o seu limite de ecrãs.
+        """
         try:
-            response = self.api.get_recently_added(count=250)
-            
-            all_media = response.get('recently_added', [])
-            
-            cutoff_date = datetime.now(timezone.utc) - timedelta(days=days)
-            
-            filtered_media = []
-            for item in all_media:
-                added_at_ts = item.get('added_at')
-                if added_at_ts:
-                    added_at = datetime.fromtimestamp(int(added_at_ts), tz=timezone.utc)
-                    if added_at >= cutoff_date:
-                        thumb_key = item.get('thumb')
-                        if item.get('media_type') == 'episode' and item.get('grandparent_thumb'):
-                            thumb_key = item.get('grandparent_thumb')
-                        
-                        poster_url = f"{self.api.base_url}/pms_image_proxy?img={thumb_key}&width=300&height=450&apikey={self.api.api_key}" if thumb_key else ''
-                        
-                        def safe_int(value, default=0):
-                            try:
-                                return int(float(value)) if value else default
-                            except (ValueError, TypeError):
-                                return default
-
-                        filtered_media.append({
-                            'title': item.get('title'),
-                            'year': item.get('year'),
-                            'poster_url': poster_url,
-                            'added_at': added_at.isoformat(),
-                            'media_type': item.get('media_type'),
-                            'grandparent_title': item.get('grandparent_title'),
-                            'parent_title': item.get('parent_title'),
-                            'media_index': safe_int(item.get('media_index')),
-                            'parent_media_index': safe_int(item.get('parent_media_index'))
-                        })
+            key = ResponseCache.make_key("concurrency", {"days": days})
+            profile = self.results_cache.get_or_load(key, lambda: self._compute_concurrency(days), self.CONCURRENCY_TTL)
+            return {"success": True, "concurrency": profile}
+        except RequestException as e:
+            return {"success": False, "message": _("Erro de conexão com o Tautulli: %(error)s", error=e)}
+        except Exception as e:
+            logger.error(_("Erro inesperado ao calcular a concorrência de reproduções: %(error)s", error=e), exc_info=True)
+            return {"success": False, "message": _("Erro inesperado: %(error)s", error=e)}
+
+    def _compute_heatmap(self, days, username):
+        after_date_str = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+        load_start = time.perf_counter()
+        dates, durations = [], []
+        for item in self._iter_history(after_date_str, username=username):
+            if item.get('date'):
+                dates.append(int(item['date']))
+                durations.append(item.get('duration') or 0)
+        load_ms = round((time.perf_counter() - load_start) * 1000, 1)
+
+        heatmap, timing = self._run_aggregation(activity_heatmap, dates, durations, rows=len(dates), label="activity_heatmap")
+        timing["load_ms"] = load_ms
+
+        # Horas do dia com menos tempo assistido (somando todos os dias da semana), as mais indicadas para manutenção.
+        seconds_by_hour = [sum(day[hour] for day in heatmap["duration"]) for hour in range(24)]
+        heatmap.update({
+            "days": days,
+            "username": username,
+            "timezone": get_localzone_name(),
+            "quiet_hours": sorted(range(24), key=lambda hour: seconds_by_hour[hour])[:self.QUIET_HOURS_COUNT],
+            "timing": timing,
+        })
+        return heatmap
+
+    def get_activity_heatmap(self, days=30, username=None):
+        """Mapa de calor 7x24 (dia da semana x hora local) das reproduções de um utilizador ou de todo o servidor."""
+        try:
+            key = ResponseCache.make_key("activity_heatmap", {"days": days, "user": username or ""})
+            heatmap = self.results_cache.get_or_load(key, lambda: self._compute_heatmap(days, username), self.HEATMAP_TTL)
+            return {"success": True, "heatmap": heatmap}
+        except RequestException as e:
+            return {"success": False, "message": _("Erro de conexão com o Tautulli: %(error)s", error=e)}
+        except Exception as e:
+            logger.error(_("Erro inesperado ao calcular o mapa de atividade: %(error)s", error=e), exc_info=True)
+            return {"success": False, "message": _("Erro inesperado: %(error)s", error=e)}
+
+    def _libraries(self):
+        """{section_id: biblioteca} a partir do get_libraries do Tautulli; vazio se o Tautulli não responder."""
+        try:
+            libraries = self.api.get_libraries() or []
+        except RequestException as e:
+            logger.warning(f"Não foi possível obter as bibliotecas do Tautulli: {e}")
+            return {}
+        by_id = {}
+        for library in libraries:
+            try:
+                by_id[int(library.get('section_id'))] = library
+            except (TypeError, ValueError):
+                continue
+        return by_id
 
-            return {"success": True, "media": filtered_media}
+    def _compute_transcode_report(self, days):
+        after_date_str = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+        load_start = time.perf_counter()
+        records = []
+        for item in self._iter_history(after_date_str):
+            try:
+                section_id = int(item.get('section_id') or 0)
+            except (TypeError, ValueError):
+                section_id = 0
+            records.append((
+                item.get('user'), item.get('platform'), section_id,
+                item.get('transcode_decision'), item.get('stream_video_decision'), item.get('duration') or 0
+            ))
+        load_ms = round((time.perf_counter() - load_start) * 1000, 1)
+
+        report, timing = self._run_aggregation(transcode_breakdown, records, rows=len(records), label="transcode_report")
+        timing["load_ms"] = load_ms
+
+        libraries = self._libraries()
+        for entry in report["by_library"]:
+            section_id = entry["key"]
+            entry["section_id"] = section_id or None
+            entry["key"] = libraries.get(section_id, {}).get('section_name') or (_("Biblioteca %(id)s", id=section_id) if section_id else _("Desconhecida"))
+        for entry in report["by_platform"]:
+            entry["key"] = entry["key"] or _("Desconhecida")
+        report.update({"days": days, "timing": timing})
+        return report
+
+    def get_transcode_report(self, days=30):
+        """Proporção de Direct Play, Direct Stream e Transcode no total e por utilizador, plataforma e biblioteca."""
+        try:
+            key = ResponseCache.make_key("transcode_report", {"days": days})
+            report = self.results_cache.get_or_load(key, lambda: self._compute_transcode_report(days), self.TRANSCODE_REPORT_TTL)
+            return {"success": True, "report": report}
+        except RequestException as e:
+            return {"success": False, "message": _("Erro de conexão com o Tautulli: %(error)s", error=e)}
+        except Exception as e:
+            logger.error(_("Erro inesperado ao gerar o relatório de transcodificação: %(error)s", error=e), exc_info=True)
+            return {"success": False, "message": _("Erro inesperado: %(error)s", error=e)}
+
+    def _history_revision(self):
+        """Epoch da entrada mais recente do espelho: entra nas chaves de cache, que mudam quando chega histórico novo."""
+        if self._use_local_history():
+            return self.data_manager.get_watch_history_latest_date() or 0
+        return None
+
+    def _compute_library_stats(self, days):
+        after_date_str = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+        load_start = time.perf_counter()
+        if self._use_local_history():
+            rows = self.data_manager.get_library_stats(self._cutoff_timestamp(after_date_str), top_n=self.LIBRARY_TOP_TITLES)
+            elapsed_ms = round((time.perf_counter() - load_start) * 1000, 1)
+            timing = {"label": "library_stats", "rows": len(rows), "mode": "sql", "compute_ms": elapsed_ms, "wall_ms": elapsed_ms, "load_ms": 0.0}
+        else:
+            records = []
+            for item in self._iter_history(after_date_str):
+                try:
+                    section_id = int(item.get('section_id') or 0)
+                except (TypeError, ValueError):
+                    section_id = 0
+                title = item.get('grandparent_title') if item.get('media_type') == 'episode' else item.get('title')
+                records.append((section_id, item.get('user'), title, item.get('duration') or 0))
+            load_ms = round((time.perf_counter() - load_start) * 1000, 1)
+            rows, timing = self._run_aggregation(library_breakdown, records, self.LIBRARY_TOP_TITLES, rows=len(records), label="library_stats")
+            timing["load_ms"] = load_ms
+
+        # Bibliotecas sem reproduções no período também são listadas: são as candidatas a deixar de partilhar.
+        libraries = self._libraries()
+        by_section = {row["section_id"]: row for row in rows}
+        for section_id in libraries:
+            by_section.setdefault(section_id, {
+                "section_id": section_id, "plays": 0, "total_duration": 0, "unique_viewers": 0, "top_titles": []
+            })
+        for section_id, row in by_section.items():
+            library = libraries.get(section_id, {})
+            row["section_id"] = section_id or None
+            row["section_name"] = library.get('section_name') or (_("Biblioteca %(id)s", id=section_id) if section_id else _("Desconhecida"))
+            row["section_type"] = library.get('section_type')
+        return {
+            "days": days,
+            "libraries": sorted(by_section.values(), key=lambda r: (r["total_duration"], r["plays"]), reverse=True),
+            "timing": timing,
+        }
+
+    def get_library_stats(self, days=30):
+        """Reproduções, horas assistidas, espectadores únicos e títulos mais vistos por biblioteca."""
+        try:
+            key = ResponseCache.make_key("library_stats", {"days": days, "rev": self._history_revision()})
+            return {"success": True, **self.results_cache.get_or_load(key, lambda: self._compute_library_stats(days), self.LIBRARY_STATS_TTL)}
+        except RequestException as e:
+            return {"success": False, "message": _("Erro de conexão com o Tautulli: %(error)s", error=e)}
+        except Exception as e:
+            logger.error(_("Erro inesperado ao calcular as estatísticas por biblioteca: %(error)s", error=e), exc_info=True)
+            return {"success": False, "message": _("Erro inesperado: %(error)s", error=e)}
+
+    def get_recently_added(self, days=7):
+        """Obtém os itens adicionados recentemente nos últimos `days` dias, a partir do feed em cache."""
+        try:
+            return {"success": True, "media": self.recently_added.get_items(days)}
 
         except RequestException as e:
             return {"success": False, "message": _("Erro de conexão com o Tautulli: %(error)s", error=str(e))}
@@ -294,14 +605,18 @@ class StatsHandler:
     def get_user_devices(self, username):
         """Obtém os dispositivos utilizados por um utilizador a partir do seu histórico."""
         try:
-            history_response = self.api.get_history(user=username, length=500)
-            history = history_response.get('data', [])
-
-            if not history:
-                return {"success": True, "devices": []}
+            if self._use_local_history() and self.history_sync.is_devices_index_ready():
+                devices = [{
+                    'player': d['player'] or 'Desconhecido',
+                    'platform': d['platform'] or 'Desconhecida',
+                    'first_seen': d['first_seen'],
+                    'last_seen': d['last_seen'],
+                    'play_count': d['play_count']
+                } for d in self.data_manager.get_user_devices(username)]
+                return {"success": True, "devices": devices}
 
             devices = defaultdict(lambda: {'platform': '', 'last_seen': 0})
-            for item in history:
+            for item in self.api.iter_history(user=username, page_size=500, max_rows=500):
                 device_key = f"{item.get('player', 'Desconhecido')}|{item.get('platform', 'Desconhecida')}"
                 
                 if item.get('date') > devices[device_key]['last_seen']:
@@ -0,0 +1,124 @@
+# app/services/tautulli/wrapped.py
+import time
+import logging
+import threading
+from datetime import datetime
+from requests.exceptions import RequestException
+
+from .stats_engine import WRAPPED_FIELDS, wrapped_batch
+
+logger = logging.getLogger(__name__)
+
+# O bloqueio e o estado da geração são do processo, e não da instância do gerador, para que a API
+# veja sempre a geração lançada por uma tarefa.
+_generation_lock = threading.Lock()
+_status = {"running": False, "year": None, "started_at": None, "last_result": None}
+
+class WrappedGenerator:
+    """
+    Gera os resumos anuais ("Wrapped") de todos os utilizadores numa única passagem.
+
+    O histórico do ano é lido uma vez (espelho local ou Tautulli), reduzido aos campos
+    usados pelo motor e repartido por utilizador. Os utilizadores são agrupados em blocos
+    de cerca de CHUNK_ROWS linhas, calculados em paralelo no pool de processos, e os
+    resultados substituem os resumos desse ano numa única transação.
+    """
+
+    TOP_N = 5
+    CHUNK_ROWS = 20000
+
+    def __init__(self, iter_history, data_manager, compute_pool=None):
+        """
+        :param iter_history: Função (after_date_str, before_date_str=...) que percorre o histórico,
+                             normalmente StatsHandler._iter_history.
+        """
+        self.iter_history = iter_history
+        self.data_manager = data_manager
+        self.compute_pool = compute_pool
+
+    def _partition(self, year):
+        """{utilizador: [linhas reduzidas]} do ano indicado e o número total de linhas."""
+        partitions = {}
+        rows = 0
+        for item in self.iter_history(f"{year}-01-01", before_date_str=f"{year}-12-31"):
+            user = item.get('user')
+            if not user:
+                continue
+            partitions.setdefault(user, []).append({field: item.get(field) for field in WRAPPED_FIELDS})
+            rows += 1
+        return partitions, rows
+
+    def _chunks(self, partitions):
+        """Agrupa os utilizadores em blocos de ~CHUNK_ROWS linhas; um utilizador nunca é dividido."""
+        chunks, current, current_rows = [], [], 0
+        for user, rows in sorted(partitions.items(), key=lambda p: len(p[1]), reverse=True):
+            if current and current_rows + len(rows) > self.CHUNK_ROWS:
+                chunks.append((current, self.TOP_N))
+                current, current_rows = [], 0
+            current.append((user, rows))
+            current_rows += len(rows)
+        if current:
+            chunks.append((current, self.TOP_N))
+        return chunks
+
+    def _compute(self, chunks, rows):
+        if self.compute_pool:
+            return self.compute_pool.map(wrapped_batch, chunks, rows=rows, label="wrapped")
+        start = time.perf_counter()
+        results = []
+        for args in chunks:
+            results.append(wrapped_batch(*args))
+            time.sleep(0)
+        elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+        return results, {"label": "wrapped", "rows": rows, "chunks": len(chunks), "mode": "inline", "compute_ms": elapsed_ms, "wall_ms": elapsed_ms}
+
+    def generate(self, year):
+        """
+        Gera e grava os resumos de `year` para todos os utilizadores com reproduções nesse ano.
+        :return: Dicionário com o resultado, o número de utilizadores e linhas e os tempos de cada fase.
+        """
+        if not self.data_manager:
+            return {"success": False, "message": "Gestor de dados indisponível."}
+        if not _generation_lock.acquire(blocking=False):
+            logger.info(f"Geração dos resumos anuais já em curso. Pedido para {year} ignorado.")
+            return {"success": False, "message": "Geração dos resumos anuais já em curso."}
+
+        _status.update(running=True, year=year, started_at=datetime.now().isoformat())
+        result = None
+        try:
+            start = time.perf_counter()
+            partitions, rows = self._partition(year)
+            load_ms = round((time.perf_counter() - start) * 1000, 1)
+
+            results, timing = self._compute(self._chunks(partitions), rows)
+            recaps = {}
+            for batch in results:
+                recaps.update(batch)
+
+            achievements = self.data_manager.get_achievements_unlocked_between(datetime(year, 1, 1), datetime(year + 1, 1, 1))
+            for user, recap in recaps.items():
+                recap["achievements"] = achievements.get(user, [])
+
+            save_start = time.perf_counter()
+            self.data_manager.replace_wrapped_snapshots(year, recaps)
+            timing.update(load_ms=load_ms, save_ms=round((time.perf_counter() - save_start) * 1000, 1),
+                          total_ms=round((time.perf_counter() - start) * 1000, 1))
+
+            logger.info(f"Resumos anuais de {year} gerados: {len(recaps)} utilizador(es), {rows} linha(s), {timing['total_ms']} ms.")
+            result = {"success": True, "year": year, "users": len(recaps), "rows": rows, "timing": timing}
+        except RequestException as e:
+            logger.error(f"Erro de conexão com o Tautulli ao gerar os resumos anuais de {year}: {e}")
+            result = {"success": False, "year": year, "message": f"Erro de conexão com o Tautulli: {e}"}
+        except Exception as e:
+            logger.error(f"Erro inesperado ao gerar os resumos anuais de {year}: {e}", exc_info=True)
+            result = {"success": False, "year": year, "message": f"Erro inesperado: {e}"}
+        finally:
+            _status.update(running=False, last_result=result)
+            _generation_lock.release()
+        return result
+
+    def is_running(self):
+        return _generation_lock.locked()
+
+    def get_status(self):
+        return dict(_status)
@@ -1,11 +1,16 @@
 # app/services/tautulli_manager.py
 
+import json
 import logging
 from flask_babel import gettext as _
 
 from .tautulli.api_client import TautulliApiClient
 from .tautulli.notifier_handler import NotifierHandler
 from .tautulli.stats_handler import StatsHandler
+from .tautulli.history_sync import HistorySyncHandler
+from .tautulli.ingest_handler import IngestHandler, BODY_FIELDS as INGEST_BODY_FIELDS
+from .tautulli.wrapped import WrappedGenerator
+from .tautulli.recommendations import RecommendationBuilder
 
 logger = logging.getLogger(__name__)
 
@@ -14,27 +19,91 @@ class TautulliManager:
     Atua como uma fachada, a coordenar os vários serviços do Tautulli.
     Isto mantém a API pública consistente para o resto da aplicação.
     """
-    def __init__(self, data_manager):
+    CONFIG_KEYS = ('TAUTULLI_URL', 'TAUTULLI_API_KEY')
+
+    def __init__(self, data_manager, compute_pool=None):
         self.api_client = TautulliApiClient()
         self.notifiers = NotifierHandler(self.api_client, data_manager)
-        self.stats = StatsHandler(self.api_client, data_manager)
+        self.history_sync = HistorySyncHandler(self.api_client, data_manager)
+        self.stats = StatsHandler(self.api_client, data_manager, history_sync=self.history_sync, compute_pool=compute_pool)
+        self.ingest = IngestHandler(data_manager, self.stats)
+        self.wrapped = WrappedGenerator(self.stats._iter_history, data_manager, compute_pool=compute_pool)
+        self.recommendations = RecommendationBuilder(self.stats._iter_history, data_manager, compute_pool=compute_pool)
 
     def reload_credentials(self):
         """Recarrega as credenciais e configurações para o Tautulli."""
         logger.info("A recarregar as credenciais do Tautulli Manager...")
         self.api_client.reload_config()
+        self.stats.recently_added.reset()
+        # Os intervalos fechados ficam em cache sem expirar: com outro servidor deixam de ser válidos.
+        self.stats.invalidate_caches()
 
     def check_status(self):
         """Verifica o estado da conexão com o Tautulli."""
         if not self.api_client.is_configured:
             return {"status": "OFFLINE", "message": _("Não configurado.")}
         
-        test_result = self.api_client.test_connection(self.api_client.base_url, self.api_client.api_key)
+        test_result = self.api_client.test_connection(self.api_client.base_url, self.api_client.api_key, session=self.api_client.session)
         if test_result['success']:
             return {"status": "ONLINE", "message": _("Conectado com sucesso.")}
         else:
             return {"status": "OFFLINE", "message": test_result['message']}
 
+    def get_cache_stats(self):
+        """Contadores da cache de respostas do Tautulli."""
+        return self.api_client.cache.get_stats()
+
+    def ingest_event(self, payload):
+        return self.ingest.handle_event(payload)
+
+    def parse_ingest_body(self, text):
+        return self.ingest.parse_body(text)
+
+    def get_live_activity(self):
+        return self.ingest.get_live_stats()
+
+    def get_ingest_webhook_config(self, webhook_url, ingest_key):
+        """
+        Devolve a configuração a aplicar num notificador Webhook do Tautulli para que
+        este envie os eventos de reprodução para o endpoint de ingestão do painel.
+        """
+        payload = self._get_base_payload_for_notifier('ingest_webhook')
+        payload.update({
+            "agent_id": 25, # Agente 'Webhook' do Tautulli
+            "webhook_hook": webhook_url,
+            "webhook_method": "POST",
+            "webhook_headers": json.dumps({"X-Painel-Key": ingest_key, "Content-Type": "application/json"}),
+        })
+        return payload
+
+    def get_concurrency_stats(self, days=30):
+        return self.stats.get_concurrency_stats(days=days)
+
+    def get_activity_heatmap(self, days=30, username=None):
+        return self.stats.get_activity_heatmap(days=days, username=username)
+
+    def get_transcode_report(self, days=30):
+        return self.stats.get_transcode_report(days=days)
+
+    def get_library_stats(self, days=30):
+        return self.stats.get_library_stats(days=days)
+
+    def generate_wrapped(self, year):
+        return self.wrapped.generate(year)
+
+    def get_wrapped_status(self):
+        return self.wrapped.get_status()
+
+    def rebuild_recommendations(self):
+        return self.recommendations.rebuild()
+
+    def sync_history(self):
+        """Sincroniza o espelho local do histórico de visualizações."""
+        result = self.history_sync.sync()
+        if result.get("success") and result.get("backfill"):
+            self.stats.invalidate_caches()
+        return result
+
     def test_connection(self, url, api_key):
         return self.api_client.test_connection(url, api_key)
 
@@ -47,11 +116,22 @@ class TautulliManager:
     def manage_block_unblock(self, user_email, username, action: str, notifier_id: int = None, reason: str = 'manual'):
         return self.notifiers.manage_block_unblock(user_email, username, action, notifier_id, reason)
 
-    def get_watch_stats(self, days=7, plex_users_info=None):
-        return self.stats.get_watch_stats(days, plex_users_info)
+    def submit_screen_limit(self, user_email, username, screens, update_profile=True):
+        """Agenda a alteração do limite de telas sem esperar pela escrita; devolve um Future."""
+        return self.notifiers.submit_screen_limit(user_email, username, screens, update_profile=update_profile)
 
-    def get_user_watch_details(self, username, days=7, current_user=None):
-        return self.stats.get_user_watch_details(username, days, current_user)
+    def submit_block_unblock(self, user_email, username, action: str, notifier_id: int = None, reason: str = 'manual'):
+        """Agenda um bloqueio/desbloqueio sem esperar pela escrita; devolve um Future."""
+        return self.notifiers.submit_block_unblock(user_email, username, action, notifier_id, reason)
+
+    def get_watch_stats(self, days=7, plex_users_info=None, date_range=None):
+        return self.stats.get_watch_stats(days, plex_users_info, date_range=date_range)
+
+    def get_watch_stats_multi(self, windows=None, plex_users_info=None):
+        return self.stats.get_watch_stats_multi(windows, plex_users_info)
+
+    def get_user_watch_details(self, username, days=7, current_user=None, date_range=None):
+        return self.stats.get_user_watch_details(username, days, current_user, date_range=date_range)
 
     def get_recently_added(self, days=7):
         return self.stats.get_recently_added(days)
@@ -71,10 +151,9 @@ class TautulliManager:
             return {"success": False, "message": _("Tipo de notificador inválido.")}
         
         try:
-            import requests, json
             api_url = f"{url.rstrip('/')}/api/v2"
             params_get = {"apikey": api_key, "cmd": "get_notifier_config", "notifier_id": notifier_id}
-            response_get = requests.get(api_url, params=params_get, timeout=10)
+            response_get = self.api_client.session.get(api_url, params=params_get, timeout=10)
             response_get.raise_for_status()
             current_config = response_get.json().get("response", {}).get("data", {})
             
@@ -94,8 +173,9 @@ class TautulliManager:
             for trigger, value in base_payload.get("actions", {}).items(): params_for_set[trigger] = value
             for key, value in base_payload.get("notify_text", {}).items(): params_for_set[key] = value
             
-            response_set = requests.get(api_url, params=params_for_set, timeout=10)
+            response_set = self.api_client.session.get(api_url, params=params_for_set, timeout=10)
             response_set.raise_for_status()
+            self.api_client.cache.invalidate("get_notifier_config", notifier_id=notifier_id)
             set_response_data = response_set.json().get("response", {})
 
             if set_response_data.get("result") == "success":
@@ -137,5 +217,15 @@ class TautulliManager:
                 "notify_text": {"on_play_subject": "--jbop allStreams --username {user_email} --sessionId {session_id} --killMessage 'Seu período de teste foi finalizado'", "on_play_body": ""},
                 "custom_conditions": [{"parameter": "user_email", "operator": "is", "value": ["~"]}]
             }
+        elif notifier_type == 'ingest_webhook':
+            events = ("play", "pause", "resume", "stop", "watched")
+            # Ver IngestHandler.parse_body: os campos seguem a ordem de INGEST_BODY_FIELDS.
+            body_fields = ", ".join(f'"{key}": "{{{param}}}"' for key, param in INGEST_BODY_FIELDS)
+            return {
+                "friendly_name": _("Ingestão de Eventos (Painel)"),
+                "actions": {f"on_{event}": 1 for event in events},
+                "notify_text": {f"on_{event}_body": f'{{"event": "{event}", {body_fields}}}' for event in events},
+                "custom_conditions": []
+            }
         return None
 
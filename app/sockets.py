@@ -1,11 +1,45 @@
 import logging
 from datetime import datetime
+from flask import request
+from flask_login import current_user
+from flask_socketio import emit, join_room
 from . import extensions
 
 # Variável para manter a instância da aplicação, que será definida em app/__init__.py
 app_instance = None
 logger = logging.getLogger(__name__)
 
+LIVE_SESSIONS_ROOM = 'live_sessions'
+# Clientes (sid) que recebem as reproduções em curso; sem nenhum, o Tautulli não é consultado.
+_live_subscribers = set()
+_server_mismatch_logged = False
+
+def _middleware_server(app):
+    """Servidor do Socket.IO para o qual o middleware WSGI da aplicação encaminha os browsers."""
+    wsgi_app = app.wsgi_app
+    while wsgi_app is not None:
+        server = getattr(wsgi_app, 'engineio_app', None)
+        if server is not None:
+            return server
+        # O ProxyFix guarda a aplicação envolvida em 'app'.
+        wsgi_app = getattr(wsgi_app, 'app', None)
+    return None
+
+def socketio_server_is_bound():
+    """
+    Verifica se extensions.socketio.server é o servidor ligado aos browsers. Um novo init_app (ex.:
+    uma segunda aplicação criada no mesmo processo) substitui-o por um servidor sem clientes, e
+    todos os emits deixam de chegar. O erro é registado uma única vez.
+    """
+    global _server_mismatch_logged
+    if not app_instance:
+        return False
+    bound = _middleware_server(app_instance) is extensions.socketio.server
+    if not bound and not _server_mismatch_logged:
+        logger.error("O servidor do Socket.IO foi substituído depois de a aplicação ter sido criada: as atualizações em tempo real não chegam aos clientes ligados.")
+        _server_mismatch_logged = True
+    return bound
+
 def get_summary_data_for_socket():
     """
     Busca os dados de resumo do dashboard. Esta função agora opera dentro de um contexto de aplicação
@@ -20,8 +54,10 @@ def get_summary_data_for_socket():
         with app_instance.test_request_context():
             try:
                 # Acessa os gestores através do módulo 'extensions' para garantir que as instâncias corretas são usadas.
-                active_streams_data = extensions.plex_manager.get_active_sessions()
-                active_streams = active_streams_data.get('stream_count', 0)
+                # Com o painel de reproduções aberto, a contagem vem da última leitura do get_activity.
+                active_streams = extensions.live_sessions.get_stream_count() if _live_subscribers else None
+                if active_streams is None:
+                    active_streams = extensions.plex_manager.get_active_sessions().get('stream_count', 0)
                 
                 all_users = extensions.plex_manager.get_all_plex_users()
                 total_users = len(all_users) if all_users else 0
@@ -54,11 +90,30 @@ def background_task():
         extensions.socketio.sleep(10)
         count += 1
         logger.debug(f"A executar a tarefa de fundo do SocketIO - Contagem: {count}")
+        if not socketio_server_is_bound():
+            continue
         summary_data = get_summary_data_for_socket()
         if summary_data:
             extensions.socketio.emit('dashboard_update', {'summary': summary_data}, namespace='/dashboard')
             logger.debug("Dados do dashboard enviados para os clientes.")
 
+def live_sessions_task():
+    """
+    Tarefa em segundo plano que consulta a atividade do Tautulli no intervalo definido pelo
+    LiveSessionTracker e envia apenas as diferenças para os clientes da sala LIVE_SESSIONS_ROOM.
+    """
+    tracker = extensions.live_sessions
+    while True:
+        tracker.wait()
+        if not _live_subscribers or not socketio_server_is_bound():
+            continue
+        with app_instance.app_context():
+            with app_instance.test_request_context():
+                diff = tracker.poll()
+        if diff:
+            extensions.socketio.emit('live_sessions_diff', diff, namespace='/dashboard', to=LIVE_SESSIONS_ROOM)
+            logger.debug(f"Reproduções em curso: +{len(diff['added'])} -{len(diff['removed'])} ~{len(diff['changed'])} (seq {diff['seq']}).")
+
 @extensions.socketio.on('connect', namespace='/dashboard')
 def handle_dashboard_connect():
     """Lida com novas conexões de clientes ao namespace do dashboard."""
@@ -66,5 +121,25 @@ def handle_dashboard_connect():
     # Inicia a tarefa em segundo plano se ainda não estiver a correr
     if not hasattr(handle_dashboard_connect, 'task_started') or not handle_dashboard_connect.task_started:
         extensions.socketio.start_background_task(background_task)
+        extensions.socketio.start_background_task(live_sessions_task)
         handle_dashboard_connect.task_started = True
         logger.info("Tarefa de fundo do dashboard iniciada.")
+
+    # Os detalhes das reproduções (utilizadores, títulos, dispositivos) são apenas para administradores.
+    if current_user.is_authenticated and current_user.is_admin():
+        join_room(LIVE_SESSIONS_ROOM)
+        if not _live_subscribers:
+            # A última leitura pode ser antiga: antecipa a próxima para o novo cliente.
+            extensions.live_sessions.wake()
+        _live_subscribers.add(request.sid)
+        emit('live_sessions_snapshot', extensions.live_sessions.snapshot())
+
+@extensions.socketio.on('disconnect', namespace='/dashboard')
+def handle_dashboard_disconnect():
+    _live_subscribers.discard(request.sid)
+
+@extensions.socketio.on('live_sessions_resync', namespace='/dashboard')
+def handle_live_sessions_resync():
+    """Reenvia o estado completo a um cliente que perdeu uma atualização (sequência fora de ordem)."""
+    if request.sid in _live_subscribers:
+        emit('live_sessions_snapshot', extensions.live_sessions.snapshot())
@@ -22,6 +22,11 @@ document.addEventListener('DOMContentLoaded', () => {
     let monthlyRevenueChart = null;
     let userStatusChart = null;
 
+    // Reproduções em curso: estado local atualizado pelas diferenças enviadas pelo servidor.
+    const liveSessions = new Map();
+    let liveSeq = 0;
+    let liveTotals = { stream_count: 0, total_bandwidth: 0 };
+
     // --- FUNÇÕES AUXILIARES ---
     function getChartColors() {
         const isDark = document.documentElement.classList.contains('dark');
@@ -38,6 +43,15 @@ document.addEventListener('DOMContentLoaded', () => {
     function formatCurrency(value) {
         return (value || 0).toLocaleString('pt-BR', { style: 'currency', currency: 'BRL' });
     }
+
+    function escapeHtml(value) {
+        return String(value ?? '').replace(/[&<>"']/g, (c) => ({ '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;' })[c]);
+    }
+
+    function formatBandwidth(kbps) {
+        if (!kbps) return '0 kbps';
+        return kbps >= 1000 ? `${(kbps / 1000).toFixed(1)} Mbps` : `${kbps} kbps`;
+    }
     
     // --- LÓGICA DE RENDERIZAÇÃO ---
     function createSummaryCard(icon, label, value, colorClass) {
@@ -64,6 +78,83 @@ document.addEventListener('DOMContentLoaded', () => {
         `;
     }
 
+    // --- REPRODUÇÕES EM CURSO ---
+    function createSessionCard(session) {
+        const stateLabels = { playing: i18n.sessionPlaying, paused: i18n.sessionPaused, buffering: i18n.sessionBuffering };
+        const stateClasses = { playing: 'text-green-500', paused: 'text-yellow-500', buffering: 'text-blue-500' };
+        const decision = (session.transcode_decision || '').toLowerCase();
+        const decisionBadge = decision === 'transcode'
+            ? `<span class="px-2 py-0.5 rounded-full text-xs font-semibold bg-red-100 text-red-700 dark:bg-red-900/40 dark:text-red-300">${i18n.transcode}</span>`
+            : `<span class="px-2 py-0.5 rounded-full text-xs font-semibold bg-green-100 text-green-700 dark:bg-green-900/40 dark:text-green-300">${decision === 'copy' ? i18n.directStream : i18n.directPlay}</span>`;
+        const title = session.grandparent_title || session.title;
+        const subtitle = session.grandparent_title ? session.title : (session.year || '');
+        const progress = Math.min(100, Math.max(0, session.progress_percent || 0));
+
+        return `
+            <div class="flex gap-4 p-3 rounded-lg bg-gray-50 dark:bg-gray-900/40 border border-gray-200 dark:border-gray-700">
+                <img src="${escapeHtml(session.poster)}" alt="Poster" class="w-16 h-24 object-cover rounded-md flex-shrink-0" onerror="this.onerror=null;this.src='https://placehold.co/64x96/1F2937/E5E7EB?text=${encodeURIComponent(i18n.noArt)}'">
+                <div class="flex-1 min-w-0 flex flex-col justify-between">
+                    <div>
+                        <p class="font-semibold text-gray-900 dark:text-white truncate" title="${escapeHtml(session.full_title || title)}">${escapeHtml(title)}</p>
+                        <p class="text-sm text-gray-500 dark:text-gray-400 truncate">${escapeHtml(subtitle)}</p>
+                        <p class="text-sm text-gray-700 dark:text-gray-300 truncate">${escapeHtml(session.user)} · ${escapeHtml(session.player || session.platform)}</p>
+                    </div>
+                    <div class="space-y-1 mt-2">
+                        <div class="flex items-center justify-between text-xs">
+                            <span class="font-semibold ${stateClasses[session.state] || 'text-gray-500'}">${stateLabels[session.state] || escapeHtml(session.state)}</span>
+                            <span class="flex items-center gap-2">${decisionBadge}<span class="text-gray-500 dark:text-gray-400">${formatBandwidth(session.bandwidth)}</span></span>
+                        </div>
+                        <div class="w-full h-1.5 rounded-full bg-gray-200 dark:bg-gray-700"><div class="h-1.5 rounded-full bg-yellow-500" style="width: ${progress}%"></div></div>
+                    </div>
+                </div>
+            </div>
+        `;
+    }
+
+    function renderLiveSessions() {
+        const container = document.getElementById('liveSessionsContainer');
+        const empty = document.getElementById('liveSessionsEmpty');
+        const totals = document.getElementById('liveSessionsTotals');
+        if (!container) return;
+
+        const sessions = [...liveSessions.values()];
+        container.innerHTML = sessions.map(createSessionCard).join('');
+        if (sessions.length) {
+            empty.classList.add('hidden');
+        } else {
+            empty.textContent = i18n.noLiveSessions;
+            empty.classList.remove('hidden');
+        }
+        totals.textContent = i18n.streamsBandwidth
+            .replace('{count}', liveTotals.stream_count)
+            .replace('{bandwidth}', formatBandwidth(liveTotals.total_bandwidth));
+    }
+
+    function applyLiveSnapshot(snapshot) {
+        liveSessions.clear();
+        snapshot.sessions.forEach(session => liveSessions.set(session.session_key, session));
+        liveSeq = snapshot.seq;
+        liveTotals = { stream_count: snapshot.stream_count, total_bandwidth: snapshot.total_bandwidth };
+        if (snapshot.ready) renderLiveSessions();
+    }
+
+    /** Aplica uma diferença; devolve false se faltar uma anterior (o cliente pede então o estado completo). */
+    function applyLiveDiff(diff) {
+        if (diff.seq <= liveSeq) return true; // Já incluída no estado completo recebido.
+        if (diff.seq !== liveSeq + 1) return false;
+
+        diff.removed.forEach(key => liveSessions.delete(key));
+        diff.added.forEach(session => liveSessions.set(session.session_key, session));
+        diff.changed.forEach(delta => {
+            const session = liveSessions.get(delta.session_key);
+            if (session) Object.assign(session, delta);
+        });
+        liveSeq = diff.seq;
+        liveTotals = { stream_count: diff.stream_count, total_bandwidth: diff.total_bandwidth };
+        renderLiveSessions();
+        return true;
+    }
+
     function renderCharts(summary) {
         const colors = getChartColors();
         const revenueCanvas = document.getElementById('monthlyRevenueChart');
@@ -241,14 +332,40 @@ document.addEventListener('DOMContentLoaded', () => {
             setStatus('connected', i18n.connected);
         });
 
+        let lastSummary = null;
+
         socket.on('dashboard_update', (data) => {
             console.log('Atualização recebida:', data);
             if (data.summary) {
+                lastSummary = data.summary;
                 renderSummaryCards(data.summary);
                 renderCharts(data.summary);
             }
         });
 
+        socket.on('live_sessions_snapshot', (snapshot) => {
+            applyLiveSnapshot(snapshot);
+        });
+
+        socket.on('live_sessions_diff', (diff) => {
+            if (!applyLiveDiff(diff)) {
+                console.warn(`Atualização das reproduções em falta (esperada ${liveSeq + 1}, recebida ${diff.seq}). A pedir o estado completo.`);
+                socket.emit('live_sessions_resync');
+                return;
+            }
+            if (lastSummary && lastSummary.active_streams !== diff.stream_count) {
+                lastSummary = { ...lastSummary, active_streams: diff.stream_count };
+                renderSummaryCards(lastSummary);
+            }
+        });
+
+        // Eventos do webhook do Tautulli: atualiza as reproduções ativas sem esperar pelo próximo resumo.
+        socket.on('live_activity', (live) => {
+            if (!lastSummary) return;
+            lastSummary = { ...lastSummary, active_streams: live.active_sessions };
+            renderSummaryCards(lastSummary);
+        });
+
         socket.on('disconnect', () => {
             console.warn('Desconectado do dashboard em tempo real.');
             setStatus('disconnected', i18n.disconnected);
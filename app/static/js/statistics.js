@@ -31,6 +31,10 @@ document.addEventListener('DOMContentLoaded', () => {
     let mainBarChart = null;
     let allUsersData = [];
     let currentPage = 1;
+    // Respostas já obtidas nesta página, por período: trocar de período não volta a chamar a API.
+    const leaderboardCache = {};
+    const responseCache = {};
+    const statsWindows = Array.from(daysFilter.options).map(option => option.value);
 
     // --- FUNÇÕES AUXILIARES ---
     function getChartColors() {
@@ -71,6 +75,24 @@ document.addEventListener('DOMContentLoaded', () => {
         return data;
     }
 
+    async function fetchCached(url) {
+        if (!responseCache[url]) {
+            responseCache[url] = fetchAPI(url).catch(error => {
+                delete responseCache[url];
+                throw error;
+            });
+        }
+        return responseCache[url];
+    }
+
+    async function fetchLeaderboard(days) {
+        if (!leaderboardCache[days]) {
+            const data = await fetchAPI(`${urls.statsMulti}?windows=${statsWindows.join(',')}`);
+            Object.assign(leaderboardCache, data.windows);
+        }
+        return leaderboardCache[days] || [];
+    }
+
     // --- LÓGICA DE RENDERIZAÇÃO ---
     
     function formatTimeAgo(dateString) {
@@ -303,7 +325,7 @@ document.addEventListener('DOMContentLoaded', () => {
     async function renderUserAnalysis(username, days, containerElement) {
         try {
             const url = urls.userStats.replace('__USERNAME__', username);
-            const data = await fetchAPI(`${url}?days=${days}`);
+            const [data, heatmap] = await Promise.all([fetchCached(`${url}?days=${days}`), fetchHeatmap(days, username)]);
             const details = data.details;
             
             // Apenas renderiza conquistas na página principal se for o utilizador atual.
@@ -378,6 +400,12 @@ document.addEventListener('DOMContentLoaded', () => {
                         </div>
                     </div>
                     
+                    ${heatmap ? `
+                    <div class="pt-6 border-t border-gray-200 dark:border-gray-700">
+                        <h4 class="text-xl font-semibold mb-4 text-gray-900 dark:text-gray-100">${i18n.activityHeatmap}</h4>
+                        <div class="overflow-x-auto" data-heatmap></div>
+                    </div>` : ''}
+
                     <div class="pt-6 border-t border-gray-200 dark:border-gray-700">
                         <h4 class="text-xl font-semibold mb-2 text-gray-900 dark:text-gray-100">${i18n.mostRecentItems}</h4>
                         <div class="flex space-x-4 overflow-x-auto py-2 horizontal-scroll">${recentHtml}</div>
@@ -388,6 +416,7 @@ document.addEventListener('DOMContentLoaded', () => {
             // Renderiza os gráficos dentro do container que foi passado.
             renderUserActivityChart(containerElement);
             renderUserContentTypeChart(containerElement);
+            if (heatmap) renderHeatmap(containerElement.querySelector('[data-heatmap]'), heatmap);
 
         } catch (error) {
             containerElement.innerHTML = `<p class="text-center text-red-500 dark:text-red-400">${i18n.userAnalysisError} ${error.message}</p>`;
@@ -451,6 +480,52 @@ document.addEventListener('DOMContentLoaded', () => {
         canvas.chart = chartInstance;
     }
 
+    function formatHour(hour) {
+        return `${String(hour).padStart(2, '0')}h`;
+    }
+
+    // Mapa de calor 7x24 (linhas de segunda a domingo, colunas com a hora local do servidor).
+    function renderHeatmap(containerElement, heatmap) {
+        if (!containerElement) return;
+        const weekdays = [i18n.mon, i18n.tue, i18n.wed, i18n.thu, i18n.fri, i18n.sat, i18n.sun];
+        const maxSeconds = Math.max(1, ...heatmap.duration.flat());
+        const hourHeader = Array.from({ length: 24 }, (_, hour) => `
+            <div class="text-[10px] text-center text-gray-500 dark:text-gray-400">${hour % 3 === 0 ? formatHour(hour) : ''}</div>
+        `).join('');
+        const rows = heatmap.duration.map((hours, day) => `
+            <div class="text-xs font-medium text-gray-600 dark:text-gray-300 pr-2 flex items-center">${weekdays[day]}</div>
+            ${hours.map((seconds, hour) => {
+                const intensity = seconds / maxSeconds;
+                const title = `${weekdays[day]} ${formatHour(hour)}: ${formatDuration(seconds)} · ${heatmap.plays[day][hour]} ${i18n.plays}`;
+                return `<div class="h-6 rounded-sm bg-gray-100 dark:bg-gray-700/50" title="${title}"${seconds > 0 ? ` style="background-color: rgba(251, 191, 36, ${(0.15 + 0.85 * intensity).toFixed(2)})"` : ''}></div>`;
+            }).join('')}
+        `).join('');
+        containerElement.innerHTML = `
+            <div class="grid gap-0.5 min-w-[640px]" style="grid-template-columns: auto repeat(24, minmax(0, 1fr));">
+                <div></div>${hourHeader}${rows}
+            </div>
+        `;
+    }
+
+    function formatQuietHours(heatmap) {
+        return i18n.quietHours
+            .replace('{timezone}', heatmap.timezone)
+            .replace('{hours}', heatmap.quiet_hours.map(formatHour).join(', '));
+    }
+
+    async function fetchHeatmap(days, username = null) {
+        const params = new URLSearchParams({ days });
+        if (username) params.set('username', username);
+        try {
+            const data = await fetchCached(`${urls.heatmap}?${params}`);
+            return data.heatmap;
+        } catch (error) {
+            // O mapa de calor é complementar: uma falha não impede o resto da página.
+            console.error('Falha ao carregar o mapa de atividade:', error);
+            return null;
+        }
+    }
+
     // --- LÓGICA DE BUSCA E CONTROLO ---
 
     async function showUserDetailsModal(username, days) {
@@ -492,16 +567,24 @@ document.addEventListener('DOMContentLoaded', () => {
         errorContainer.classList.add('hidden');
         
         try {
-            const dataPromise = fetchAPI(`${urls.stats}?days=${days}`);
+            const dataPromise = fetchLeaderboard(days);
 
             if (currentUser.role !== 'admin') {
-                const newlyAddedPromise = fetchAPI(`${urls.recentlyAdded}?days=${days}`);
-                const [data, newlyAddedData] = await Promise.all([dataPromise, newlyAddedPromise]);
-                allUsersData = data.stats;
+                const newlyAddedPromise = fetchCached(`${urls.recentlyAdded}?days=${days}`);
+                const [stats, newlyAddedData] = await Promise.all([dataPromise, newlyAddedPromise]);
+                allUsersData = stats;
                 if (newlyAddedData.success) renderNewlyAdded(newlyAddedData.media);
             } else {
-                const data = await dataPromise;
-                allUsersData = data.stats;
+                const [stats, serverHeatmap] = await Promise.all([dataPromise, fetchHeatmap(days)]);
+                allUsersData = stats;
+                const heatmapSection = document.getElementById('serverHeatmapSection');
+                if (serverHeatmap && heatmapSection) {
+                    renderHeatmap(document.getElementById('serverHeatmap'), serverHeatmap);
+                    document.getElementById('serverQuietHours').textContent = formatQuietHours(serverHeatmap);
+                    heatmapSection.classList.remove('hidden');
+                } else if (heatmapSection) {
+                    heatmapSection.classList.add('hidden');
+                }
             }
 
             if (currentUser.role === 'admin') {
@@ -0,0 +1,130 @@
+# benchmarks/bench_stats_engine.py
+"""
+Compara o ciclo original de get_user_watch_details com o motor de agregação
+(NumPy e Python puro) sobre histórico sintético.
+
+Uso: python -m benchmarks.bench_stats_engine [--rows 100000] [--repeat 5]
+"""
+import argparse
+import random
+import time
+from collections import Counter
+from datetime import datetime
+
+from app.services.tautulli.stats_engine import HAS_NUMPY, aggregate_user_history
+
+GENRES = ["Ação", "Comédia", "Drama", "Terror", "Ficção Científica", "Animação", "Documentário", "Suspense"]
+PLATFORMS = ["Android", "iOS", "Roku", "Chrome", "Samsung", "LG", "Plex Web", "Apple TV"]
+
+def synthetic_history(rows, seed=42):
+    rnd = random.Random(seed)
+    now = int(time.time())
+    movies = [f"Filme {i}" for i in range(2000)]
+    shows = [f"Série {i}" for i in range(400)]
+    directors = [f"Realizador {i}" for i in range(300)]
+    history = []
+    for i in range(rows):
+        is_movie = rnd.random() < 0.35
+        history.append({
+            "date": now - i * 120 - rnd.randint(0, 119),
+            "duration": rnd.randint(600, 9000),
+            "media_type": "movie" if is_movie else "episode",
+            "title": rnd.choice(movies) if is_movie else f"Episódio {rnd.randint(1, 24)}",
+            "grandparent_title": None if is_movie else rnd.choice(shows),
+            "year": rnd.randint(1950, 2025) if is_movie else None,
+            "platform": rnd.choice(PLATFORMS),
+            "genres": rnd.sample(GENRES, rnd.randint(0, 3)),
+            "directors": rnd.sample(directors, rnd.randint(1, 2)) if is_movie else [],
+        })
+    return history
+
+def legacy_loop(rows):
+    """Cópia do ciclo linha a linha que existia em StatsHandler.get_user_watch_details."""
+    stats = {
+        "movie_count": 0, "episode_count": 0,
+        "total_movie_duration": 0, "total_episode_duration": 0,
+        "genre_counts": Counter(),
+        "weekly_activity_python": [0]*7,
+        "weekly_activity_js": [0]*7,
+        "top_movies": Counter(), "top_shows": Counter(),
+        "late_night_plays": 0,
+        "unique_genres": set(), "unique_days": set(),
+        "max_movie_duration": 0, "unique_platforms": set(),
+        "director_counts": Counter(), "unique_decades": set()
+    }
+    for item in rows:
+        dt = datetime.fromtimestamp(item.get('date'))
+        stats["weekly_activity_python"][dt.weekday()] += item.get('duration', 0)
+        stats["weekly_activity_js"][(dt.weekday() + 1) % 7] += item.get('duration', 0)
+        stats["unique_days"].add(dt.date())
+        if item.get("platform"):
+            stats["unique_platforms"].add(item.get("platform"))
+        if 0 <= dt.hour < 4:
+            stats["late_night_plays"] += 1
+        if item.get("media_type") == 'movie':
+            stats["movie_count"] += 1
+            duration = item.get('duration', 0)
+            stats["total_movie_duration"] += duration
+            stats["top_movies"][item.get("title")] += 1
+            if duration > stats["max_movie_duration"]:
+                stats["max_movie_duration"] = duration
+            if item.get("directors"):
+                stats["director_counts"].update(item.get("directors"))
+            if item.get("year"):
+                stats["unique_decades"].add(f"{item.get('year') // 10}0s")
+        elif item.get("media_type") == 'episode':
+            stats["episode_count"] += 1
+            stats["total_episode_duration"] += item.get('duration', 0)
+            stats["top_shows"][item.get("grandparent_title")] += 1
+        if item.get("genres"):
+            stats["genre_counts"].update(item.get("genres"))
+            stats["unique_genres"].update(item.get("genres"))
+    return stats
+
+def check_parity(legacy, result):
+    assert legacy["movie_count"] == result["movie_count"]
+    assert legacy["episode_count"] == result["episode_count"]
+    assert legacy["total_movie_duration"] == result["total_movie_duration"]
+    assert legacy["total_episode_duration"] == result["total_episode_duration"]
+    assert legacy["weekly_activity_python"] == result["weekly_activity_python"]
+    assert legacy["weekly_activity_js"] == result["weekly_activity_js"]
+    assert legacy["late_night_plays"] == result["late_night_plays"]
+    assert legacy["unique_decades"] == result["unique_decades"]
+    assert len(legacy["unique_days"]) == result["unique_days"]
+    assert legacy["top_movies"].most_common(3) == result["top_movies"]
+    assert legacy["top_shows"].most_common(3) == result["top_shows"]
+    assert legacy["director_counts"].most_common(1)[0][1] == result["favorite_director_count"]
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), value
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rows = synthetic_history(args.rows)
+    print(f"{args.rows} linhas sintéticas, melhor de {args.repeat} execuções")
+
+    legacy_time, legacy = best_of(lambda: legacy_loop(rows), args.repeat)
+    print(f"  ciclo original:        {legacy_time * 1000:9.1f} ms")
+
+    python_time, python_result = best_of(lambda: aggregate_user_history(rows, use_numpy=False), args.repeat)
+    check_parity(legacy, python_result)
+    print(f"  motor (Python puro):   {python_time * 1000:9.1f} ms  ({legacy_time / python_time:.1f}x)")
+
+    if HAS_NUMPY:
+        numpy_time, numpy_result = best_of(lambda: aggregate_user_history(rows, use_numpy=True), args.repeat)
+        check_parity(legacy, numpy_result)
+        print(f"  motor (NumPy):         {numpy_time * 1000:9.1f} ms  ({legacy_time / numpy_time:.1f}x)")
+    else:
+        print("  motor (NumPy):         indisponível (numpy não instalado)")
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,10 @@
 # Importa o socket nativo primeiro para contornar problemas de DNS com eventlet
 import socket
 import eventlet
-# É crucial aplicar o monkey-patch antes de importar qualquer outra coisa
-eventlet.monkey_patch()
+# É crucial aplicar o monkey-patch antes de importar qualquer outra coisa.
+# Os processos do pool de cálculo (ver app/services/compute_pool.py) não usam o eventlet.
+if __name__ != '__mp_main__':
+    eventlet.monkey_patch()
 
 import logging
 import subprocess
@@ -11,9 +13,12 @@ import os
 from app import create_app, extensions
 from app.config import load_or_create_config
 
-# Carrega a configuração antes de criar a aplicação
-config = load_or_create_config()
-app = create_app()
+# Os processos do pool de cálculo reimportam este módulo como '__mp_main__' (método 'spawn');
+# só o processo principal carrega a configuração e cria a aplicação (e o agendador).
+if __name__ != '__mp_main__':
+    # Carrega a configuração antes de criar a aplicação
+    config = load_or_create_config()
+    app = create_app()
 
 def run_db_upgrade():
     """Executa o comando 'flask db upgrade' para garantir que a base de dados está atualizada."""